@@ -0,0 +1,207 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+
+from signal_cache import source_fingerprint
+from table_io import read_table, table_source
+
+# combined_analysis.csv 的稠密三维视图：values[s, k, m] = 被试 s、条件 k、指标 m，
+# 缺失为 NaN（mask 标记有效值）。各下游脚本（统计 / 汇总 / 作图）共用同一个对象：
+# 进程内按文件指纹缓存，跨进程缓存为 data/.cache/analysis_cube 下的 pickle。
+# 指纹取自实际读入的文件（read_table 可能读的是同名 Parquet）。
+# 分组均值按长表的行顺序做 Kahan 求和（与 pandas groupby 相同的顺序和算法）。
+COMBINED_CSV = "combined_analysis.csv"
+CUBE_CACHE_DIR = os.path.join("data", ".cache", "analysis_cube")
+CUBE_FORMAT_VERSION = 2  # bump when AnalysisCube's pickled attributes change
+
+
+def _kahan_sum(rows):
+    """
+    Column sums with Kahan compensation, row by row (vectorised over columns).
+    pandas' groupby mean uses the same summation, so the means match it exactly
+    when the rows come in the long table's order (AnalysisCube.cells).
+    """
+    total = np.zeros(rows.shape[1])
+    comp = np.zeros(rows.shape[1])
+    for row in rows:
+        y = row - comp
+        t = total + y
+        comp = (t - total) - y
+        total = t
+    return total
+
+
+class AnalysisCube:
+    """
+    Labelled (subject, condition, metric) array over a combined table.
+    `frame` keeps the long table itself for plotting libraries that want it;
+    `cells` lists the (subject, condition) indices of its rows in file order.
+    """
+
+    def __init__(self, values, subjects, conditions, metrics, frame=None, source_hash=None, cells=None):
+        self.values = values
+        self.subjects = np.asarray(subjects)
+        self.conditions = list(conditions)
+        self.metrics = list(metrics)
+        self.frame = frame
+        self.source_hash = source_hash
+        self.cells = cells
+        self._metric_index = {m: i for i, m in enumerate(self.metrics)}
+        self._condition_index = {c: i for i, c in enumerate(self.conditions)}
+
+    @classmethod
+    def from_frame(cls, df, metrics=None, conditions=None, subject_col="SubjectID", condition_col="Condition"):
+        """
+        Build from a long table (one row per subject x condition). metrics
+        defaults to every numeric column; conditions to the sorted conditions
+        present. Requested metrics missing from df become all-NaN. Duplicate
+        (subject, condition) rows raise ValueError rather than silently
+        picking one of them.
+        """
+        if conditions is None:
+            conditions = sorted(df[condition_col].dropna().unique())
+        if metrics is None:
+            metrics = [c for c in df.columns
+                       if c not in (subject_col, condition_col) and pd.api.types.is_numeric_dtype(df[c])]
+        d = df[df[condition_col].isin(conditions)]
+        dup = d.duplicated([subject_col, condition_col], keep=False)
+        if dup.any():
+            keys = d.loc[dup, [subject_col, condition_col]].drop_duplicates().itertuples(index=False, name=None)
+            raise ValueError(f"duplicate ({subject_col}, {condition_col}) rows: {', '.join(map(str, keys))}")
+        subjects = np.sort(d[subject_col].unique())
+        values = np.full((len(subjects), len(conditions), len(metrics)), np.nan)
+        s_idx = np.searchsorted(subjects, d[subject_col].to_numpy())
+        k_idx = pd.Index(conditions).get_indexer(d[condition_col])
+        values[s_idx, k_idx, :] = d.reindex(columns=metrics).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        return cls(values, subjects, conditions, metrics, frame=df, cells=np.column_stack([s_idx, k_idx]))
+
+    @property
+    def mask(self):
+        """True where a value is present."""
+        return ~np.isnan(self.values)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def _metric_idx(self, metrics):
+        return [self._metric_index.get(m, -1) for m in metrics]
+
+    def sel(self, metrics=None, conditions=None):
+        """
+        Sub-cube for the given metrics / conditions (in the given order).
+        Unknown metrics or conditions come back as all-NaN slices.
+        """
+        metrics = self.metrics if metrics is None else list(metrics)
+        conditions = self.conditions if conditions is None else list(conditions)
+        m_idx = np.array(self._metric_idx(metrics), dtype=int)
+        k_idx = np.array([self._condition_index.get(c, -1) for c in conditions], dtype=int)
+        if (m_idx >= 0).all() and (k_idx >= 0).all():
+            values = self.values[:, k_idx][:, :, m_idx]
+        else:
+            padded = np.concatenate([self.values, np.full(self.values.shape[:2] + (1,), np.nan)], axis=2)
+            padded = np.concatenate([padded, np.full((padded.shape[0], 1, padded.shape[2]), np.nan)], axis=1)
+            values = padded[:, k_idx][:, :, m_idx]
+        cells = None
+        if self.cells is not None:
+            new_k = np.full(len(self.conditions), -1)
+            for pos, k in reversed(list(enumerate(k_idx))):
+                if k >= 0:
+                    new_k[k] = pos
+            kept = new_k[self.cells[:, 1]] >= 0
+            cells = np.column_stack([self.cells[kept, 0], new_k[self.cells[kept, 1]]])
+        return AnalysisCube(values, self.subjects, conditions, metrics, frame=self.frame, cells=cells)
+
+    def metric(self, name):
+        """(S, K) view of one metric."""
+        return self.values[:, :, self._metric_index[name]]
+
+    def pivot(self, metric, dropna=False):
+        """Subject x condition table of one metric (like df.pivot(...)); dropna keeps complete subjects."""
+        out = pd.DataFrame(self.metric(metric), index=pd.Index(self.subjects, name="SubjectID"),
+                           columns=pd.Index(self.conditions, name="Condition"))
+        return out.dropna() if dropna else out
+
+    def condition_means(self, metrics=None):
+        """Condition x metric means over subjects, NaNs skipped (like groupby('Condition').mean())."""
+        return self.group_means({c: [c] for c in self.conditions}, metrics, name="Condition")
+
+    def group_means(self, groups, metrics=None, name="Group"):
+        """
+        Means pooled over all (subject, condition) cells of each group, e.g.
+        {False: ['A', 'B'], True: ['C', 'D']}; same as grouping the rows of the
+        long table by a derived column. Cells are summed in table row order
+        (subject-major when the cube has no `cells`).
+        """
+        metrics = self.metrics if metrics is None else list(metrics)
+        sub = self.sel(metrics)
+        cells = sub.cells if sub.cells is not None else np.argwhere(np.ones(sub.shape[:2], dtype=bool))
+        rows = []
+        for conds in groups.values():
+            ks = [sub._condition_index[c] for c in conds]
+            order = cells[np.isin(cells[:, 1], ks)]
+            block = sub.values[order[:, 0], order[:, 1], :]
+            ok = ~np.isnan(block)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                rows.append(_kahan_sum(np.where(ok, block, 0.0)) / ok.sum(axis=0))
+        return pd.DataFrame(np.array(rows), index=pd.Index(list(groups), name=name), columns=metrics)
+
+    def corr(self, metrics=None):
+        """Pearson correlation across all (subject, condition) cells, pairwise-complete (like DataFrame.corr)."""
+        metrics = self.metrics if metrics is None else list(metrics)
+        X = self.sel(metrics).values.reshape(-1, len(metrics))
+        m = (~np.isnan(X)).astype(float)
+        Xz = np.where(m > 0, X, 0.0)
+        n = m.T @ m
+        sx = Xz.T @ m                 # sx[i, j] = sum of metric i over rows where j is present
+        sxx = (Xz ** 2).T @ m
+        sxy = Xz.T @ Xz
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = n * sxy - sx * sx.T
+            r = cov / np.sqrt((n * sxx - sx ** 2) * (n * sxx.T - sx.T ** 2))
+        r[n < 2] = np.nan
+        return pd.DataFrame(np.clip(r, -1.0, 1.0), index=metrics, columns=metrics)
+
+
+def _cache_path(path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.v{CUBE_FORMAT_VERSION}.pkl")
+
+
+_LOADED = {}
+
+
+def load_cube(path=COMBINED_CSV, cache_dir=CUBE_CACHE_DIR):
+    """
+    AnalysisCube of the combined table, parsed once: reused within the process
+    and from the on-disk cache while the file read_table() loads (the CSV or
+    its Parquet copy) is unchanged. cache_dir=None skips the disk cache.
+    """
+    source = table_source(path)
+    fingerprint = source_fingerprint(source)["source_hash"]
+    key = (os.path.abspath(source), fingerprint)
+    if key in _LOADED:
+        return _LOADED[key]
+
+    cube = None
+    if cache_dir is not None:
+        try:
+            cached = pd.read_pickle(_cache_path(path, cache_dir))
+            if getattr(cached, "source_hash", None) == fingerprint:
+                cube = cached
+        except Exception:
+            pass  # missing / stale / unreadable cache entry -> parse again
+    if cube is None:
+        cube = AnalysisCube.from_frame(read_table(path))
+        cube.source_hash = fingerprint
+        if cache_dir is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f"{_cache_path(path, cache_dir)}.{os.getpid()}.tmp"
+                pd.to_pickle(cube, tmp)
+                os.replace(tmp, _cache_path(path, cache_dir))
+            except OSError as e:
+                print(f"analysis cube cache unavailable for {path}: {e}")
+    _LOADED[key] = cube
+    return cube
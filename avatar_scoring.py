@@ -0,0 +1,271 @@
+import os
+import re
+import warnings
+import numpy as np
+import pandas as pd
+
+from xlsx_cache import read_excel_cached
+
+# Avatar Embodiment Questionnaire 计分引擎：
+# 所有 xlsx 只解析一次（并缓存），Q1..Q25 -> (n_respondents, 25) 矩阵，
+# 原始子量表与论文 R1..R16 子量表都以数组运算一次算完所有被试。
+AVATAR_DIR = os.path.join("data", "avatar_scale")
+N_ITEMS = 25
+
+# Wenjuan星导出字母选项（A..G -> -3..3）
+LETTER_MAP = {"A": -3.0, "B": -2.0, "C": -1.0, "D": 0.0, "E": 1.0, "F": 2.0, "G": 3.0}
+
+# Peck & Gonzalez-Franco 2021 (Frontiers in VR), Table 2: R1..R16 -> 原 Q 题号
+# R1=Q15, R2=Q16, R3=Q8, R4=Q17, R5=Q18, R6=Q20, R7=Q24, R8=Q22, R9=Q21,
+# R10=Q1, R11=Q19, R12=Q14, R13=Q6, R14=Q10, R15=Q12, R16=Q13
+R_TO_Q = [15, 16, 8, 17, 18, 20, 24, 22, 21, 1, 19, 14, 6, 10, 12, 13]
+
+# 5.1 Computing the Score 的子量表（R 编号，1-based）
+REVISED_SUBSCALES = {
+    "AvatarEQ_Appearance": [1, 2, 3, 4, 5, 6, 9, 16],
+    "AvatarEQ_Response": [4, 6, 7, 8, 9, 15],
+    "AvatarEQ_Ownership": [5, 10, 11, 12, 13, 14],
+    "AvatarEQ_MultiSensory": [3, 12, 13, 14, 15, 16],
+}
+
+# 原始 -3..3 刻度上构造的子量表：(题号, 是否反向)
+# 量表为对称刻度时，反向题取负号近似反向计分
+# Ownership: Q1 own; Q2 other(reverse); Q4 mirror-own; Q5 mirror-other(reverse); Q14 location-own
+OWNERSHIP_ITEMS = [(1, False), (2, True), (4, False), (5, True), (14, False), (17, False), (18, False), (19, False)]
+# Agency/Control: reverse-code Q9 (“moving by itself”)
+AGENCY_ITEMS = [(6, False), (7, False), (8, False), (9, True)]
+# Touch/Referral: Q10-13
+TOUCH_ITEMS = [(10, False), (11, False), (12, False), (13, False)]
+
+
+def extract_subject_id_from_serial(serial):
+    """
+    Serial Number 列里可能含有额外文本（例如 '2 相反'）。
+    这里取第一个连续数字作为 SubjectID（向量化版本，返回 float Series，缺失为 NaN）。
+    """
+    return pd.to_numeric(serial.astype(str).str.extract(r"(\d+)", expand=False), errors="coerce")
+
+
+def load_avatar_responses(avatar_dir=AVATAR_DIR, files=None):
+    """
+    Parse every avatar xlsx once (cached) and keep the latest submission per subject.
+    Adds __file, __submitted_at, __subject_id, __swapped columns. Returns None if
+    there is nothing usable.
+    """
+    if files is None:
+        if not os.path.isdir(avatar_dir):
+            return None
+        files = sorted(
+            os.path.join(avatar_dir, f) for f in os.listdir(avatar_dir)
+            if f.endswith(".xlsx") and not f.startswith("~$")
+        )
+    frames = []
+    for f in files:
+        try:
+            d = read_excel_cached(f)
+            d["__file"] = os.path.basename(f)
+            frames.append(d)
+        except Exception as e:
+            print(f"Error reading avatar_scale {f}: {e}")
+    if not frames:
+        return None
+
+    df = pd.concat(frames, ignore_index=True)
+    if "Serial Number" not in df.columns:
+        return None
+
+    # choose latest submission per subject if multiple
+    if "提交答卷时间" in df.columns:
+        df["__submitted_at"] = pd.to_datetime(df["提交答卷时间"], errors="coerce")
+    else:
+        df["__submitted_at"] = pd.NaT
+    df["__subject_id"] = extract_subject_id_from_serial(df["Serial Number"])
+    df = df[~df["__subject_id"].isna()].copy()
+    df["__subject_id"] = df["__subject_id"].astype(int)
+    df = df.sort_values("__submitted_at").groupby("__subject_id", as_index=False).tail(1)
+    # 若 Serial Number 含 '相反'，则交换 C/D 映射
+    df["__swapped"] = df["Serial Number"].astype(str).str.contains("相反", regex=False)
+    return df
+
+
+def question_columns(columns):
+    """
+    ({qnum: [base cols]}, {qnum: [.1 cols]}). The default block is the first
+    robot condition, the '.1' block the second; duplicated items (e.g. Q22/Q23
+    wording variants) map several columns to one question number.
+    """
+    base, alt = {}, {}
+    for c in columns:
+        if not isinstance(c, str):
+            continue
+        m = re.match(r"^Q(\d+)\.", c)
+        if not m:
+            continue
+        (alt if c.endswith(".1") else base).setdefault(int(m.group(1)), []).append(c)
+    return base, alt
+
+
+def coerce_item_column(s):
+    """Numeric (-3..3) or letter (A..G) answers -> float; anything else NaN."""
+    if pd.api.types.is_numeric_dtype(s):
+        return s.astype(float).to_numpy()
+    text = s.where(s.notna(), "").astype(str).str.strip()
+    num = pd.to_numeric(text, errors="coerce")
+    letters = text.str.upper().map(LETTER_MAP)
+    return num.fillna(letters).astype(float).to_numpy()
+
+
+def item_matrix(df, cols_by_num):
+    """
+    (n_respondents, 25) raw (-3..3) item matrix; several columns for the same
+    question number are averaged (ignoring NaN).
+    """
+    Q = np.full((len(df), N_ITEMS), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN items
+        for qnum, cols in cols_by_num.items():
+            if not 1 <= qnum <= N_ITEMS:
+                continue
+            vals = np.column_stack([coerce_item_column(df[c]) for c in cols])
+            Q[:, qnum - 1] = np.nanmean(vals, axis=1)
+    return Q
+
+
+def _mean_n(X):
+    """Row-wise mean ignoring NaN (NaN if nothing available) and the count used."""
+    n = np.sum(~np.isnan(X), axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        return np.nanmean(X, axis=1), n
+
+
+def _signed_items(Q, items):
+    qidx = np.array([q - 1 for q, _ in items])
+    sign = np.array([-1.0 if rev else 1.0 for _, rev in items])
+    return Q[:, qidx] * sign
+
+
+def revised_scores(Q):
+    """
+    Paper R1..R16 on the 1..7 scale (-3 -> 1, 0 -> 4, 3 -> 7) and the revised
+    subscales for every respondent. Returns (R matrix (n, 16), dict of arrays).
+    """
+    R = Q[:, np.array(R_TO_Q) - 1] + 4.0
+    scores = {}
+    counts = {}
+    for name, ridx in REVISED_SUBSCALES.items():
+        scores[name], counts[name] = _mean_n(R[:, np.array(ridx) - 1])
+    sub = np.column_stack([scores[k] for k in REVISED_SUBSCALES])
+    # overall embodiment: mean of the four subscales when all are available
+    embodiment = np.where(np.isnan(sub).any(axis=1), np.nan, sub.mean(axis=1))
+    r_n = np.sum(~np.isnan(R), axis=1)
+    # Optional agency subscore per paper suggestion: Agency = R3 + R13 (here also provide mean)
+    r3, r13 = R[:, 2], R[:, 12]
+    agency_ok = ~np.isnan(r3) & ~np.isnan(r13)
+    return R, {
+        "AvatarEQ_Appearance": scores["AvatarEQ_Appearance"],
+        "AvatarEQ_Response": scores["AvatarEQ_Response"],
+        "AvatarEQ_Ownership": scores["AvatarEQ_Ownership"],
+        "AvatarEQ_MultiSensory": scores["AvatarEQ_MultiSensory"],
+        "AvatarEQ_Embodiment": embodiment,
+        "AvatarEQ_Appearance_N": counts["AvatarEQ_Appearance"],
+        "AvatarEQ_Response_N": counts["AvatarEQ_Response"],
+        "AvatarEQ_Ownership_N": counts["AvatarEQ_Ownership"],
+        "AvatarEQ_MultiSensory_N": counts["AvatarEQ_MultiSensory"],
+        "AvatarEQ_R_N": r_n,
+        "AvatarEQ_Agency_Sum": np.where(agency_ok, r3 + r13, np.nan),
+        "AvatarEQ_Agency_Mean": np.where(agency_ok, (r3 + r13) / 2.0, np.nan),
+    }
+
+
+def summary_scores(Q):
+    """Avatar_* metrics (raw -3..3 scale) plus the revised AvatarEQ_* scores, as arrays."""
+    overall, overall_n = _mean_n(Q)
+    ownership, ownership_n = _mean_n(_signed_items(Q, OWNERSHIP_ITEMS))
+    agency, agency_n = _mean_n(_signed_items(Q, AGENCY_ITEMS))
+    touch, touch_n = _mean_n(_signed_items(Q, TOUCH_ITEMS))
+    _, eq_scores = revised_scores(Q)
+    return {
+        "Avatar_Embodiment_Mean": overall,
+        "Avatar_Embodiment_N": overall_n,
+        "Avatar_Ownership_Score": ownership,
+        "Avatar_Ownership_N": ownership_n,
+        "Avatar_Agency_Score": agency,
+        "Avatar_Agency_N": agency_n,
+        "Avatar_Touch_Score": touch,
+        "Avatar_Touch_N": touch_n,
+        # expose a few interpretable single-items (safety / control), if present
+        "Avatar_Q1_Ownership": Q[:, 0],
+        "Avatar_Q6_Control": Q[:, 5],
+        "Avatar_Q9_SpontaneousMove": Q[:, 8],
+        "Avatar_Q25_HarmConcern": Q[:, 24],
+        # Revised (R1..R16) subscales and overall embodiment (1..7)
+        **eq_scores,
+    }
+
+
+def condition_item_matrices(df):
+    """
+    Item matrices per robot condition for every respondent:
+    默认段（无 .1 后缀）对应 C（Naked Robot），.1 段对应 D（Clothed Robot），
+    __swapped 的被试交换 C/D。Returns {'C': Q, 'D': Q}.
+    """
+    base_by_num, alt_by_num = question_columns(df.columns)
+    Q_base = item_matrix(df, base_by_num)
+    Q_alt = item_matrix(df, alt_by_num)
+    swapped = df["__swapped"].to_numpy()[:, None]
+    return {
+        "C": np.where(swapped, Q_alt, Q_base),
+        "D": np.where(swapped, Q_base, Q_alt),
+    }
+
+
+def _py(v):
+    # numpy scalars -> python int/float, same types the per-row scorer produced
+    if isinstance(v, np.integer):
+        return int(v)
+    if isinstance(v, np.floating):
+        return float(v)
+    return v
+
+
+def avatar_map_from_responses(df):
+    """avatar_map[(SubjectID, Condition)] -> { Avatar_* / AvatarEQ_* metrics }"""
+    avatar_map = {}
+    sids = df["__subject_id"].to_numpy()
+    for cond, Q in condition_item_matrices(df).items():
+        scores = summary_scores(Q)
+        for i, sid in enumerate(sids):
+            avatar_map[(int(sid), cond)] = {k: _py(v[i]) for k, v in scores.items()}
+    return avatar_map
+
+
+def all_items_table(df):
+    """
+    每行 = SubjectID × Condition(C/D)；列包含：
+    - Q1..Q25（原始 -3..3）与 Q1..Q25_Likert（映射到 1..7）
+    - R1..R16（1..7）
+    - 论文子量表（Appearance/Response/Ownership/Multi-Sensory/Embodiment）
+    """
+    meta = pd.DataFrame({
+        "SubjectID": df["__subject_id"].to_numpy(),
+        "Name": df["Name"].to_numpy() if "Name" in df.columns else np.nan,
+        "SerialNumberRaw": df["Serial Number"].astype(str).to_numpy(),
+        "SubmittedAt": df["提交答卷时间"].to_numpy() if "提交答卷时间" in df.columns else np.nan,
+        "SourceFile": df["__file"].to_numpy(),
+        "SwappedCD": df["__swapped"].to_numpy(),
+    })
+    parts = []
+    for cond, Q in condition_item_matrices(df).items():
+        R, eq_scores = revised_scores(Q)
+        cols = {}
+        for i in range(N_ITEMS):
+            cols[f"Q{i + 1}"] = Q[:, i]
+            cols[f"Q{i + 1}_Likert"] = Q[:, i] + 4.0
+        for j in range(R.shape[1]):
+            cols[f"R{j + 1}"] = R[:, j]
+        cols.update(eq_scores)
+        block = pd.concat([meta, pd.DataFrame(cols)], axis=1)
+        block.insert(1, "Condition", cond)
+        parts.append(block)
+    return pd.concat(parts, ignore_index=True).sort_values(["SubjectID", "Condition"])
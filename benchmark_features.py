@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+import scipy
+
+from process_data import (
+    calculate_hr_hrv, calculate_eda_features, calculate_gsr_gradient_features, calculate_resp_rate,
+    process_force_data,
+)
+from synthetic_physio import synth_recording, synth_force_frame, write_force_csv
+
+# 特征计算内核的基准测试：用 synthetic_physio 生成不同时长的合成记录，
+# 对每个内核记录 wall / CPU 时间（多次取中位数）和峰值内存（tracemalloc，单独
+# 跑一次，避免追踪开销计入时间），结果存成 JSON，可用 --compare 与旧结果对比。
+# 相邻时长之间拟合 log(time) ~ k log(n)，k 明显大于 1 即超线性。
+DEFAULT_DURATIONS_MIN = [5, 30, 120]
+DEFAULT_REPEAT = 3
+SUPERLINEAR_EXPONENT = 1.3
+BENCHMARK_OUTPUT = "benchmark_features.json"
+
+KERNELS = {
+    "calculate_hr_hrv": lambda rec, force_path: calculate_hr_hrv(rec["BVP"], rec["fs"]),
+    "calculate_eda_features": lambda rec, force_path: calculate_eda_features(rec["EDA"], rec["fs"]),
+    "calculate_gsr_gradient_features": lambda rec, force_path: calculate_gsr_gradient_features(rec["EDA"], rec["fs"]),
+    "calculate_resp_rate": lambda rec, force_path: calculate_resp_rate(rec["RESP"], rec["fs"]),
+    # file-based: parse + signal cache write + magnitude (cache cleared before each call)
+    "process_force_data": lambda rec, force_path: process_force_data(force_path),
+}
+
+
+def _run_cold(fn, rec, force_path, workdir):
+    # load_force_sensor caches under ./data/.signal_cache; run inside workdir with it removed
+    shutil.rmtree(os.path.join(workdir, "data"), ignore_errors=True)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return fn(rec, force_path)
+    finally:
+        os.chdir(cwd)
+
+
+def time_kernel(fn, rec, force_path, workdir, repeat=DEFAULT_REPEAT):
+    """Wall and CPU seconds of `repeat` calls, then the tracemalloc peak of one more call."""
+    wall, cpu = [], []
+    for _ in range(repeat):
+        w0, c0 = time.perf_counter(), time.process_time()
+        _run_cold(fn, rec, force_path, workdir)
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+    tracemalloc.start()
+    try:
+        _run_cold(fn, rec, force_path, workdir)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "wall_s_median": float(np.median(wall)),
+        "wall_s_min": float(np.min(wall)),
+        "cpu_s_median": float(np.median(cpu)),
+        "peak_mem_bytes": int(peak),
+    }
+
+
+def scaling_exponents(results, threshold=SUPERLINEAR_EXPONENT):
+    """
+    Per kernel, the local exponent k of time ~ n^k between consecutive lengths;
+    superlinear if any step exceeds threshold.
+    """
+    out = {}
+    for kernel in dict.fromkeys(r["kernel"] for r in results):
+        rows = sorted((r for r in results if r["kernel"] == kernel), key=lambda r: r["n_samples"])
+        steps = []
+        for a, b in zip(rows, rows[1:]):
+            if a["wall_s_median"] > 0 and b["n_samples"] > a["n_samples"]:
+                k = np.log(b["wall_s_median"] / a["wall_s_median"]) / np.log(b["n_samples"] / a["n_samples"])
+                steps.append({"from_duration_s": a["duration_s"], "to_duration_s": b["duration_s"], "exponent": float(k)})
+        out[kernel] = {"steps": steps, "superlinear": any(s["exponent"] > threshold for s in steps)}
+    return out
+
+
+def run_benchmarks(durations_min=DEFAULT_DURATIONS_MIN, fs=1000, repeat=DEFAULT_REPEAT, kernels=None, seed=0):
+    kernels = list(KERNELS) if kernels is None else kernels
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench_features_")
+    try:
+        for minutes in durations_min:
+            duration_s = minutes * 60.0
+            rec = synth_recording(duration_s, fs=fs, seed=seed)
+            force_path = os.path.join(workdir, "force.csv")
+            force = synth_force_frame(duration_s, seed=seed)
+            write_force_csv(force_path, force)
+            for name in kernels:
+                stats = time_kernel(KERNELS[name], rec, force_path, workdir, repeat)
+                n = len(force) if name == "process_force_data" else len(rec["t"])
+                results.append({
+                    "kernel": name,
+                    "duration_s": duration_s,
+                    "n_samples": n,
+                    **stats,
+                    "ns_per_sample": stats["wall_s_median"] / n * 1e9,
+                })
+                print(f"{name:34s} {minutes:7.1f} min  {stats['wall_s_median']:9.3f} s  "
+                      f"{stats['peak_mem_bytes'] / 2**20:9.1f} MiB")
+            del rec, force
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def compare(current, previous):
+    """Print wall-time ratios current / previous for matching (kernel, duration)."""
+    prev = {(r["kernel"], r["duration_s"]): r for r in previous["results"]}
+    print(f"\n{'kernel':34s} {'min':>7s}  {'ratio':>7s}  {'mem ratio':>9s}")
+    for r in current["results"]:
+        p = prev.get((r["kernel"], r["duration_s"]))
+        if p is None or not p["wall_s_median"]:
+            continue
+        mem = r["peak_mem_bytes"] / p["peak_mem_bytes"] if p["peak_mem_bytes"] else float("nan")
+        print(f"{r['kernel']:34s} {r['duration_s'] / 60:7.1f}  {r['wall_s_median'] / p['wall_s_median']:7.2f}  {mem:9.2f}")
+
+
+def main(durations_min=DEFAULT_DURATIONS_MIN, fs=1000, repeat=DEFAULT_REPEAT, kernels=None, seed=0,
+         output=BENCHMARK_OUTPUT, compare_to=None):
+    results = run_benchmarks(durations_min, fs, repeat, kernels, seed)
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "fs": fs,
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+    for kernel, s in report["scaling"].items():
+        if s["superlinear"]:
+            worst = max(step["exponent"] for step in s["steps"])
+            print(f"WARNING: {kernel} scales super-linearly (exponent up to {worst:.2f})")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Benchmark results saved to {output}")
+    if compare_to:
+        with open(compare_to, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the signal-feature kernels on synthetic recordings")
+    parser.add_argument("--durations", type=float, nargs="+", default=DEFAULT_DURATIONS_MIN,
+                        help="recording lengths in minutes (e.g. 5 30 120 480)")
+    parser.add_argument("--fs", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--kernels", nargs="+", choices=list(KERNELS), default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=BENCHMARK_OUTPUT)
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+    main(args.durations, args.fs, args.repeat, args.kernels, args.seed, args.output, args.compare)
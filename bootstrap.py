@@ -0,0 +1,264 @@
+import copy
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from stats_engine import CONDITIONS, CONTRASTS, build_cube, rank_conditions, tie_sum, contrast_pairs
+from permutation_tests import pool_map
+
+# 效应量的 cluster bootstrap：按被试整体重抽样（保留每个被试的 4 个条件）。
+# 一次重抽样 = 一行被试下标，整体是一个 (B, S) 整数矩阵；换算成每个被试被抽中的
+# 次数 counts (B, S) 后，Kendall's W / Cohen's dz 都是 counts 与逐被试量的矩阵乘法，
+# RBC 用“预先按 |d| 排好序 + 加权累积和”得到加权平均秩，不必逐次重新排序。
+# 原估计 = counts 全 1，jackknife（BCa 的加速度）= 去掉一个被试的 counts。
+# 各指标的列互不相关，所以 counts 只按块抽一次（(B, S) 个计数，远小于全部重抽样值），
+# 再逐个指标在这些块上求效应量、马上归约成置信区间，内存里只留一个指标的重抽样值。
+# 多进程时整个调用只开一个进程池，EffectData 与 counts 经 initializer 只传一次，
+# 按指标分发任务。
+BOOT_CHUNK = 2000
+
+
+def resample_indices(n_subjects, n_boot, seed=None):
+    """(n_boot, n_subjects) matrix of subject indices drawn with replacement."""
+    return np.random.default_rng(seed).integers(0, n_subjects, size=(n_boot, n_subjects))
+
+
+def index_counts(idx, n_subjects):
+    """How often each subject appears in each resample: (B, S) float."""
+    B = idx.shape[0]
+    counts = np.zeros((B, n_subjects))
+    np.add.at(counts, (np.repeat(np.arange(B), idx.shape[1]), idx.ravel()), 1.0)
+    return counts
+
+
+class EffectData:
+    """Per-subject quantities from which every effect size is a weighted sum."""
+
+    def __init__(self, cube, contrasts=CONTRASTS, conditions=CONDITIONS):
+        S, K, M = cube.shape
+        self.k = K
+        ranks = rank_conditions(cube)
+        self.complete = (~np.isnan(ranks[:, 0, :])).astype(float)         # (S, M)
+        self.ranks = np.nan_to_num(ranks).reshape(S, K * M)                # (S, K*M)
+        self.ties = np.nan_to_num(tie_sum(ranks, axis=1))                  # (S, M)
+
+        x, y = contrast_pairs(cube, contrasts, conditions)
+        d = (x - y).reshape(S, -1)                                         # (S, C) cells = P*M
+        self.cell_shape = x.shape[1:]
+        valid = ~np.isnan(d)
+        self.valid = valid.astype(float)
+        self.d = np.where(valid, d, 0.0)
+
+        # Wilcoxon ranking order of |d| (zeros / NaN excluded), fixed across resamples
+        absd = np.where(valid & (d != 0), np.abs(d), np.inf)
+        self.order = np.argsort(absd, axis=0, kind="stable")
+        sorted_abs = np.take_along_axis(absd, self.order, axis=0)
+        self.ranked = np.isfinite(sorted_abs)
+        self.sign = np.sign(np.take_along_axis(self.d, self.order, axis=0))
+        new_group = np.ones_like(sorted_abs, dtype=bool)
+        new_group[1:] = sorted_abs[1:] != sorted_abs[:-1]
+        pos = np.arange(S)[:, None]
+        self.group_start = np.maximum.accumulate(np.where(new_group, pos, 0), axis=0)
+        new_group_rev = np.ones_like(new_group)
+        new_group_rev[:-1] = new_group[1:]
+        self.group_end = np.minimum.accumulate(np.where(new_group_rev, pos, S - 1)[::-1], axis=0)[::-1]
+
+    def metric(self, m):
+        """The same quantities for metric m alone (cell_shape (..., 1)); columns are independent."""
+        sub = copy.copy(self)
+        S, M = self.complete.shape
+        sub.complete = self.complete[:, m:m + 1]
+        sub.ranks = self.ranks.reshape(S, self.k, M)[:, :, m]
+        sub.ties = self.ties[:, m:m + 1]
+        cells = np.arange(self.d.shape[1]).reshape(self.cell_shape)[..., m:m + 1].ravel()
+        for name in ("valid", "d", "order", "ranked", "sign", "group_start", "group_end"):
+            setattr(sub, name, getattr(self, name)[:, cells])
+        sub.cell_shape = self.cell_shape[:-1] + (1,)
+        return sub
+
+    def kendalls_w(self, counts):
+        k = self.k
+        n = counts @ self.complete                                         # (B, M)
+        R = (counts @ self.ranks).reshape(len(counts), k, -1)
+        ties = counts @ self.ties
+        with np.errstate(invalid="ignore", divide="ignore"):
+            chi2 = 12.0 / (n * k * (k + 1)) * (R ** 2).sum(axis=1) - 3.0 * n * (k + 1)
+            chi2 = chi2 / (1.0 - ties / (n * k * (k * k - 1.0)))
+            return chi2 / (n * (k - 1))
+
+    def cohens_dz(self, counts):
+        n = counts @ self.valid
+        s1 = counts @ self.d
+        s2 = counts @ self.d ** 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = s1 / n
+            sd = np.sqrt((s2 - n * mean ** 2) / (n - 1))
+            dz = mean / sd
+        return dz.reshape((len(counts),) + self.cell_shape)
+
+    def rbc(self, counts):
+        # weighted average ranks: a subject drawn c times is c tied copies
+        shape = (len(counts),) + self.order.shape
+        w = np.take_along_axis(np.broadcast_to(counts[:, :, None], shape), self.order[None], axis=1)
+        w = w * self.ranked                                                # (B, S, C) in |d| order
+        cum = np.cumsum(w, axis=1)
+        start_w = np.take_along_axis(w, self.group_start[None], axis=1)
+        below = np.take_along_axis(cum, self.group_start[None], axis=1) - start_w
+        tied = np.take_along_axis(cum, self.group_end[None], axis=1) - below
+        rank = below + (tied + 1.0) / 2.0
+        r_plus = (w * rank * (self.sign > 0)).sum(axis=1)
+        r_minus = (w * rank * (self.sign < 0)).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = (r_plus - r_minus) / (r_plus + r_minus)
+        return out.reshape((len(counts),) + self.cell_shape)
+
+    def all_effects(self, counts):
+        return {"kendalls_w": self.kendalls_w(counts), "cohens_dz": self.cohens_dz(counts),
+                "rbc": self.rbc(counts)}
+
+
+def draw_counts(n_subjects, n_boot, seed=None, chunk=BOOT_CHUNK):
+    """Resample counts as (chunk, S) blocks, each drawn from its own SeedSequence child."""
+    sizes = [min(chunk, n_boot - i) for i in range(0, n_boot, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return [index_counts(resample_indices(n_subjects, b, s), n_subjects) for s, b in zip(seeds, sizes)]
+
+
+def _metric_replicates(data, counts):
+    parts = [data.all_effects(c) for c in counts]
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+_WORKER = {}
+
+
+def _init_worker(data, counts):
+    _WORKER["data"], _WORKER["counts"] = data, counts
+
+
+def _metric_job(m):
+    return _metric_replicates(_WORKER["data"].metric(m), _WORKER["counts"])
+
+
+def _chunk_job(args):
+    data, seed, size = args
+    S = data.d.shape[0]
+    return data.all_effects(index_counts(resample_indices(S, size, seed), S))
+
+
+def bootstrap_distribution(data, n_boot=10_000, seed=None, chunk=BOOT_CHUNK, jobs=1):
+    """
+    Bootstrap replicates {effect: (n_boot, ...)}. Resamples are drawn in chunks
+    of `chunk`, each from its own SeedSequence child, so peak memory is bounded
+    by the chunk and results do not depend on `jobs`.
+    """
+    sizes = [min(chunk, n_boot - i) for i in range(0, n_boot, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    parts = pool_map(_chunk_job, [(data, s, b) for s, b in zip(seeds, sizes)], jobs)
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def _column_quantiles(reps, q):
+    """Per-column quantile of reps (B, ...) at per-column probability q, NaNs ignored."""
+    srt = np.sort(reps, axis=0)
+    nb = (~np.isnan(reps)).sum(axis=0)
+    pos = np.clip(q, 0.0, 1.0) * (nb - 1)
+    lo = np.clip(np.floor(pos).astype(int), 0, None)
+    hi = np.clip(np.ceil(pos).astype(int), 0, None)
+    a = np.take_along_axis(srt, lo[None], axis=0)[0]
+    b = np.take_along_axis(srt, hi[None], axis=0)[0]
+    out = a + (b - a) * (pos - lo)
+    return np.where(nb > 0, out, np.nan)
+
+
+def percentile_interval(reps, confidence=0.95):
+    alpha = (1.0 - confidence) / 2.0
+    shape = reps.shape[1:]
+    return (_column_quantiles(reps, np.full(shape, alpha)),
+            _column_quantiles(reps, np.full(shape, 1.0 - alpha)))
+
+
+def bca_interval(reps, estimate, jackknife, confidence=0.95):
+    """BCa interval from replicates (B, ...), the estimate (...) and jackknife values (S, ...)."""
+    alpha = (1.0 - confidence) / 2.0
+    nb = (~np.isnan(reps)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        below = ((reps < estimate).sum(axis=0) + 0.5 * (reps == estimate).sum(axis=0)) / nb
+        z0 = stats.norm.ppf(below)
+        jk = jackknife - np.nansum(jackknife, axis=0) / (~np.isnan(jackknife)).sum(axis=0)
+        a = -np.nansum(jk ** 3, axis=0) / (6.0 * np.nansum(jk ** 2, axis=0) ** 1.5)
+        a = np.where(np.isfinite(a), a, 0.0)
+        bounds = []
+        for z in (stats.norm.ppf(alpha), stats.norm.ppf(1.0 - alpha)):
+            q = stats.norm.cdf(z0 + (z0 + z) / (1.0 - a * (z0 + z)))
+            bounds.append(_column_quantiles(reps, np.where(np.isfinite(q), q, np.nan)))
+    lo, hi = bounds
+    lo[~np.isfinite(z0)] = np.nan
+    hi[~np.isfinite(z0)] = np.nan
+    return lo, hi
+
+
+def bootstrap_effects(cube, contrasts=CONTRASTS, conditions=CONDITIONS, n_boot=10_000, method="bca",
+                      confidence=0.95, seed=None, chunk=BOOT_CHUNK, jobs=1):
+    """
+    {effect: (estimate, ci_low, ci_high)} for kendalls_w (M,), cohens_dz and
+    rbc (P, M), from a cluster bootstrap over subjects. The resample counts are
+    drawn once and shared by all metrics; metrics are reduced to their interval
+    one at a time, so only one metric's replicates (n_boot, P) are held at once.
+    """
+    data = EffectData(cube, contrasts, conditions)
+    S, _, M = cube.shape
+    estimate = {key: est[0] for key, est in data.all_effects(np.ones((1, S))).items()}
+    if method == "bca":
+        jackknife = data.all_effects(1.0 - np.eye(S))
+    out = {key: (est, np.full(est.shape, np.nan), np.full(est.shape, np.nan)) for key, est in estimate.items()}
+
+    def reduce(m, reps):
+        for key, rep in reps.items():
+            cols = (Ellipsis, slice(m, m + 1))
+            if method == "bca":
+                lo, hi = bca_interval(rep, estimate[key][cols], jackknife[key][cols], confidence)
+            else:
+                lo, hi = percentile_interval(rep, confidence)
+            out[key][1][cols], out[key][2][cols] = lo, hi
+
+    counts = draw_counts(S, n_boot, seed, chunk)
+    if jobs > 1 and M > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(data, counts)) as ex:
+            for m, reps in enumerate(ex.map(_metric_job, range(M))):
+                reduce(m, reps)
+    else:
+        for m in range(M):
+            reduce(m, _metric_replicates(data.metric(m), counts))
+    return out
+
+
+def ci_column(effect, bound, confidence=0.95):
+    """Column name of a bootstrap CI bound, e.g. ci_column("rbc", "low") -> "rbc_ci95_low"."""
+    level = f"{confidence * 100:g}".replace(".", "_")
+    return f"{effect}_ci{level}_{bound}"
+
+
+def bootstrap_tables(df, metrics, contrasts=CONTRASTS, conditions=CONDITIONS, **kwargs):
+    """
+    (friedman_ci_df, paired_ci_df): bootstrap CIs of Kendall's W per metric and
+    of Cohen's dz / RBC per (metric, contrast), ready to merge onto the engine's tables.
+    """
+    cube, _ = build_cube(df, metrics, conditions)
+    eff = bootstrap_effects(cube, contrasts, conditions, **kwargs)
+    col = lambda effect, bound: ci_column(effect, bound, kwargs.get("confidence", 0.95))
+    _, w_lo, w_hi = eff["kendalls_w"]
+    w_df = pd.DataFrame({"metric": list(metrics), col("kendalls_w", "low"): w_lo, col("kendalls_w", "high"): w_hi})
+
+    m_idx, c_idx = np.meshgrid(np.arange(len(metrics)), np.arange(len(contrasts)), indexing="ij")
+    m_idx, c_idx = m_idx.ravel(), c_idx.ravel()
+    at = lambda a: a[c_idx, m_idx]
+    pair_df = pd.DataFrame({
+        "metric": [metrics[m] for m in m_idx],
+        "contrast": [contrasts[c][0] for c in c_idx],
+        col("cohens_dz", "low"): at(eff["cohens_dz"][1]), col("cohens_dz", "high"): at(eff["cohens_dz"][2]),
+        col("rbc", "low"): at(eff["rbc"][1]), col("rbc", "high"): at(eff["rbc"][2]),
+    })
+    return w_df, pair_df
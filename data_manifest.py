@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import tempfile
+import pandas as pd
+
+from session_log import SESSION_MANIFEST, read_session_manifest
+
+# data/ 目录的文件清单：一次扫描，把每个文件名解析成
+# (modality, subject, condition, timestamp, round)，保存到 data/.manifest.json，
+# 之后按 mtime/size 增量刷新。所有 find_* 查找都走内存索引（O(1)）。
+# results/ 下的 session 容器目录（mist_session_{id}_{ts}/，见 session_log.py）按其
+# manifest.json 的 mtime/size 索引，记录里带上回忆轮次和文件列表，打开时不用再匹配。
+MANIFEST_NAME = ".manifest.json"
+MANIFEST_VERSION = 4
+
+_MIST_RE = re.compile(r"^mist_(results|recall|summary)_(.+)_(\d+)\.csv$")
+_SESSION_RE = re.compile(r"^mist_session_(.+)_(\d+)$")
+_BIO_COND_RE = re.compile(r"^(\d+)([A-D])_?Entity.*\.csv$")
+_BIO_RECORDING_RE = re.compile(r"^(\d+)Test_?Entity_Recording_(\d{4}(?:_\d{2}){5})")
+_FORCE_RE = re.compile(r"^(\d+)_(.+)\.csv$")
+
+# Condition C = No Clothes (没衣服, 无衣服); Condition D = Clothes (有衣服, 穿衣服)
+# 同一被试多个文件时按列表顺序取优先
+FORCE_KEYWORDS = {
+    "没衣服": ("C", 0), "无衣服": ("C", 1),
+    "有衣服": ("D", 0), "穿衣服": ("D", 1),
+}
+
+
+def _read_recall_rounds(path):
+    try:
+        d = pd.read_csv(path, usecols=["Round"])
+    except Exception:
+        return []
+    return sorted(set(pd.to_numeric(d["Round"], errors="coerce").dropna().astype(int).tolist()))
+
+
+def parse_session_dir(dname, path):
+    """Manifest record of a session container directory (None if it is not one or has no manifest yet)."""
+    m = _SESSION_RE.match(dname)
+    if not m:
+        return None
+    session = read_session_manifest(path)
+    if session is None:
+        return None
+    return {
+        "modality": "mist_session",
+        "subject": m.group(1),
+        "timestamp": int(m.group(2)),
+        # when the session last logged anything (the directory name is its start)
+        "updated": session.get("updated") or int(m.group(2)),
+        "rounds": session.get("recall_rounds", []),
+        "files": session.get("files", {}),
+        "finished": session.get("finished", False),
+    }
+
+
+def parse_data_file(rel_dir, fname, path):
+    """
+    Parse one data file name into a manifest record (None if it is not a data file).
+    Recall CSVs are the only files opened: their Round values are read once and cached.
+    """
+    rec = None
+    if rel_dir == "results":
+        m = _MIST_RE.match(fname)
+        if m:
+            kind, subject, ts = m.groups()
+            rec = {"modality": f"mist_{kind}", "subject": subject, "timestamp": int(ts)}
+            if kind == "recall":
+                rec["rounds"] = _read_recall_rounds(path)
+    elif rel_dir == "bio_data":
+        m = _BIO_COND_RE.match(fname)
+        if m:
+            rec = {"modality": "bio", "subject": m.group(1), "condition": m.group(2)}
+        else:
+            m = _BIO_RECORDING_RE.match(fname)
+            if m:
+                rec = {"modality": "bio_recording", "subject": m.group(1), "timestamp": m.group(2)}
+    elif rel_dir == "force_sensor":
+        m = _FORCE_RE.match(fname)
+        if m and m.group(2) in FORCE_KEYWORDS:
+            cond, rank = FORCE_KEYWORDS[m.group(2)]
+            rec = {"modality": "force", "subject": m.group(1), "condition": cond, "rank": rank}
+    elif rel_dir == "avatar_scale":
+        if fname.endswith(".xlsx"):
+            rec = {"modality": "avatar_scale"}
+    elif rel_dir == "" and fname.startswith("NASA-TLX"):
+        if "weights" in fname.lower() and fname.endswith((".csv", ".xlsx")):
+            rec = {"modality": "nasa_tlx_weights"}
+        elif fname.endswith(".xlsx"):
+            rec = {"modality": "nasa_tlx"}
+    return rec
+
+
+class DataManifest:
+    """
+    Index of everything under data_dir. refresh() rescans directories but only
+    re-parses files whose (mtime_ns, size) changed since the stored manifest.
+    """
+    SCAN_DIRS = ("", "results", "bio_data", "force_sensor", "avatar_scale")
+
+    def __init__(self, data_dir="data", store=True):
+        self.data_dir = data_dir
+        self.store_path = os.path.join(data_dir, MANIFEST_NAME) if store else None
+        self.files = {}  # relpath -> record
+        self._index = {}
+        if self.store_path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.store_path, encoding="utf-8") as f:
+                stored = json.load(f)
+            if stored.get("version") == MANIFEST_VERSION:
+                self.files = stored.get("files", {})
+        except (OSError, ValueError):
+            self.files = {}
+
+    def _save(self):
+        os.makedirs(self.data_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".manifest_", dir=self.data_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "files": self.files}, f, ensure_ascii=False)
+            os.replace(tmp, self.store_path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def refresh(self):
+        seen = {}
+        changed = False
+        for rel_dir in self.SCAN_DIRS:
+            abs_dir = os.path.join(self.data_dir, rel_dir) if rel_dir else self.data_dir
+            if not os.path.isdir(abs_dir):
+                continue
+            with os.scandir(abs_dir) as it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    is_session = entry.is_dir()
+                    if is_session:
+                        # session containers: keyed on their manifest.json, which is written last
+                        if rel_dir != "results" or not _SESSION_RE.match(entry.name):
+                            continue
+                        try:
+                            st = os.stat(os.path.join(entry.path, SESSION_MANIFEST))
+                        except OSError:
+                            continue
+                    elif entry.is_file():
+                        st = entry.stat()
+                    else:
+                        continue
+                    old = self.files.get(rel)
+                    if old is not None and old["mtime_ns"] == st.st_mtime_ns and old["size"] == st.st_size:
+                        seen[rel] = old
+                        continue
+                    if is_session:
+                        rec = parse_session_dir(entry.name, entry.path)
+                    else:
+                        rec = parse_data_file(rel_dir, entry.name, entry.path)
+                    if rec is None:
+                        rec = {"modality": None}
+                    rec.update({"mtime_ns": st.st_mtime_ns, "size": st.st_size})
+                    seen[rel] = rec
+                    changed = True
+        if set(seen) != set(self.files):
+            changed = True
+        self.files = seen
+        self._build_index()
+        if changed and self.store_path:
+            self._save()
+        return self
+
+    def _build_index(self):
+        index = {}
+        for rel, rec in sorted(self.files.items()):
+            if not rec.get("modality"):
+                continue
+            key = (rec["modality"], rec.get("subject"), rec.get("condition"))
+            index.setdefault(key, []).append((rel, rec))
+        for entries in index.values():
+            # timestamp / keyword rank first, file name as tie-break (same as sorted glob)
+            entries.sort(key=lambda e: (e[1].get("rank", 0), str(e[1].get("timestamp", "")).zfill(20), e[0]))
+        self._index = index
+
+    def path(self, rel):
+        return os.path.join(self.data_dir, *rel.split("/"))
+
+    def entries(self, modality, subject=None, condition=None):
+        """[(path, record)] for one (modality, subject, condition) key, in lookup order."""
+        subject = None if subject is None else str(subject)
+        return [(self.path(rel), rec) for rel, rec in self._index.get((modality, subject, condition), [])]
+
+    def latest(self, modality, subject=None, condition=None):
+        found = self.entries(modality, subject, condition)
+        return found[-1][0] if found else None
+
+    def first(self, modality, subject=None, condition=None):
+        found = self.entries(modality, subject, condition)
+        return found[0][0] if found else None
+
+    def subjects(self, modality):
+        return sorted({k[1] for k in self._index if k[0] == modality and k[1] is not None})
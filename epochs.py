@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# 连续记录（每个被试一个 PhysioLAB 文件）按 MIST 轮次切分为 epoch。
+# mist_results 的 Timestamp 是作答时刻（datetime.now()，精确到秒），
+# 题目出现时刻 = Timestamp - TimeTaken。
+MIST_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_RESOLUTION_S = 1.0
+
+
+def question_onsets(mist_df):
+    """
+    Per-question (onset, response) times as pd.Timestamp Series aligned with mist_df.
+    Response times are the logged Timestamp; onsets subtract TimeTaken.
+    """
+    answered = pd.to_datetime(mist_df["Timestamp"], format=MIST_TIME_FORMAT, errors="coerce")
+    taken = pd.to_timedelta(pd.to_numeric(mist_df["TimeTaken"], errors="coerce"), unit="s")
+    return answered - taken, answered
+
+
+def round_windows(mist_df):
+    """
+    round -> (start, end) pd.Timestamps covering every question of that round:
+    from the earliest question onset to the last response (+ timestamp resolution).
+    """
+    onsets, answered = question_onsets(mist_df)
+    rounds = pd.to_numeric(mist_df["Round"], errors="coerce")
+    windows = {}
+    for r in sorted(rounds.dropna().unique()):
+        mask = (rounds == r).to_numpy()
+        start = onsets[mask].min()
+        end = answered[mask].max()
+        if pd.isna(start) or pd.isna(end):
+            continue
+        windows[int(r)] = (start, end + pd.Timedelta(seconds=TIMESTAMP_RESOLUTION_S))
+    return windows
+
+
+def recording_time_base(rec):
+    """
+    Sorted float64 seconds relative to rec['start_time'] for searchsorted.
+    Falls back to the nominal sample clock when StorageTime has gaps or goes backwards.
+    """
+    t = np.asarray(rec["t"])
+    if t.size and np.isfinite(t).all() and not (np.diff(t) < 0).any():
+        return t
+    return np.arange(t.size, dtype=np.float64) / rec["fs"]
+
+
+def epoch_bounds(rec, start, end):
+    """Sample index range [i0, i1) of the recording that lies inside [start, end)."""
+    t = recording_time_base(rec)
+    t0 = (pd.Timestamp(start) - rec["start_time"]).total_seconds()
+    t1 = (pd.Timestamp(end) - rec["start_time"]).total_seconds()
+    i0, i1 = np.searchsorted(t, [t0, t1], side="left")
+    return int(i0), int(i1)
+
+
+def epoch_views(rec, start, end, channels=("BVP", "EDA", "RESP")):
+    """
+    Cut one epoch out of a recording. Returned arrays are slices of the
+    (memmapped) recording arrays, i.e. zero-copy views.
+    """
+    i0, i1 = epoch_bounds(rec, start, end)
+    return {ch: rec[ch][i0:i1] for ch in channels}
+
+
+def recording_coverage(rec, start, end, tolerance_s=TIMESTAMP_RESOLUTION_S):
+    """
+    Fraction of [start, end) that the recording spans (0.0 without a usable
+    time base). Up to tolerance_s of missing time counts as covered: the window
+    edges come from whole-second timestamps.
+    """
+    if pd.isna(rec.get("start_time", pd.NaT)):
+        return 0.0
+    t = recording_time_base(rec)
+    if t.size == 0:
+        return 0.0
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    rec_end = rec["start_time"] + pd.Timedelta(seconds=float(t[-1]) + 1.0 / rec["fs"])
+    window = (end - start).total_seconds()
+    covered = (min(end, rec_end) - max(start, rec["start_time"])).total_seconds()
+    if window - covered <= tolerance_s:
+        return 1.0
+    return min(max(covered / window, 0.0), 1.0)
+
@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from signal_cache import source_fingerprint
+from profiling import span
+
+# 每个 (modality, subject, condition) 的特征字典单独保存一份 JSON。
+# key = 输入文件指纹(size/mtime) + 额外参数(如 epoch 窗口) + 特征代码版本号；
+# key 不变就直接复用，只有过期的单元才会重新计算。
+FEATURE_STORE_DIR = os.path.join("data", ".feature_store")
+
+
+def unit_key(modality, input_paths, code_version, extra=None):
+    parts = {
+        "modality": modality,
+        "code_version": code_version,
+        "inputs": [
+            {"path": os.path.abspath(p), "hash": source_fingerprint(p)["source_hash"]}
+            for p in input_paths
+        ],
+        "extra": extra,
+    }
+    blob = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+def _unit_path(modality, subject, condition, store_dir):
+    return os.path.join(store_dir, modality, f"{subject}_{condition}.json")
+
+
+def load_unit(modality, subject, condition, key, store_dir=FEATURE_STORE_DIR):
+    """Stored feature dict for the unit, or None if missing or stale (key mismatch)."""
+    if store_dir is None:
+        return None
+    try:
+        with open(_unit_path(modality, subject, condition, store_dir), encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get("key") != key:
+        return None
+    return entry.get("features")
+
+
+def save_unit(modality, subject, condition, key, features, store_dir=FEATURE_STORE_DIR):
+    if store_dir is None:
+        return
+    path = _unit_path(modality, subject, condition, store_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "features": features}, f, default=float)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not store {modality} features for {subject}/{condition}: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def cached_features(modality, subject, condition, input_paths, code_version, compute, extra=None,
+                    store_dir=FEATURE_STORE_DIR):
+    """
+    Return the stored features of a unit when its key still matches, otherwise
+    compute() them and store the result. Empty results (read errors) are not stored.
+    """
+    with span(f"features.{modality}", subject=subject, condition=condition) as sp:
+        if store_dir is None:
+            sp.set(store="off")
+            return compute()
+        key = unit_key(modality, input_paths, code_version, extra)
+        features = load_unit(modality, subject, condition, key, store_dir)
+        if features is not None:
+            sp.set(store="hit")
+            return features
+        sp.set(store="miss")
+        features = compute()
+        if features:
+            save_unit(modality, subject, condition, key, features, store_dir)
+        return features
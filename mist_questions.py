@@ -0,0 +1,156 @@
+import random
+from array import array
+from functools import lru_cache
+
+# MIST 算术题生成（mist_test.py 使用）。题型与原来的拒绝采样版本相同：
+#   模式 1: A ± B ± C          模式 2: A * B ± C
+# 操作数范围随难度 level 放大，答案限制在 0..100。这里不再生成字符串后 eval、
+# 不合格就重来：每个难度先枚举一次所有可行的 (题型, A, B)，权重 = 能让答案落在
+# 0..100 的 C 的个数 × 原版选中该题型和这组操作数的概率，按权重抽一项再均匀抽 C，
+# 得到的分布与原来的“随机生成、不合格重来”完全相同，每题的耗时是固定的。
+# 干扰项同样直接从答案附近的合法取值里无放回抽取。
+# QuestionBank 在开始测试前按难度分桶（步长 BUCKET_STEP）用固定种子预先生成
+# 整个 session 需要的题目，答题过程中取下一题只是从对应桶里弹出一道。
+ANSWER_RANGE = (0, 100)
+N_OPTIONS = 5
+MIN_LEVEL = 0.6
+MAX_LEVEL = 2.0
+BUCKET_STEP = 0.1
+
+MODE1_OPS = [('+', '-'), ('-', '+'), ('+', '+'), ('-', '-')]
+MODE2_OPS = ['+', '-']
+# (mode, op1, op2) of every question form; the original picked a mode, then its ops
+FORMS = [(1, op1, op2) for op1, op2 in MODE1_OPS] + [(2, '*', op) for op in MODE2_OPS]
+_SIGN = {'+': 1, '-': -1}
+_CODE_BASE = 1024  # table entries pack (form, a, b) into one int
+
+
+def operand_ranges(level):
+    """Inclusive operand ranges of both modes at a difficulty level (as in the original generator)."""
+    return {
+        1: ((12, max(25, int(35 + 40 * level))),
+            (8, max(15, int(20 + 30 * level))),
+            (8, max(15, int(20 + 30 * level)))),
+        2: ((2, max(3, int(4 + 6 * level))),
+            (2, max(3, int(4 + 6 * level))),
+            (5, max(10, int(15 + 30 * level)))),
+    }
+
+
+def distractor_span(level):
+    return max(3, int(10 - 3 * (level - 1)))
+
+
+def _partial(form, a, b):
+    """A op1 B."""
+    return a * b if form[0] == 2 else a + _SIGN[form[1]] * b
+
+
+def _c_range(form, c_range, partial, answer_range=ANSWER_RANGE):
+    """Values of C in c_range that keep partial op2 C in answer_range, as (lo, hi); empty if lo > hi."""
+    (c_lo, c_hi), (r_lo, r_hi) = c_range, answer_range
+    if _SIGN[form[2]] > 0:
+        return max(c_lo, r_lo - partial), min(c_hi, r_hi - partial)
+    return max(c_lo, partial - r_hi), min(c_hi, partial - r_lo)
+
+
+@lru_cache(maxsize=None)
+def question_table(level):
+    """
+    Every feasible (form, a, b) at a level, packed as ints, with cumulative
+    weights: the number of C values that keep the answer in range times the
+    chance that the original generator picked that form and those operands.
+    Drawing an entry by weight and then C uniformly reproduces the original
+    generate-and-reject distribution exactly.
+    """
+    ranges = operand_ranges(level)
+    odds = {}  # 1 / P(form, a, b, c) under the original generator, up to a common factor
+    for mode, n_ops in ((1, len(MODE1_OPS)), (2, len(MODE2_OPS))):
+        odds[mode] = n_ops
+        for lo, hi in ranges[mode]:
+            odds[mode] *= hi - lo + 1
+    mode_weight = {1: odds[2], 2: odds[1]}
+    codes, cum = array('q'), array('q')
+    total = 0
+    for k, form in enumerate(FORMS):
+        (a_lo, a_hi), (b_lo, b_hi), c_range = ranges[form[0]]
+        for a in range(a_lo, a_hi + 1):
+            for b in range(b_lo, b_hi + 1):
+                lo, hi = _c_range(form, c_range, _partial(form, a, b))
+                if lo <= hi:
+                    total += (hi - lo + 1) * mode_weight[form[0]]
+                    codes.append((k * _CODE_BASE + a) * _CODE_BASE + b)
+                    cum.append(total)
+    return codes, cum
+
+
+def options_for(rng, answer, level):
+    """The answer plus N_OPTIONS - 1 distinct nearby distractors in answer range, shuffled."""
+    span = distractor_span(level)
+    r_lo, r_hi = ANSWER_RANGE
+    candidates = [answer + o for o in range(-span, span + 1) if o and r_lo <= answer + o <= r_hi]
+    while len(candidates) < N_OPTIONS - 1:  # only for tiny answer ranges
+        span += 1
+        candidates = [answer + o for o in range(-span, span + 1) if o and r_lo <= answer + o <= r_hi]
+    options = [answer] + rng.sample(candidates, N_OPTIONS - 1)
+    rng.shuffle(options)
+    return options
+
+
+def make_question(rng, level, _table=None):
+    """One question dict (expression, answer, options, level) at a difficulty level."""
+    codes, cum = _table or question_table(level)
+    code = rng.choices(codes, cum_weights=cum)[0]
+    k, rest = divmod(code, _CODE_BASE * _CODE_BASE)
+    a, b = divmod(rest, _CODE_BASE)
+    form = FORMS[k]
+    partial = _partial(form, a, b)
+    c = rng.randint(*_c_range(form, operand_ranges(level)[form[0]][2], partial))
+    answer = partial + _SIGN[form[2]] * c
+    return {
+        "expression": f"{a} {form[1]} {b} {form[2]} {c}",
+        "answer": answer,
+        "options": options_for(rng, answer, level),
+        "level": level,
+    }
+
+
+def bucket_level(level, step=BUCKET_STEP, min_level=MIN_LEVEL, max_level=MAX_LEVEL):
+    """Difficulty level rounded to its bucket."""
+    level = min(max(level, min_level), max_level)
+    return round(round(level / step) * step, 6)
+
+
+class QuestionBank:
+    """
+    Seeded questions for a whole session, pre-generated per difficulty bucket.
+    draw(level) pops the next question of level's bucket; an exhausted bucket
+    is topped up from the same seeded generator.
+    """
+
+    def __init__(self, seed, per_bucket, step=BUCKET_STEP, min_level=MIN_LEVEL, max_level=MAX_LEVEL):
+        self.seed = seed
+        self.step = step
+        self.min_level = min_level
+        self.max_level = max_level
+        self.rng = random.Random(seed)
+        n_buckets = int(round((max_level - min_level) / step)) + 1
+        self.levels = [round(min_level + i * step, 6) for i in range(n_buckets)]
+        self.tables = {lv: question_table(lv) for lv in self.levels}
+        # list.pop() from the end is O(1); reversed so questions come out in generation order
+        self.buckets = {
+            lv: [make_question(self.rng, lv, self.tables[lv]) for _ in range(per_bucket)][::-1]
+            for lv in self.levels
+        }
+
+    def draw(self, level):
+        lv = bucket_level(level, self.step, self.min_level, self.max_level)
+        bucket = self.buckets[lv]
+        if not bucket:
+            bucket.append(make_question(self.rng, lv, self.tables[lv]))
+        return bucket.pop()
+
+    def advance(self, levels):
+        """Repeat earlier draws (their levels, in order), e.g. to continue a resumed session."""
+        for level in levels:
+            self.draw(level)
@@ -2,12 +2,20 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import random
 import time
-import csv
 import os
+import argparse
 from datetime import datetime
 
+from mist_questions import QuestionBank, N_OPTIONS
+from trial_timer import EventClock, TrialTimer
+from session_log import (
+    LOG_VERSION, SESSION_EVENTS, SESSION_FILES, TIMING_FIELDS, SessionLog, container_for, events_path, replay,
+    resume_point,
+    session_dir_path, snapshot_session, write_csv,
+)
+
 class MISTApp:
-    def __init__(self, root):
+    def __init__(self, root, seed=None, resume=None):
         self.root = root
         self.root.title("Montreal Image Stress Test (MIST)")
         self.root.geometry("900x700")
@@ -21,6 +29,7 @@ class MISTApp:
         
         # --- 单词记忆配置 ---
         self.WORD_DISPLAY_TIME = 2000 # 毫秒
+        self.REFRESH_INTERVAL_MS = 1000 / 60 # 显示器刷新间隔，刺激出现延迟应低于此值
         
         # 单词库 (中文, 英文) - 总共需要 4轮 * 10个 = 40个目标词，以及 40个干扰词
         self.all_targets = [
@@ -61,7 +70,6 @@ class MISTApp:
         
         self.current_question_data = None
         self.timer_running = False
-        self.remaining_time = 0
         self.start_time_question = 0
         self.base_time_limit = self.TIME_LIMIT
         self.target_accuracy = 0.5
@@ -72,6 +80,27 @@ class MISTApp:
         self.performance_window = 12
         self.recent_results = []
         
+        # --- 续做：从预写日志恢复已完成的轮次（见 session_log.py） ---
+        self.session_log = None
+        self.session_dir = None
+        resumed = replay(resume) if resume else None
+        if resumed is not None and seed is None:
+            seed = resumed["seed"]
+        
+        # --- 题库：每个难度桶都备好整个 session 的题量（练习 5 题 + 正式轮） ---
+        self.question_seed = seed if seed is not None else random.SystemRandom().randrange(2**31)
+        per_bucket = 5 + self.TOTAL_ROUNDS * self.QUESTIONS_PER_ROUND
+        self.question_bank = QuestionBank(self.question_seed, per_bucket=per_bucket)
+        if resumed is not None:
+            # 续做时已经出过的题不再出：按日志里的 draw 记录让题库前进；
+            # 没有 draw 记录的旧日志改用 (种子, 第几次续做) 派生的题库
+            if resumed["draws"]:
+                self.question_bank.advance(resumed["draws"])
+            else:
+                self.question_bank = QuestionBank(f"{self.question_seed}/resume{resumed['resumes'] + 1}",
+                                                  per_bucket=per_bucket)
+        print(f"Question seed: {self.question_seed}")
+        
         # --- 样式 ---
         self.style = ttk.Style()
         self.style.theme_use('clam')
@@ -80,43 +109,88 @@ class MISTApp:
         self.style.configure("Header.TLabel", font=("Helvetica", 32, "bold"), background="white")
         self.style.configure("Timer.Horizontal.TProgressbar", background="#4caf50")
         
+        # --- 计时：perf_counter 截止时间 + Tk 事件时间戳算反应时 ---
+        self.event_clock = EventClock()
+        self.timer = TrialTimer(self.root, on_tick=self.on_timer_tick, on_colour=self.on_timer_colour,
+                                on_timeout=self.handle_timeout)
+        self.response_latencies = []
+        self.option_press_time = None
+        # 鼠标移动事件只用来校准事件时钟
+        self.root.bind_all('<Motion>', self.event_clock.observe, add='+')
+        
         # 绑定键盘事件
         self.root.bind('<Key>', self.handle_keypress)
         
-        # 初始化界面容器
+        # 初始化界面容器：每个界面只建一次，叠放在同一格里，用 tkraise 切换，
+        # 每题只更新文字和状态（不再销毁重建控件）
         self.main_frame = tk.Frame(self.root, bg="white")
         self.main_frame.pack(expand=True, fill="both", padx=20, pady=20)
-        
-        self.show_login_screen()
+        self.main_frame.grid_rowconfigure(0, weight=1)
+        self.main_frame.grid_columnconfigure(0, weight=1)
+        self.onset_latencies = [] # 刺激出现延迟：从请求切换界面到界面绘制完成
+        self.screens = {}
+        self.build_login_screen()
+        self.build_intermission_screen()
+        self.build_question_screen()
+        self.build_word_screen()
+        self.build_recall_screen()
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
+        
+        if resumed is not None:
+            self.resume_session(resume, resumed)
+        else:
+            self.show_login_screen()
 
-    def clear_frame(self):
-        for widget in self.main_frame.winfo_children():
-            widget.destroy()
+    def add_screen(self, name):
+        frame = tk.Frame(self.main_frame, bg="white")
+        frame.grid(row=0, column=0, sticky="nsew")
+        self.screens[name] = frame
+        return frame
+
+    def show_screen(self, name, onset_kind=None, requested=None):
+        """
+        Raise a prebuilt screen. With onset_kind, pending redraws are flushed and
+        the latency from `requested` (perf_counter) to a drawn screen is recorded;
+        returns the onset time.
+        """
+        self.screens[name].tkraise()
+        if onset_kind is None:
+            return None
+        self.root.update_idletasks()
+        onset = time.perf_counter()
+        self.onset_latencies.append({
+            "trial": (self.current_round, self.current_question_index),
+            "kind": onset_kind,
+            "latency_ms": (onset - requested) * 1000.0,
+        })
+        return onset
 
     def handle_keypress(self, event):
         # 仅在测试进行中处理 1-5 的按键
         if hasattr(self, 'state') and self.state == 'testing':
             if event.char in ['1', '2', '3', '4', '5']:
                 index = int(event.char) - 1
-                self.submit_answer(index)
+                self.submit_answer(index, self.event_clock.observe(event))
 
     # --- 1. 登录界面 ---
-    def show_login_screen(self):
-        self.state = 'login'
-        self.clear_frame()
-        
-        tk.Label(self.main_frame, text="Montreal Image Stress Test", font=("Helvetica", 40, "bold"), bg="white").pack(pady=60)
+    def build_login_screen(self):
+        frame = self.add_screen('login')
+        tk.Label(frame, text="Montreal Image Stress Test", font=("Helvetica", 40, "bold"), bg="white").pack(pady=60)
         
-        input_frame = tk.Frame(self.main_frame, bg="white")
+        input_frame = tk.Frame(frame, bg="white")
         input_frame.pack(pady=30)
         
         tk.Label(input_frame, text="请输入被试 ID:", font=("Helvetica", 24), bg="white").pack(side="left", padx=15)
         self.id_entry = tk.Entry(input_frame, font=("Helvetica", 24))
         self.id_entry.pack(side="left", padx=15)
-        self.id_entry.focus()
         
-        start_btn = ttk.Button(self.main_frame, text="开始测试", command=self.start_test)
+        start_btn = ttk.Button(frame, text="开始测试", command=self.start_test)
         start_btn.pack(pady=30)
+
+    def show_login_screen(self):
+        self.state = 'login'
+        self.show_screen('login')
+        self.id_entry.focus()
         
         # 绑定回车键开始
         self.root.bind('<Return>', lambda e: self.start_test())
@@ -129,13 +203,33 @@ class MISTApp:
         
         self.subject_id = subject_id
         self.root.unbind('<Return>') # 解绑回车
+        self.main_frame.focus_set() # 登录界面只是被盖住，输入框不能继续接收按键
         self.current_round = 0 # 0 表示练习轮
+        
+        # 每个结果先写入 session 目录里的预写日志（后台线程落盘），崩溃后可以续做
+        self.session_dir = session_dir_path(self.subject_id)
+        self.session_log = SessionLog(os.path.join(self.session_dir, SESSION_EVENTS))
+        self.session_log.append("session_start", version=LOG_VERSION, subject_id=self.subject_id, seed=self.question_seed,
+                                config=self.session_config(), adaptive=self.adaptive_state())
+        print(f"Session: {self.session_dir}")
         self.show_intermission_screen(first_start=True)
 
     # --- 2. 间隔/说明界面 ---
+    def build_intermission_screen(self):
+        frame = self.add_screen('intermission')
+        self.intermission_title = tk.Label(frame, text="", font=("Helvetica", 36, "bold"), bg="white")
+        self.intermission_title.pack(pady=60)
+        self.intermission_info = tk.Label(frame, text="", font=("Helvetica", 24), bg="white", justify="center")
+        self.intermission_info.pack(pady=30)
+        
+        # 手动开始提示
+        tk.Label(frame, text="请点击下方按钮开始本轮测试", font=("Helvetica", 20), fg="gray", bg="white").pack(pady=40)
+        
+        btn = ttk.Button(frame, text="开始本轮", command=self.start_round)
+        btn.pack()
+
     def show_intermission_screen(self, first_start=False):
         self.state = 'intermission'
-        self.clear_frame()
         
         if self.current_round == 0:
             title_text = "练习轮 (测定基准反应时间)"
@@ -154,20 +248,15 @@ class MISTApp:
                 f"每题有时间限制！"
             )
             
-        tk.Label(self.main_frame, text=title_text, font=("Helvetica", 36, "bold"), bg="white").pack(pady=60)
-        tk.Label(self.main_frame, text=info_text, font=("Helvetica", 24), bg="white", justify="center").pack(pady=30)
-        
-        # 手动开始提示
-        tk.Label(self.main_frame, text="请点击下方按钮开始本轮测试", font=("Helvetica", 20), fg="gray", bg="white").pack(pady=40)
-        
-        btn = ttk.Button(self.main_frame, text="开始本轮", command=self.start_round)
-        btn.pack()
+        self.intermission_title.config(text=title_text)
+        self.intermission_info.config(text=info_text)
+        self.show_screen('intermission')
 
-    # --- 3. 测试进行中界面 ---
     def start_round(self):
         self.state = 'testing'
         self.current_question_index = 0
         self.round_start_times[self.current_round] = time.time()
+        self.log("round_start", round=self.current_round, time=self.round_start_times[self.current_round])
         
         # 准备本轮单词
         if self.current_round == 0:
@@ -198,100 +287,46 @@ class MISTApp:
             return
             
         # 步骤 1: 显示算术题
+        requested = time.perf_counter()
         self.current_question_index += 1
         self.current_question_data = self.generate_question()
-        self.start_time_question = time.time()
         
         self.setup_question_ui()
-        self.start_timer()
+        # 题目界面绘制完成的时刻就是刺激出现时刻，从这里开始计时
+        onset = self.show_screen('question', onset_kind='question', requested=requested)
+        self.start_timer(onset)
 
     def generate_question(self):
-        # 生成简单到中等的算术题 (A op B op C)
-        ops = ['+', '-', '*']
-        # 限制乘法以保持难度适中
-        
-        while True:
-            # 模式 1: A + B - C
-            # 模式 2: A * B - C (A, B 较小)
-            mode = random.choice([1, 2])
-            level = self.difficulty_level
-            if mode == 1:
-                a_high = max(25, int(35 + 40 * level))
-                b_high = max(15, int(20 + 30 * level))
-                c_high = max(15, int(20 + 30 * level))
-                a = random.randint(12, a_high)
-                b = random.randint(8, b_high)
-                c = random.randint(8, c_high)
-                op1, op2 = random.choice([('+', '-'), ('-', '+'), ('+', '+'), ('-', '-')])
-                expression = f"{a} {op1} {b} {op2} {c}"
-            else:
-                mul_high = max(3, int(4 + 6 * level))
-                third_high = max(10, int(15 + 30 * level))
-                a = random.randint(2, mul_high)
-                b = random.randint(2, mul_high)
-                c = random.randint(5, third_high)
-                op1 = '*'
-                op2 = random.choice(['+', '-'])
-                expression = f"{a} {op1} {b} {op2} {c}"
-            
-            try:
-                ans = eval(expression)
-                # 确保答案是正整数且不太大
-                if 0 <= ans <= 100:
-                    break
-            except:
-                continue
-                
-        # 生成选项
-        options = {ans}
-        offset_span = max(3, int(10 - 3 * (self.difficulty_level - 1)))
-        while len(options) < 5:
-            # 生成干扰项：接近正确答案的数字
-            offset = random.randint(-offset_span, offset_span)
-            if offset == 0: continue
-            fake = ans + offset
-            if 0 <= fake <= 100:
-                options.add(fake)
-        
-        options_list = list(options)
-        random.shuffle(options_list)
-        
-        return {
-            "expression": expression,
-            "answer": ans,
-            "options": options_list
-        }
+        # 题目来自开始前预生成的题库（mist_questions.py），按当前难度所在的桶取下一道
+        question = self.question_bank.draw(self.difficulty_level)
+        self.log("draw", level=self.difficulty_level)
+        return question
 
-    def setup_question_ui(self):
-        self.clear_frame()
+    def build_question_screen(self):
+        frame = self.add_screen('question')
         
         # 顶部信息
-        top_frame = tk.Frame(self.main_frame, bg="white")
+        top_frame = tk.Frame(frame, bg="white")
         top_frame.pack(fill="x", pady=15)
-        
-        if self.current_round == 0:
-            round_text = "练习轮"
-            total_q = self.questions_this_round
-        else:
-            round_text = f"第 {self.current_round} / {self.TOTAL_ROUNDS} 轮"
-            total_q = self.QUESTIONS_PER_ROUND
-            
-        tk.Label(top_frame, text=round_text, font=("Helvetica", 20), bg="white").pack(side="left")
-        tk.Label(top_frame, text=f"题目: {self.current_question_index} / {total_q}", font=("Helvetica", 20), bg="white").pack(side="right")
+        self.round_label = tk.Label(top_frame, text="", font=("Helvetica", 20), bg="white")
+        self.round_label.pack(side="left")
+        self.question_index_label = tk.Label(top_frame, text="", font=("Helvetica", 20), bg="white")
+        self.question_index_label.pack(side="right")
         
         # 算术题显示
-        tk.Label(self.main_frame, text=self.current_question_data["expression"] + " = ?", font=("Helvetica", 72, "bold"), bg="white").pack(pady=50)
+        self.expression_label = tk.Label(frame, text="", font=("Helvetica", 72, "bold"), bg="white")
+        self.expression_label.pack(pady=50)
         
         # 选项按钮区域
-        options_frame = tk.Frame(self.main_frame, bg="white")
+        options_frame = tk.Frame(frame, bg="white")
         options_frame.pack(pady=30)
         
         self.option_buttons = []
-        for i, option in enumerate(self.current_question_data["options"]):
-            # 键盘提示 (1-5)
-            btn_text = f"{option}\n[{i+1}]"
-            btn = tk.Button(options_frame, text=btn_text, font=("Helvetica", 24), width=8, height=2,
-                            command=lambda idx=i: self.submit_answer(idx), bg="white", relief="raised")
+        for i in range(N_OPTIONS):
+            btn = tk.Button(options_frame, text="", font=("Helvetica", 24), width=8, height=2,
+                            command=lambda idx=i: self.submit_answer(idx, self.option_press_time),
+                            bg="white", relief="raised")
+            btn.bind('<ButtonPress-1>', self.on_option_press, add='+')
             btn.grid(row=0, column=i, padx=15)
             self.option_buttons.append(btn)
             
@@ -300,13 +335,32 @@ class MISTApp:
         self.progress_var.set(100)
         
         # 自定义进度条颜色
-        self.progress_bar = ttk.Progressbar(self.main_frame, variable=self.progress_var, maximum=100, style="Timer.Horizontal.TProgressbar", length=800)
+        self.progress_bar = ttk.Progressbar(frame, variable=self.progress_var, maximum=100, style="Timer.Horizontal.TProgressbar", length=800)
         self.progress_bar.pack(pady=40)
         
-        self.feedback_label = tk.Label(self.main_frame, text="", font=("Helvetica", 24), bg="white")
+        self.feedback_label = tk.Label(frame, text="", font=("Helvetica", 24), bg="white")
         self.feedback_label.pack(pady=10)
 
-    def start_timer(self):
+    def setup_question_ui(self):
+        if self.current_round == 0:
+            round_text = "练习轮"
+            total_q = self.questions_this_round
+        else:
+            round_text = f"第 {self.current_round} / {self.TOTAL_ROUNDS} 轮"
+            total_q = self.QUESTIONS_PER_ROUND
+            
+        self.round_label.config(text=round_text)
+        self.question_index_label.config(text=f"题目: {self.current_question_index} / {total_q}")
+        self.expression_label.config(text=self.current_question_data["expression"] + " = ?")
+        
+        for i, (btn, option) in enumerate(zip(self.option_buttons, self.current_question_data["options"])):
+            # 键盘提示 (1-5)
+            btn.config(text=f"{option}\n[{i+1}]", state="normal")
+            
+        self.progress_var.set(100)
+        self.feedback_label.config(text="")
+
+    def start_timer(self, onset=None):
         self.timer_running = True
         # 如果是练习轮，给一个很长的时间，实际上不限制
         if self.current_round == 0:
@@ -314,40 +368,45 @@ class MISTApp:
         else:
             self.current_time_limit = self.TIME_LIMIT
             
-        self.remaining_time = self.current_time_limit
-        self.update_timer()
+        # 从刺激出现时刻开始计时（perf_counter 截止时间，见 trial_timer.py）
+        self.option_press_time = None
+        self.start_time_question = self.timer.start(
+            self.current_time_limit, trial=(self.current_round, self.current_question_index), onset=onset)
 
-    def update_timer(self):
-        if not self.timer_running:
-            return
-            
-        self.remaining_time -= 0.05 # 50ms 更新一次
-        percentage = (self.remaining_time / self.current_time_limit) * 100
+    def on_timer_tick(self, percentage):
         self.progress_var.set(percentage)
-        
-        # 颜色变化增加压力
-        if percentage < 30:
-            self.style.configure("Timer.Horizontal.TProgressbar", background="#e74c3c") # 红色
-        elif percentage < 60:
-            self.style.configure("Timer.Horizontal.TProgressbar", background="#f39c12") # 橙色
-        else:
-            self.style.configure("Timer.Horizontal.TProgressbar", background="#4caf50") # 绿色
-            
-        if self.remaining_time <= 0:
-            self.handle_timeout()
-        else:
-            self.root.after(50, self.update_timer)
+
+    def on_timer_colour(self, colour):
+        # 颜色变化增加压力（只在跨过阈值时重设样式）
+        self.style.configure("Timer.Horizontal.TProgressbar", background=colour)
 
     def handle_timeout(self):
         self.timer_running = False
         self.record_result(None, False, self.current_time_limit, timeout=True)
         self.show_feedback(False, timeout=True)
 
-    def submit_answer(self, index):
+    def on_option_press(self, event):
+        # 鼠标按下的时刻即反应时刻（按钮 command 要等松开才触发）
+        self.option_press_time = self.event_clock.observe(event)
+
+    def submit_answer(self, index, response_time=None):
         if not self.timer_running: return # 防止重复提交
         
         self.timer_running = False
-        elapsed_time = time.time() - self.start_time_question
+        self.timer.stop()
+        # response_time: 触发事件的时间戳（perf_counter 秒）；没有时用当前时刻
+        if response_time is None:
+            response_time = time.perf_counter()
+        if response_time >= self.timer.deadline:
+            # 作答发生在截止之后（只是超时 tick 还没来得及执行）：按超时处理
+            self.handle_timeout()
+            return
+        elapsed_time = max(0.0, response_time - self.start_time_question)
+        self.response_latencies.append({
+            "trial": (self.current_round, self.current_question_index),
+            "rt": elapsed_time,
+            "late_ms": (time.perf_counter() - response_time) * 1000.0,
+        })
         
         selected_value = self.current_question_data["options"][index]
         correct_value = self.current_question_data["answer"]
@@ -376,6 +435,7 @@ class MISTApp:
             if len(self.recent_results) > self.performance_window:
                 self.recent_results.pop(0)
             self.adjust_difficulty()
+        self.log("trial", result=result, adaptive=self.adaptive_state())
 
     def adjust_difficulty(self):
         if not self.recent_results or self.base_time_limit is None:
@@ -410,9 +470,18 @@ class MISTApp:
         else:
             self.root.after(800, self.show_word_display)
 
+    def build_word_screen(self):
+        frame = self.add_screen('word')
+        tk.Label(frame, text="请记忆", font=("Helvetica", 24), fg="gray", bg="white").pack(pady=40)
+        
+        self.word_zh_label = tk.Label(frame, text="", font=("Helvetica", 80, "bold"), fg="#2980b9", bg="white")
+        self.word_zh_label.pack(pady=20)
+        self.word_en_label = tk.Label(frame, text="", font=("Helvetica", 40), fg="#34495e", bg="white")
+        self.word_en_label.pack(pady=10)
+
     def show_word_display(self):
         self.state = 'word_display'
-        self.clear_frame()
+        requested = time.perf_counter()
         
         # 获取当前题目对应的单词 (index 已经是 1-based，所以要 -1)
         word_idx = self.current_question_index - 1
@@ -421,10 +490,9 @@ class MISTApp:
         else:
             zh_word, en_word = "无", "None"
             
-        tk.Label(self.main_frame, text="请记忆", font=("Helvetica", 24), fg="gray", bg="white").pack(pady=40)
-        
-        tk.Label(self.main_frame, text=zh_word, font=("Helvetica", 80, "bold"), fg="#2980b9", bg="white").pack(pady=20)
-        tk.Label(self.main_frame, text=en_word, font=("Helvetica", 40), fg="#34495e", bg="white").pack(pady=10)
+        self.word_zh_label.config(text=zh_word)
+        self.word_en_label.config(text=en_word)
+        self.show_screen('word', onset_kind='word', requested=requested)
         
         # 自动进入下一题
         self.root.after(self.WORD_DISPLAY_TIME, self.next_trial_step)
@@ -445,20 +513,41 @@ class MISTApp:
             else:
                 self.TIME_LIMIT = 6.0 # 默认值加快
             self.base_time_limit = self.TIME_LIMIT
+            self.log("round_end", round=0, time=self.round_end_times[0], adaptive=self.adaptive_state())
                 
             # 进入第一轮
             self.current_round = 1
             self.show_intermission_screen()
         else:
+            self.log("round_end", round=self.current_round, time=self.round_end_times[self.current_round],
+                     adaptive=self.adaptive_state())
             self.show_recall_screen()
 
     # --- 4. 单词回忆界面 ---
+    def build_recall_screen(self):
+        frame = self.add_screen('recall')
+        self.recall_title = tk.Label(frame, text="", font=("Helvetica", 40, "bold"), bg="white")
+        self.recall_title.pack(pady=20)
+        tk.Label(frame, text="请勾选刚才出现过的所有单词", font=("Helvetica", 24), bg="white").pack(pady=10)
+        
+        # 创建一个 Frame 来放选项，使用 grid 布局；每轮目标词 + 干扰词各 QUESTIONS_PER_ROUND 个
+        options_frame = tk.Frame(frame, bg="white")
+        options_frame.pack(pady=20, expand=True)
+        
+        cols = 5
+        self.recall_checkbuttons = []
+        for i in range(2 * self.QUESTIONS_PER_ROUND):
+            var = tk.BooleanVar()
+            cb = tk.Checkbutton(options_frame, text="", variable=var, font=("Helvetica", 18), bg="white")
+            cb.grid(row=i//cols, column=i%cols, padx=20, pady=10, sticky="w")
+            self.recall_checkbuttons.append((cb, var))
+            
+        submit_btn = ttk.Button(frame, text="提交本轮回忆", command=self.submit_recall)
+        submit_btn.pack(pady=20)
+
     def show_recall_screen(self):
         self.state = 'recall'
-        self.clear_frame()
-        
-        tk.Label(self.main_frame, text=f"第 {self.current_round} 轮 - 单词回忆", font=("Helvetica", 40, "bold"), bg="white").pack(pady=20)
-        tk.Label(self.main_frame, text="请勾选刚才出现过的所有单词", font=("Helvetica", 24), bg="white").pack(pady=10)
+        self.recall_title.config(text=f"第 {self.current_round} 轮 - 单词回忆")
         
         # 混合选项: 本轮目标 + 本轮干扰
         # 提取中文用于显示
@@ -469,20 +558,15 @@ class MISTApp:
         random.shuffle(all_options)
         
         self.recall_vars = {}
-        
-        # 创建一个 Frame 来放选项，使用 grid 布局
-        options_frame = tk.Frame(self.main_frame, bg="white")
-        options_frame.pack(pady=20, expand=True)
-        
-        cols = 5
-        for i, word in enumerate(all_options):
-            var = tk.BooleanVar()
-            self.recall_vars[word] = var
-            cb = tk.Checkbutton(options_frame, text=word, variable=var, font=("Helvetica", 18), bg="white")
-            cb.grid(row=i//cols, column=i%cols, padx=20, pady=10, sticky="w")
-            
-        submit_btn = ttk.Button(self.main_frame, text="提交本轮回忆", command=self.submit_recall)
-        submit_btn.pack(pady=20)
+        for i, (cb, var) in enumerate(self.recall_checkbuttons):
+            if i < len(all_options):
+                var.set(False)
+                cb.config(text=all_options[i])
+                cb.grid()
+                self.recall_vars[all_options[i]] = var
+            else:
+                cb.grid_remove()
+        self.show_screen('recall')
 
     def submit_recall(self):
         # 计算回忆成绩
@@ -513,7 +597,8 @@ class MISTApp:
         }
         self.recall_stats.append(stats)
         
-        self.save_recall_results()
+        self.log("recall", round=self.current_round, rows=self.recall_rows(), stats=stats)
+        self.save_session()
         
         # 决定下一步
         if self.current_round < self.TOTAL_ROUNDS:
@@ -522,44 +607,32 @@ class MISTApp:
         else:
             self.show_results_screen()
 
-    def save_recall_results(self):
-        if not os.path.exists('results'):
-            os.makedirs('results')
-            
-        filename = f"results/mist_recall_{self.subject_id}_{int(time.time())}.csv"
-        
-        # 如果是第一轮，写入表头；否则追加
-        # 这里简化处理，每次都写全量或者追加。为了简单，每次追加一行记录
-        # 但为了分析方便，我们记录详细的每个词的选择情况
-        
-        # 实际上，我们可以只记录汇总，或者记录详细。
-        # 这里记录详细：Round, Word, IsTarget, Selected, IsCorrect
-        
-        mode = 'a' if os.path.exists(filename) else 'w'
-        with open(filename, mode, newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if mode == 'w':
-                writer.writerow(["SubjectID", "Round", "Word", "IsTarget", "Selected", "IsCorrectSelection"])
-            
-            targets_zh = [w[0] for w in self.current_round_targets]
-            
-            for word, var in self.recall_vars.items():
-                is_target = word in targets_zh
-                selected = var.get()
-                is_correct_sel = (is_target == selected)
-                writer.writerow([self.subject_id, self.current_round, word, is_target, selected, is_correct_sel])
+    def recall_rows(self):
+        # 记录详细：每个词一行 SubjectID, Round, Word, IsTarget, Selected, IsCorrectSelection
+        targets_zh = [w[0] for w in self.current_round_targets]
+        rows = []
+        for word, var in self.recall_vars.items():
+            is_target = word in targets_zh
+            selected = var.get()
+            rows.append([self.subject_id, self.current_round, word, is_target, selected, is_target == selected])
+        return rows
+
+    def save_session(self):
+        # 每轮回忆提交后和测试结束时，由日志重建 session 目录里的 CSV 和 manifest.json
+        self.write_later(snapshot_session, self.session_dir, self.session_log.path)
 
-    # --- 5. 结果统计界面 ---
     def show_results_screen(self):
         self.state = 'results'
-        self.clear_frame()
-        self.save_results_to_csv()
-        self.save_summary_csv()
+        self.log("session_end")
+        self.save_timing_csv()
+        self.save_session()
+        
+        frame = self.add_screen('results')
         
-        tk.Label(self.main_frame, text="测试完成", font=("Helvetica", 40, "bold"), bg="white").pack(pady=40)
+        tk.Label(frame, text="测试完成", font=("Helvetica", 40, "bold"), bg="white").pack(pady=40)
         
         # 统计数据
-        stats_frame = tk.Frame(self.main_frame, bg="white", padx=30, pady=30, relief="groove", bd=2)
+        stats_frame = tk.Frame(frame, bg="white", padx=30, pady=30, relief="groove", bd=2)
         stats_frame.pack(fill="both", expand=True, padx=60, pady=30)
         
         tk.Label(stats_frame, text="结果统计", font=("Helvetica", 28, "bold"), bg="white").pack(pady=15)
@@ -597,56 +670,106 @@ class MISTApp:
             text = f"第 {r} 轮: 正确率 {r_acc:.1f}% | 完成用时: {duration:.1f} 秒"
             tk.Label(stats_frame, text=text, font=("Helvetica", 20), bg="white").pack(anchor="w")
 
-        tk.Label(self.main_frame, text=f"结果已保存至 results/mist_results_{self.subject_id}.csv", font=("Helvetica", 16), fg="gray", bg="white").pack(pady=10)
-        tk.Label(self.main_frame, text=f"汇总已保存至 results/mist_summary_{self.subject_id}.csv", font=("Helvetica", 16), fg="gray", bg="white").pack(pady=10)
+        tk.Label(frame, text=f"结果和汇总已保存至 {self.session_dir}", font=("Helvetica", 16), fg="gray", bg="white").pack(pady=10)
         
-        ttk.Button(self.main_frame, text="退出", command=self.root.quit).pack(pady=10)
+        ttk.Button(frame, text="退出", command=self.quit).pack(pady=10)
+        self.show_screen('results')
 
-    def save_results_to_csv(self):
-        if not os.path.exists('results'):
-            os.makedirs('results')
-            
-        filename = f"results/mist_results_{self.subject_id}_{int(time.time())}.csv"
-        
-        fieldnames = ["SubjectID", "Round", "QuestionIndex", "Expression", "CorrectAnswer", "UserAnswer", "IsCorrect", "TimeTaken", "Timeout", "Timestamp"]
-        
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.all_results)
+    def save_timing_csv(self):
+        # 计时精度记录：每个 tick 相对计划时刻的延迟、超时相对截止时刻的延迟、
+        # 每次作答从事件发生到回调执行的延迟（反应时已按事件时间戳校正），
+        # 以及题目 / 单词界面从请求切换到绘制完成的延迟
+        filename = os.path.join(self.session_dir, SESSION_FILES["timing"])
+        
+        rows = []
+        for t in self.timer.ticks:
+            r, q = t["trial"]
+            kind = "timeout" if t["timeout"] else "tick"
+            rows.append([self.subject_id, r, q, kind, f"{t['due']:.4f}", f"{t['at']:.4f}", f"{t['late_ms']:.2f}"])
+        for x in self.response_latencies:
+            r, q = x["trial"]
+            rows.append([self.subject_id, r, q, "response", "", f"{x['rt']:.4f}", f"{x['late_ms']:.2f}"])
+        for x in self.onset_latencies:
+            r, q = x["trial"]
+            rows.append([self.subject_id, r, q, f"onset_{x['kind']}", "", "", f"{x['latency_ms']:.2f}"])
+        self.write_later(write_csv, filename, TIMING_FIELDS, rows)
+        
+        summary = self.timer.jitter_summary()
+        for kind, st in summary.items():
+            if st["n"]:
+                print(f"Timer {kind}: n={st['n']} late mean {st['mean_ms']:.1f} ms, p95 {st['p95_ms']:.1f} ms, max {st['max_ms']:.1f} ms")
+        if self.onset_latencies:
+            lat = sorted(x["latency_ms"] for x in self.onset_latencies)
+            slow = sum(1 for v in lat if v > self.REFRESH_INTERVAL_MS)
+            print(f"Stimulus onset: n={len(lat)} median {lat[len(lat) // 2]:.1f} ms, max {lat[-1]:.1f} ms, "
+                  f"{slow} over one refresh ({self.REFRESH_INTERVAL_MS:.1f} ms)")
 
-    def save_summary_csv(self):
-        if not os.path.exists('results'):
-            os.makedirs('results')
-            
-        filename = f"results/mist_summary_{self.subject_id}_{int(time.time())}.csv"
-        
-        with open(filename, mode='w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Round", "Arithmetic_Correct", "Arithmetic_Total", "Arithmetic_Accuracy", "Avg_Response_Time", "Word_Correct", "Word_FalseAlarm", "Word_Total_Targets"])
-            
-            for r in range(1, self.TOTAL_ROUNDS + 1):
-                # Arithmetic Stats
-                round_res = [x for x in self.all_results if x['Round'] == r]
-                r_correct = sum(1 for x in round_res if x['IsCorrect'])
-                r_total = len(round_res)
-                r_acc = (r_correct / r_total * 100) if r_total > 0 else 0
-                avg_time = sum(x['TimeTaken'] for x in round_res) / r_total if r_total > 0 else 0
-                
-                # Word Recall Stats
-                recall = next((s for s in self.recall_stats if s['round'] == r), None)
-                if recall:
-                    w_correct = recall['correct_selections']
-                    w_false = recall['false_alarms']
-                    w_total = recall['total_targets']
-                else:
-                    w_correct = 0
-                    w_false = 0
-                    w_total = 0
-                
-                writer.writerow([r, r_correct, r_total, f"{r_acc:.1f}%", f"{avg_time:.3f}", w_correct, w_false, w_total])
+    # --- 6. 预写日志 ---
+    def session_config(self):
+        return {
+            "TOTAL_ROUNDS": self.TOTAL_ROUNDS,
+            "QUESTIONS_PER_ROUND": self.QUESTIONS_PER_ROUND,
+            "WORD_DISPLAY_TIME": self.WORD_DISPLAY_TIME,
+        }
+
+    def adaptive_state(self):
+        return {
+            "TIME_LIMIT": self.TIME_LIMIT,
+            "base_time_limit": self.base_time_limit,
+            "difficulty_level": self.difficulty_level,
+            "recent_results": list(self.recent_results),
+        }
+
+    def log(self, kind, **payload):
+        if self.session_log is not None:
+            self.session_log.append(kind, **payload)
+
+    def write_later(self, fn, *args):
+        # CSV 导出放到日志写线程里，不阻塞界面
+        if self.session_log is not None:
+            self.session_log.submit(fn, *args)
+        else:
+            fn(*args)
+
+    def resume_session(self, path, st):
+        """Continue a logged session at the first round that was not completed."""
+        # 只保留已完成的轮次；中断那一轮整轮重做，难度回到上一轮结束时的状态
+        point = resume_point(st)
+        self.subject_id = st["subject_id"]
+        self.all_results = point["results"]
+        self.recall_stats = point["recall_stats"]
+        self.round_start_times = point["round_start_times"]
+        self.round_end_times = point["round_end_times"]
+        for key, value in (point["adaptive"] or {}).items():
+            setattr(self, key, value)
+        self.current_round = point["round"]
+        
+        # 旧版单文件日志继续往原文件追加，容器目录建在它旁边
+        self.session_dir = container_for(path)
+        self.session_log = SessionLog(events_path(path), seq=st["last_seq"])
+        self.log("resume", round=self.current_round)
+        print(f"Resuming subject {self.subject_id} at round {self.current_round} ({len(self.all_results)} trials logged)")
+        self.root.unbind('<Return>')
+        self.main_frame.focus_set()
+        if self.current_round > self.TOTAL_ROUNDS:
+            self.show_results_screen()
+        else:
+            self.show_intermission_screen()
+
+    def quit(self):
+        if self.session_log is not None:
+            self.session_log.close()
+        self.root.quit()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Montreal Imaging Stress Task")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="question bank seed (default: random, printed at start)")
+    parser.add_argument("--resume", default=None, metavar="SESSION",
+                        help="continue a crashed session from its results/mist_session_{id}_{ts}/ directory")
+    args = parser.parse_args()
     root = tk.Tk()
-    app = MISTApp(root)
+    app = MISTApp(root, seed=args.seed, resume=args.resume)
     root.mainloop()
+    if app.session_log is not None:
+        app.session_log.close()
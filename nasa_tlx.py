@@ -0,0 +1,121 @@
+import os
+import re
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+from xlsx_cache import XLSX_CACHE_DIR, read_excel_cached
+
+# NASA-TLX 问卷（问卷星导出）：每轮 6 个维度一组列，第 k 轮（k>=2）列名带 .{k-1} 后缀。
+# 轮数不固定：出现多少组后缀就解析多少轮。
+NASA_TLX_PATH = os.path.join("data", "NASA-TLX_6_6.xlsx")
+SUBJECT_COL = "志愿者编号 Number "
+
+TLX_DIMENSIONS = [
+    "心理需求 Mental Demand", "身体需求 Physical Demand", "时间压力 Temporal Demand",
+    "个人表现 Performance", "努力程度 Effort", "挫败感 Frustration Level",
+]
+TLX_SHORT_NAMES = ["Mental", "Physical", "Temporal", "Performance", "Effort", "Frustration"]
+# 15 pairwise comparisons of the weighted TLX, in canonical order
+TLX_PAIRS = list(combinations(range(len(TLX_DIMENSIONS)), 2))
+
+_DIM_COL_RE = re.compile(
+    r"^(" + "|".join(re.escape(d) for d in TLX_DIMENSIONS) + r")(?:\.(\d+))?$"
+)
+
+
+def load_nasa_long(path=NASA_TLX_PATH, cache_dir=XLSX_CACHE_DIR):
+    """
+    Long table (SubjectID, Round, Dimension, Score) from the wide workbook,
+    melted in one vectorised step for any number of rounds. Round is 1-based.
+    """
+    df = read_excel_cached(path, cache_dir=cache_dir)
+    df = df.rename(columns={SUBJECT_COL: "SubjectID"})
+    dim_cols = [c for c in df.columns if isinstance(c, str) and _DIM_COL_RE.match(c)]
+
+    long = df.melt(id_vars=["SubjectID"], value_vars=dim_cols, var_name="Column", value_name="Score")
+    parts = long["Column"].str.extract(_DIM_COL_RE)
+    long["Dimension"] = parts[0]
+    long["Round"] = pd.to_numeric(parts[1], errors="coerce").fillna(0).astype(int) + 1
+    long["SubjectID"] = pd.to_numeric(long["SubjectID"], errors="coerce")
+    long = long[long["SubjectID"].notna()]
+    long["SubjectID"] = long["SubjectID"].astype(int)
+    long["Score"] = pd.to_numeric(long["Score"], errors="coerce")
+    return long[["SubjectID", "Round", "Dimension", "Score"]].reset_index(drop=True)
+
+
+def tallies_from_pairwise(choices):
+    """
+    Weighted-TLX tallies from pairwise choices.
+    choices: (n, 15) int array, the index (0..5) of the dimension picked in each
+    TLX_PAIRS comparison. Returns (n, 6) tallies that sum to 15 per row.
+    """
+    choices = np.asarray(choices, dtype=int)
+    pairs = np.array(TLX_PAIRS)
+    if choices.shape[-1] != len(TLX_PAIRS) or not ((choices == pairs[:, 0]) | (choices == pairs[:, 1])).all():
+        raise ValueError("each pairwise choice must be one of the two dimensions of its pair")
+    return np.eye(len(TLX_DIMENSIONS), dtype=int)[choices].sum(axis=1)
+
+
+def load_tlx_weights(path):
+    """
+    Per-subject weights table -> DataFrame indexed by SubjectID with the six
+    TLX_SHORT_NAMES tally columns. Accepts either the tallies directly, or 15
+    'Mental/Physical'-style pair columns holding the chosen short name; a
+    subject with a blank or invalid pair cell gets NaN tallies (and so a NaN
+    weighted score) instead of failing the whole table.
+    """
+    w = pd.read_csv(path) if path.endswith(".csv") else read_excel_cached(path)
+    w = w.set_index(pd.to_numeric(w["SubjectID"], errors="coerce").astype("Int64"))
+    if all(n in w.columns for n in TLX_SHORT_NAMES):
+        return w[TLX_SHORT_NAMES].astype(float)
+
+    pair_cols = [f"{TLX_SHORT_NAMES[i]}/{TLX_SHORT_NAMES[j]}" for i, j in TLX_PAIRS]
+    codes = {n: k for k, n in enumerate(TLX_SHORT_NAMES)}
+    choices = w[pair_cols].apply(lambda s: s.astype(str).str.strip().map(codes)).to_numpy(dtype=float)
+    pairs = np.array(TLX_PAIRS)
+    ok = ((choices == pairs[:, 0]) | (choices == pairs[:, 1])).all(axis=1)  # NaN (blank / unknown) fails
+    tallies = np.full((len(w), len(TLX_SHORT_NAMES)), np.nan)
+    if ok.any():
+        tallies[ok] = tallies_from_pairwise(choices[ok])
+    if not ok.all():
+        print(f"Invalid NASA-TLX pairwise weights, weighted score left empty for subjects: "
+              f"{', '.join(map(str, w.index[~ok]))}")
+    return pd.DataFrame(tallies, index=w.index, columns=TLX_SHORT_NAMES)
+
+
+def tlx_scores(long, weights=None):
+    """
+    Per (SubjectID, Round) raw TLX (mean of the six ratings) plus the Mental and
+    Frustration subscales; with `weights` (see load_tlx_weights) also the
+    pairwise-weighted TLX = sum(rating * tally) / sum(tally). A subject entered
+    more than once keeps the last entry (as the original row-by-row loop did).
+    """
+    long = long.drop_duplicates(["SubjectID", "Round", "Dimension"], keep="last")
+    wide = long.pivot_table(index=["SubjectID", "Round"], columns="Dimension", values="Score",
+                            aggfunc="first", dropna=False)
+    dims = [d for d in TLX_DIMENSIONS if d in wide.columns]
+    ratings = wide[dims].to_numpy(dtype=float)
+
+    out = pd.DataFrame(index=wide.index)
+    out["NASA_TLX_Score"] = ratings.mean(axis=1)
+    out["NASA_Mental"] = wide["心理需求 Mental Demand"] if "心理需求 Mental Demand" in wide else np.nan
+    out["NASA_Frustration"] = wide["挫败感 Frustration Level"] if "挫败感 Frustration Level" in wide else np.nan
+
+    if weights is not None:
+        short = [TLX_SHORT_NAMES[TLX_DIMENSIONS.index(d)] for d in dims]
+        subj = out.index.get_level_values("SubjectID")
+        W = weights.reindex(subj)[short].to_numpy(dtype=float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out["NASA_TLX_Weighted"] = (ratings * W).sum(axis=1) / W.sum(axis=1)
+    return out
+
+
+def nasa_map_from_scores(scores):
+    """{(SubjectID, Round): {metric: value}} as consumed by process_data.main."""
+    cols = list(scores.columns)
+    values = scores.to_numpy(dtype=float)
+    return {
+        (int(sid), int(rnd)): dict(zip(cols, row))
+        for (sid, rnd), row in zip(scores.index, values)
+    }
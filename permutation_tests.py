@@ -0,0 +1,192 @@
+import numpy as np
+from itertools import permutations
+from concurrent.futures import ProcessPoolExecutor
+
+# 小样本（n=6）下 Friedman / 配对检验的渐近 p 值不可靠，这里给出置换检验：
+# - Friedman 精确分布：零假设下每个被试的秩行在条件间独立地任意重排。统计量只依赖
+#   列秩和向量 R，且分布对条件的重新标号对称，所以逐个被试对“排序后的 R”做 DP
+#   （卷积），状态数远小于 (k!)^n 次枚举。秩都乘 2 变成整数，ΣR² 精确比较。
+# - 配对 t 精确分布：2^n 次符号翻转，固定第一个符号（|t| 对整体翻转对称）后
+#   分块枚举 2^(n-1) 个符号向量，所有 metric × contrast 一次矩阵乘法。
+# - 样本太大时用 Monte-Carlo（分批、内存有界，可按 SeedSequence 分片到多进程）。
+FRIEDMAN_EXACT_MAX_N = 15
+SIGNFLIP_EXACT_MAX_N = 20
+MC_BATCH = 2048
+
+
+def pool_map(fn, items, jobs):
+    if jobs > 1 and len(items) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            return list(ex.map(fn, items))
+    return [fn(it) for it in items]
+
+
+def _doubled(ranks):
+    """Average ranks (multiples of 0.5) as exact integers."""
+    return np.rint(2 * ranks).astype(np.int64)
+
+
+# ---------------------------------------------------------------- Friedman
+
+def friedman_null(rows):
+    """
+    Exact null distribution of sum_j R_j^2 (doubled ranks) for subjects whose
+    doubled rank rows are `rows` (tuple of k-tuples). Returns (values, probs).
+    """
+    k = len(rows[0])
+    base = sum(max(r) for r in rows) + 1
+    powers = base ** np.arange(k, dtype=np.int64)  # state vector -> one int64 key
+    states = np.zeros((1, k), dtype=np.int64)
+    prob = np.ones(1)
+    for row in rows:
+        perms = np.array(sorted(set(permutations(row))), dtype=np.int64)
+        q = len(perms)
+        new = (states[:, None, :] + perms[None, :, :]).reshape(-1, k)
+        new.sort(axis=1)  # condition-relabelling symmetry: keep R sorted
+        _, first, inv = np.unique(new @ powers, return_index=True, return_inverse=True)
+        states = new[first]
+        prob = np.bincount(inv, weights=np.repeat(prob / q, q), minlength=len(states))
+    values, inv = np.unique((states ** 2).sum(axis=1), return_inverse=True)
+    return values, np.bincount(inv.ravel(), weights=prob)
+
+
+def _friedman_null_job(rows):
+    return rows, friedman_null(rows)
+
+
+def friedman_exact(ranks, jobs=1):
+    """
+    Exact permutation p-value of the Friedman test for every metric.
+    ranks: (S, K, M) within-subject ranks, rows of incomplete subjects NaN.
+    Metrics with the same multiset of rank rows (e.g. all untied metrics with
+    the same n) share one null distribution.
+    """
+    d = _doubled(np.nan_to_num(ranks))
+    complete = ~np.isnan(ranks[:, 0, :])
+    keys = []
+    for m in range(ranks.shape[2]):
+        rows = [tuple(sorted(r)) for r in d[complete[:, m], :, m]]
+        keys.append(tuple(sorted(rows)) if len(rows) >= 2 else None)
+
+    nulls = dict(pool_map(_friedman_null_job, sorted({k for k in keys if k is not None}), jobs))
+    observed = (np.where(complete[:, None, :], d, 0).sum(axis=0) ** 2).sum(axis=0)
+    p = np.full(ranks.shape[2], np.nan)
+    for m, key in enumerate(keys):
+        if key is not None:
+            values, probs = nulls[key]
+            p[m] = min(1.0, probs[values >= observed[m]].sum())
+    return p
+
+
+def _friedman_mc_shard(args):
+    d, seed, n_resamples, batch = args
+    rng = np.random.default_rng(seed)
+    S, K, M = d.shape
+    observed = (d.sum(axis=0) ** 2).sum(axis=0)
+    hits = np.zeros(M, dtype=np.int64)
+    done = 0
+    while done < n_resamples:
+        b = min(batch, n_resamples - done)
+        perm = np.argsort(rng.random((b, S, K)), axis=2)  # one relabelling per subject
+        R = np.take_along_axis(d[None, :, :, :], perm[..., None], axis=2).sum(axis=1)  # (b, K, M)
+        hits += ((R ** 2).sum(axis=1) >= observed).sum(axis=0)
+        done += b
+    return hits
+
+
+def friedman_monte_carlo(ranks, n_resamples=100_000, seed=None, jobs=1, batch=MC_BATCH):
+    """Monte-Carlo permutation p-value, (hits + 1) / (n_resamples + 1), per metric."""
+    d = _doubled(np.nan_to_num(ranks))  # incomplete rows are all 0 -> no contribution
+    shards = np.array_split(np.arange(n_resamples), max(1, jobs))
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    hits = sum(pool_map(_friedman_mc_shard, [(d, s, len(sh), batch) for s, sh in zip(seeds, shards)], jobs))
+    p = (hits + 1.0) / (n_resamples + 1.0)
+    p[(~np.isnan(ranks[:, 0, :])).sum(axis=0) < 2] = np.nan
+    return p
+
+
+def friedman_permutation(ranks, method="auto", n_resamples=100_000, seed=None, jobs=1):
+    """method: 'exact', 'mc', or 'auto' (exact up to FRIEDMAN_EXACT_MAX_N subjects)."""
+    if method == "auto":
+        n = (~np.isnan(ranks[:, 0, :])).sum(axis=0).max(initial=0)
+        method = "exact" if n <= FRIEDMAN_EXACT_MAX_N else "mc"
+    if method == "exact":
+        return friedman_exact(ranks, jobs=jobs)
+    return friedman_monte_carlo(ranks, n_resamples=n_resamples, seed=seed, jobs=jobs)
+
+
+# ---------------------------------------------------------------- paired t (sign flips)
+
+def _paired_diffs(x, y):
+    d = x - y
+    valid = ~np.isnan(d)
+    return np.where(valid, d, 0.0), valid.sum(axis=0)
+
+
+def _signflip_exact_shard(args):
+    d, start, stop, batch = args
+    S = d.shape[0]
+    flat = d.reshape(S, -1)
+    observed = np.abs(flat.sum(axis=0))
+    tol = 1e-9 * np.abs(flat).sum(axis=0)
+    bits = np.arange(S - 1, dtype=np.int64)
+    hits = np.zeros(flat.shape[1], dtype=np.int64)
+    for lo in range(start, stop, batch):
+        idx = np.arange(lo, min(lo + batch, stop), dtype=np.int64)
+        signs = 1.0 - 2.0 * ((idx[:, None] >> bits) & 1)  # first subject's sign fixed to +1
+        stat = np.abs(flat[0] + signs @ flat[1:])
+        hits += (stat >= observed - tol).sum(axis=0)
+    return hits
+
+
+def paired_signflip_exact(x, y, jobs=1, batch=1 << 14):
+    """
+    Exact sign-flip p-value of the paired t for every cell of x - y (axis 0 =
+    subjects). Under sign flips sum(d^2) is fixed, so |t| is monotone in
+    |sum(d)| and that sum is the enumerated statistic.
+    """
+    d, n = _paired_diffs(x, y)
+    S = d.shape[0]
+    total = 1 << max(S - 1, 0)
+    bounds = np.linspace(0, total, max(1, min(jobs, total)) + 1).astype(np.int64)
+    hits = sum(pool_map(_signflip_exact_shard,
+                         [(d, int(a), int(b), batch) for a, b in zip(bounds[:-1], bounds[1:])], jobs))
+    p = (hits / float(total)).reshape(d.shape[1:])
+    p[n < 2] = np.nan
+    return p
+
+
+def _signflip_mc_shard(args):
+    d, seed, n_resamples, batch = args
+    rng = np.random.default_rng(seed)
+    S = d.shape[0]
+    flat = d.reshape(S, -1)
+    observed = np.abs(flat.sum(axis=0))
+    tol = 1e-9 * np.abs(flat).sum(axis=0)
+    hits = np.zeros(flat.shape[1], dtype=np.int64)
+    done = 0
+    while done < n_resamples:
+        b = min(batch, n_resamples - done)
+        signs = rng.choice(np.array([-1.0, 1.0]), size=(b, S))
+        hits += (np.abs(signs @ flat) >= observed - tol).sum(axis=0)
+        done += b
+    return hits
+
+
+def paired_signflip_monte_carlo(x, y, n_resamples=100_000, seed=None, jobs=1, batch=MC_BATCH):
+    d, n = _paired_diffs(x, y)
+    shards = np.array_split(np.arange(n_resamples), max(1, jobs))
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    hits = sum(pool_map(_signflip_mc_shard, [(d, s, len(sh), batch) for s, sh in zip(seeds, shards)], jobs))
+    p = ((hits + 1.0) / (n_resamples + 1.0)).reshape(d.shape[1:])
+    p[n < 2] = np.nan
+    return p
+
+
+def paired_t_permutation(x, y, method="auto", n_resamples=100_000, seed=None, jobs=1):
+    """method: 'exact', 'mc', or 'auto' (exact up to SIGNFLIP_EXACT_MAX_N subjects)."""
+    if method == "auto":
+        method = "exact" if x.shape[0] <= SIGNFLIP_EXACT_MAX_N else "mc"
+    if method == "exact":
+        return paired_signflip_exact(x, y, jobs=jobs)
+    return paired_signflip_monte_carlo(x, y, n_resamples=n_resamples, seed=seed, jobs=jobs)
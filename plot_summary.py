@@ -1,8 +1,9 @@
-import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import os
 
+from analysis_cube import load_cube
+
 # Set style
 sns.set_theme(style="whitegrid")
 # Try to set a font that supports Chinese if available, otherwise fallback
@@ -25,7 +26,7 @@ def main():
         print("Error: combined_analysis.csv not found.")
         return
 
-    df = pd.read_csv("combined_analysis.csv")
+    df = load_cube("combined_analysis.csv").frame
     
     # Condition mapping/order
     order = ['A', 'B', 'C', 'D']
@@ -1,12 +1,24 @@
 import pandas as pd
 import numpy as np
 import os
-import glob
 import re
-from scipy.signal import find_peaks, butter, filtfilt, welch, resample
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+from math import gcd
+from scipy.signal import find_peaks, butter, sosfiltfilt, welch, resample, resample_poly
 from scipy.interpolate import interp1d
 from scipy.fft import fft, fftfreq
 
+from signal_cache import load_physiolab, load_force_sensor
+from epochs import round_windows, epoch_views, recording_coverage
+from data_manifest import DataManifest
+from feature_store import FEATURE_STORE_DIR, cached_features
+from avatar_scoring import load_avatar_responses, avatar_map_from_responses, all_items_table
+from nasa_tlx import load_nasa_long, load_tlx_weights, tlx_scores, nasa_map_from_scores
+from table_io import write_table
+import profiling
+from profiling import span, profiled, file_attrs, count_error
+
 # 1. Configuration
 DATA_DIR = "data"
 RESULTS_DIR = os.path.join(DATA_DIR, "results")
@@ -14,13 +26,12 @@ BIO_DIR = os.path.join(DATA_DIR, "bio_data")
 FORCE_DIR = os.path.join(DATA_DIR, "force_sensor")
 AVATAR_DIR = os.path.join(DATA_DIR, "avatar_scale")
 
-# Experiment Order from 实验顺序.txt
+# Experiment Order from 实验顺序.txt: one "编号.条件顺序" line per subject, e.g.
 # 1.ABCD
 # 2.BADC
-# 3.CDAB
-# 4.DABC
-# 5.BCDA
-# 6.ABCD
+# (the condition legend lines above them are ignored). SUBJECT_ORDER is the
+# checked-in table, used only when the file is missing.
+SUBJECT_ORDER_PATH = os.path.join(DATA_DIR, "实验顺序.txt")
 SUBJECT_ORDER = {
     1: ['A', 'B', 'C', 'D'],
     2: ['B', 'A', 'D', 'C'],
@@ -29,17 +40,48 @@ SUBJECT_ORDER = {
     5: ['B', 'C', 'D', 'A'],
     6: ['A', 'B', 'C', 'D']
 }
+_ORDER_LINE_RE = re.compile(r"^\s*(\d+)\s*[.．、:：]\s*([A-D]+)\s*$")
+
+def load_subject_order(path=SUBJECT_ORDER_PATH):
+    """SubjectID -> condition list per round, from the order table (SUBJECT_ORDER if it is missing)."""
+    try:
+        with open(path, encoding="utf-8-sig") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return dict(SUBJECT_ORDER)
+    order = {}
+    for line in lines:
+        m = _ORDER_LINE_RE.match(line)
+        if m:
+            order[int(m.group(1))] = list(m.group(2))
+    return order
+
+_MANIFEST = None
+
+def get_manifest(refresh=False):
+    """Process-wide DataManifest of DATA_DIR (one scan, then incremental refresh by mtime)."""
+    global _MANIFEST
+    if _MANIFEST is None:
+        _MANIFEST = DataManifest(DATA_DIR).refresh()
+    elif refresh:
+        _MANIFEST.refresh()
+    return _MANIFEST
+
+def find_mist_session(subject_id):
+    """(directory, manifest record) of the subject's latest session container, or None."""
+    found = get_manifest().entries("mist_session", subject_id)
+    return found[-1] if found else None
 
 def find_mist_file(subject_id):
-    pattern = os.path.join(RESULTS_DIR, f"mist_results_{subject_id}_*.csv")
-    files = glob.glob(pattern)
-    if not files:
-        # Try subject 11 if subject 1 is missing, etc? 
-        # But for now assume strict matching.
-        return None
-    # If multiple, take the latest one?
-    files.sort()
-    return files[-1]
+    # Latest session: the trials.csv of a session container (results/mist_session_{id}_{ts}/)
+    # or a legacy mist_results_{id}_{timestamp}.csv, whichever is newer. Legacy files are
+    # named when they are saved (end of session), so compare with the container's last update
+    session = find_mist_session(subject_id)
+    legacy = get_manifest().entries("mist_results", subject_id)
+    if session is not None and "trials" in session[1]["files"]:
+        if not legacy or session[1]["updated"] >= legacy[-1][1]["timestamp"]:
+            return os.path.join(session[0], session[1]["files"]["trials"])
+    return legacy[-1][0] if legacy else None
 
 def _extract_timestamp_from_filename(path):
     # Expect: mist_results_{id}_{timestamp}.csv
@@ -50,60 +92,71 @@ def _extract_timestamp_from_filename(path):
 def find_recall_file(subject_id, ts=None):
     # Deprecated: recall files are created per round, and timestamps differ from mist_results.
     # Kept for backwards compatibility; prefer load_recall_map_for_session().
+    entries = get_manifest().entries("mist_recall", subject_id)
     if ts:
-        candidate = os.path.join(RESULTS_DIR, f"mist_recall_{subject_id}_{ts}.csv")
-        if os.path.exists(candidate):
-            return candidate
-    pattern = os.path.join(RESULTS_DIR, f"mist_recall_{subject_id}_*.csv")
-    files = glob.glob(pattern)
-    if not files:
-        return None
-    files.sort()
-    return files[-1]
+        for path, rec in entries:
+            if str(rec["timestamp"]) == str(ts):
+                return path
+    return entries[-1][0] if entries else None
+
+def load_recall_map(subject_id, mist_file):
+    """Round -> recall rows of the session mist_file (from find_mist_file) belongs to."""
+    session = find_mist_session(subject_id)
+    if session is not None and os.path.dirname(mist_file) == session[0]:
+        return load_session_recall_map(*session)
+    ts = _extract_timestamp_from_filename(mist_file)
+    return load_recall_map_for_session(subject_id, mist_ts=ts) if ts else {}
+
+def load_session_recall_map(session_dir, rec):
+    """
+    Round -> recall rows of a session container: every round is in its one
+    recall.csv, so there is nothing to match.
+    """
+    name = rec["files"].get("recall")
+    if not name or not rec.get("rounds"):
+        return {}
+    path = os.path.join(session_dir, name)
+    try:
+        with span("load.mist_recall", **file_attrs(path)):
+            d = pd.read_csv(path)
+    except Exception as e:
+        count_error("load.mist_recall", e)
+        return {}
+    return {r: g.copy() for r, g in d.groupby("Round")}
 
 def load_recall_map_for_session(subject_id, mist_ts):
     """
-    Each recall CSV is saved per round (contains a single Round value).
+    Legacy layout: each recall CSV is saved per round (contains a single Round value).
     We select recall files with timestamp <= mist_results timestamp,
     then keep the latest file for each Round.
+    The manifest already knows every recall file's Round values, so only the
+    selected files (one per round) are read.
     """
-    pattern = os.path.join(RESULTS_DIR, f"mist_recall_{subject_id}_*.csv")
-    files = glob.glob(pattern)
-    if not files:
+    try:
+        mist_ts = int(mist_ts)
+    except (TypeError, ValueError):
         return {}
 
-    keep = []
-    for f in files:
-        ts = _extract_timestamp_from_filename(f)
-        if ts is None:
+    latest_by_round = {}  # round -> path (entries are sorted by timestamp)
+    for path, rec in get_manifest().entries("mist_recall", subject_id):
+        if rec["timestamp"] > mist_ts:
             continue
-        try:
-            if int(ts) <= int(mist_ts):
-                keep.append((int(ts), f))
-        except Exception:
-            continue
-    keep.sort(key=lambda x: x[0])
-
-    round_map = {}  # round -> (ts, df)
-    for ts_int, f in keep:
-        try:
-            d = pd.read_csv(f)
-        except Exception:
-            continue
-        if 'Round' not in d.columns:
-            continue
-        rounds = sorted(set(pd.to_numeric(d['Round'], errors='coerce').dropna().astype(int).tolist()))
-        if not rounds:
-            continue
-        # expected: exactly one round per file; if multiple, still handle by taking each
-        for r in rounds:
-            # keep latest per round
-            prev = round_map.get(r)
-            if prev is None or ts_int >= prev[0]:
-                round_map[r] = (ts_int, d[d['Round'] == r].copy())
-
-    # return only dfs
-    return {r: d for r, (ts_int, d) in round_map.items()}
+        for r in rec.get("rounds", []):
+            latest_by_round[r] = path
+
+    round_map = {}
+    cache = {}
+    for r, path in latest_by_round.items():
+        if path not in cache:
+            try:
+                with span("load.mist_recall", **file_attrs(path)):
+                    cache[path] = pd.read_csv(path)
+            except Exception as e:
+                count_error("load.mist_recall", e)
+                continue
+        d = cache[path]
+        round_map[r] = d[d['Round'] == r].copy()
+    return round_map
 
 def compute_recall_correct_targets(recall_df, round_num):
     # “记对单词数量”按：目标词(IsTarget=True) 且被选中(Selected=True) 的数量（即 hits）
@@ -117,127 +170,6 @@ def compute_recall_correct_targets(recall_df, round_num):
     selected = d['Selected'].astype(str).str.lower().isin(['true', '1', 'yes'])
     return int((is_target & selected).sum())
 
-def _extract_subject_id_from_serial(serial_value):
-    """
-    Serial Number 列里可能含有额外文本（例如 '2 相反'）。
-    这里取第一个连续数字作为 SubjectID。
-    """
-    if serial_value is None or (isinstance(serial_value, float) and np.isnan(serial_value)):
-        return None
-    s = str(serial_value)
-    m = re.search(r'(\d+)', s)
-    return int(m.group(1)) if m else None
-
-def _collapse_avatar_items(row, cols_by_qnum):
-    """
-    对同一题号出现多个列（例如 Q22/Q23 的两种英文版本），合并为单个数值：
-    - 将可转数值的条目转为 float
-    - 对同题号多个列取 mean（忽略 NaN）
-    """
-    def _coerce(v):
-        # 支持：数值（-3..3）/ Wenjuan星导出字母选项（A..G）/ none
-        if v is None or (isinstance(v, float) and np.isnan(v)):
-            return np.nan
-        s = str(v).strip()
-        if s == "" or s.lower() in {"none", "nan"}:
-            return np.nan
-        # Numeric?
-        n = pd.to_numeric(s, errors='coerce')
-        if not pd.isna(n):
-            return float(n)
-        # Letter mapping (A..G -> -3..3)
-        letter_map = {"A": -3.0, "B": -2.0, "C": -1.0, "D": 0.0, "E": 1.0, "F": 2.0, "G": 3.0}
-        up = s.upper()
-        if up in letter_map:
-            return letter_map[up]
-        return np.nan
-
-    out = {}
-    for qnum, cols in cols_by_qnum.items():
-        vals = []
-        for c in cols:
-            v = _coerce(row.get(c, np.nan))
-            if not pd.isna(v):
-                vals.append(float(v))
-        out[qnum] = float(np.mean(vals)) if vals else np.nan
-    return out
-
-def _likert_minus3_to_1to7(v):
-    # 将对称刻度（-3..3）映射到论文推荐的 1..7（-3->1, 0->4, 3->7）
-    if v is None or (isinstance(v, float) and np.isnan(v)):
-        return np.nan
-    try:
-        return float(v) + 4.0
-    except Exception:
-        return np.nan
-
-def _compute_revised_avatar_eq_from_q(qvals_minus3):
-    """
-    参考 Peck & Gonzalez-Franco 2021 (Frontiers in VR)：
-    Table 2 中的 R1..R16 与原 Q 的映射，以及 5.1 Computing the Score 的子量表公式。
-
-    R1=Q15, R2=Q16, R3=Q8, R4=Q17, R5=Q18, R6=Q20, R7=Q24, R8=Q22, R9=Q21,
-    R10=Q1, R11=Q19, R12=Q14, R13=Q6, R14=Q10, R15=Q12, R16=Q13
-    """
-    # map to 1..7 first (paper recommended)
-    q = {k: _likert_minus3_to_1to7(v) for k, v in qvals_minus3.items()}
-
-    R = {
-        "R1": q.get(15, np.nan),
-        "R2": q.get(16, np.nan),
-        "R3": q.get(8, np.nan),
-        "R4": q.get(17, np.nan),
-        "R5": q.get(18, np.nan),
-        "R6": q.get(20, np.nan),
-        "R7": q.get(24, np.nan),
-        "R8": q.get(22, np.nan),
-        "R9": q.get(21, np.nan),
-        "R10": q.get(1, np.nan),
-        "R11": q.get(19, np.nan),
-        "R12": q.get(14, np.nan),
-        "R13": q.get(6, np.nan),
-        "R14": q.get(10, np.nan),
-        "R15": q.get(12, np.nan),
-        "R16": q.get(13, np.nan),
-    }
-
-    def mean_of(keys):
-        xs = [R[k] for k in keys if k in R and not pd.isna(R[k])]
-        return (float(np.mean(xs)) if xs else np.nan), int(len(xs))
-
-    appearance, app_n = mean_of(["R1","R2","R3","R4","R5","R6","R9","R16"])
-    response, res_n = mean_of(["R4","R6","R7","R8","R9","R15"])
-    ownership, own_n = mean_of(["R5","R10","R11","R12","R13","R14"])
-    multisensory, ms_n = mean_of(["R3","R12","R13","R14","R15","R16"])
-    # overall embodiment
-    emb, emb_n = mean_of([k for k in ["R1","R2","R3","R4","R5","R6","R7","R8","R9","R10","R11","R12","R13","R14","R15","R16"]])
-    if not pd.isna(appearance) and not pd.isna(response) and not pd.isna(ownership) and not pd.isna(multisensory):
-        embodiment = float(np.mean([appearance, response, ownership, multisensory]))
-    else:
-        embodiment = np.nan
-
-    # Optional agency subscore per paper suggestion: Agency = R3 + R13 (here also provide mean)
-    agency_sum = np.nan
-    agency_mean = np.nan
-    if (not pd.isna(R["R3"])) and (not pd.isna(R["R13"])):
-        agency_sum = float(R["R3"] + R["R13"])
-        agency_mean = float(np.mean([R["R3"], R["R13"]]))
-
-    return R, {
-        "AvatarEQ_Appearance": appearance,
-        "AvatarEQ_Response": response,
-        "AvatarEQ_Ownership": ownership,
-        "AvatarEQ_MultiSensory": multisensory,
-        "AvatarEQ_Embodiment": embodiment,
-        "AvatarEQ_Appearance_N": app_n,
-        "AvatarEQ_Response_N": res_n,
-        "AvatarEQ_Ownership_N": own_n,
-        "AvatarEQ_MultiSensory_N": ms_n,
-        "AvatarEQ_R_N": emb_n,
-        "AvatarEQ_Agency_Sum": agency_sum,
-        "AvatarEQ_Agency_Mean": agency_mean,
-    }
-
 def export_avatar_scale_all_table(output_path="CHI_result/tables/avatar_scale_all_items_subscales.csv"):
     """
     输出“所有 avatar 问卷数据集中到一个表中”：
@@ -247,92 +179,18 @@ def export_avatar_scale_all_table(output_path="CHI_result/tables/avatar_scale_al
     - R1..R16（1..7）
     - 论文子量表（Appearance/Response/Ownership/Multi-Sensory/Embodiment）
     """
-    avatar_map = process_avatar_scale()
-    if not avatar_map:
-        return False
-
-    # Re-read raw xlsx to capture meta fields (Name, submitted time, Serial raw) and build Q maps.
-    xlsx_files = glob.glob(os.path.join(AVATAR_DIR, "*.xlsx"))
-    rows = []
-    for f in xlsx_files:
-        try:
-            d = pd.read_excel(f)
-            d["__file"] = os.path.basename(f)
-            rows.append(d)
-        except Exception:
-            continue
-    if not rows:
-        return False
-    df = pd.concat(rows, ignore_index=True)
-    if "Serial Number" not in df.columns:
+    df = load_avatar_responses(files=_avatar_files())
+    if df is None or df.empty:
         return False
-    if "提交答卷时间" in df.columns:
-        df["__submitted_at"] = pd.to_datetime(df["提交答卷时间"], errors="coerce")
-    else:
-        df["__submitted_at"] = pd.NaT
-    df["__subject_id"] = df["Serial Number"].apply(_extract_subject_id_from_serial)
-    df = df[~df["__subject_id"].isna()].copy()
-    df["__subject_id"] = df["__subject_id"].astype(int)
-    df = df.sort_values("__submitted_at").groupby("__subject_id", as_index=False).tail(1)
-
-    qcols = [c for c in df.columns if isinstance(c, str) and re.match(r"^Q\d+\.", c)]
-    base_cols = [c for c in qcols if not c.endswith(".1")]
-    alt_cols = [c for c in qcols if c.endswith(".1")]
-
-    def build_cols_by_num(cols):
-        m = {}
-        for c in cols:
-            mm = re.match(r"^Q(\d+)\.", c)
-            if not mm:
-                continue
-            qn = int(mm.group(1))
-            m.setdefault(qn, []).append(c)
-        return m
-
-    base_by_num = build_cols_by_num(base_cols)
-    alt_by_num = build_cols_by_num(alt_cols)
-
-    out_rows = []
-    for _, r in df.iterrows():
-        sid = int(r["__subject_id"])
-        serial_raw = str(r.get("Serial Number", ""))
-        swapped = "相反" in serial_raw
-        name = r.get("Name", np.nan)
-        submitted = r.get("提交答卷时间", np.nan)
-        src_file = r.get("__file", np.nan)
-
-        base_q = _collapse_avatar_items(r, base_by_num)  # -3..3
-        alt_q = _collapse_avatar_items(r, alt_by_num)
-
-        c_q, d_q = (alt_q, base_q) if swapped else (base_q, alt_q)
-
-        for cond, qmap in [("C", c_q), ("D", d_q)]:
-            R, scores = _compute_revised_avatar_eq_from_q(qmap)
-            row_out = {
-                "SubjectID": sid,
-                "Condition": cond,
-                "Name": name,
-                "SerialNumberRaw": serial_raw,
-                "SubmittedAt": submitted,
-                "SourceFile": src_file,
-                "SwappedCD": swapped,
-            }
-            # Q1..Q25 raw and likert
-            for i in range(1, 26):
-                row_out[f"Q{i}"] = qmap.get(i, np.nan)
-                row_out[f"Q{i}_Likert"] = _likert_minus3_to_1to7(qmap.get(i, np.nan))
-            # R1..R16 (likert)
-            for k, v in R.items():
-                row_out[k] = v
-            # subscales
-            row_out.update(scores)
-            out_rows.append(row_out)
-
-    out_df = pd.DataFrame(out_rows).sort_values(["SubjectID", "Condition"])
+    out_df = all_items_table(df)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    out_df.to_csv(output_path, index=False)
+    write_table(out_df, output_path)
     return True
 
+def _avatar_files():
+    return [p for p, _ in get_manifest().entries("avatar_scale")]
+
+@profiled()
 def process_avatar_scale():
     """
     读取 data/avatar_scale 下的 Avatar Embodiment Questionnaire（两段：默认 + .1）。
@@ -342,207 +200,82 @@ def process_avatar_scale():
     - 默认段（无 .1 后缀）对应 C（Naked Robot）
     - .1 段对应 D（Clothed Robot）
     - 若 Serial Number 含 '相反'，则交换 C/D 映射
+    计分见 avatar_scoring（所有被试一次性数组运算）。
     """
     if not os.path.exists(AVATAR_DIR):
         return {}
-
-    xlsx_files = glob.glob(os.path.join(AVATAR_DIR, "*.xlsx"))
-    if not xlsx_files:
+    df = load_avatar_responses(files=_avatar_files())
+    if df is None or df.empty:
         return {}
-
-    rows = []
-    for f in xlsx_files:
-        try:
-            d = pd.read_excel(f)
-            d["__file"] = os.path.basename(f)
-            rows.append(d)
-        except Exception as e:
-            print(f"Error reading avatar_scale {f}: {e}")
-
-    if not rows:
-        return {}
-
-    df = pd.concat(rows, ignore_index=True)
-    if "Serial Number" not in df.columns:
-        return {}
-
-    # identify Q columns by question number; handle duplicates (Q22/Q23 variants)
-    qcols = [c for c in df.columns if isinstance(c, str) and re.match(r"^Q\d+\.", c)]
-    base_cols = [c for c in qcols if not c.endswith(".1")]
-    alt_cols = [c for c in qcols if c.endswith(".1")]
-
-    def build_cols_by_num(cols):
-        m = {}
-        for c in cols:
-            mm = re.match(r"^Q(\d+)\.", c)
-            if not mm:
-                continue
-            qn = int(mm.group(1))
-            m.setdefault(qn, []).append(c)
-        return m
-
-    base_by_num = build_cols_by_num(base_cols)
-    alt_by_num = build_cols_by_num(alt_cols)
-
-    # choose latest submission per subject if multiple
-    if "提交答卷时间" in df.columns:
-        df["__submitted_at"] = pd.to_datetime(df["提交答卷时间"], errors="coerce")
-    else:
-        df["__submitted_at"] = pd.NaT
-
-    df["__subject_id"] = df["Serial Number"].apply(_extract_subject_id_from_serial)
-    df = df[~df["__subject_id"].isna()].copy()
-    df["__subject_id"] = df["__subject_id"].astype(int)
-
-    # keep latest per subject
-    df = df.sort_values("__submitted_at").groupby("__subject_id", as_index=False).tail(1)
-
-    avatar_map = {}
-    for _, r in df.iterrows():
-        sid = int(r["__subject_id"])
-        serial_raw = str(r.get("Serial Number", ""))
-        swapped = "相反" in serial_raw
-
-        base_vals = _collapse_avatar_items(r, base_by_num)   # Q1..Q25 -> value
-        alt_vals = _collapse_avatar_items(r, alt_by_num)
-
-        def summarize(vals):
-            def rev(v):
-                # 量表为对称刻度（如 -3..3）时，反向题可用取负号近似反向计分
-                return -v if (v is not None and not pd.isna(v)) else np.nan
-
-            def mean_of(qnums):
-                xs = []
-                for q in qnums:
-                    v = vals.get(q, np.nan)
-                    v = float(v) if (v is not None and not pd.isna(v)) else np.nan
-                    if not pd.isna(v):
-                        xs.append(v)
-                return float(np.mean(xs)) if xs else np.nan, int(len(xs))
-
-            # Overall (raw mean of available items)
-            items = [vals.get(i) for i in range(1, 26)]
-            items = [float(v) for v in items if v is not None and not pd.isna(v)]
-            overall_mean = float(np.mean(items)) if items else np.nan
-            overall_n = int(len(items))
-
-            # Constructed subscales (transparent + common structure)
-            # Ownership: include reverse-coded “someone else” items
-            # Q1 own; Q2 other(reverse); Q4 mirror-own; Q5 mirror-other(reverse); Q14 location-own
-            ownership_items = []
-            for q, is_rev in [(1, False), (2, True), (4, False), (5, True), (14, False), (17, False), (18, False), (19, False)]:
-                v = vals.get(q, np.nan)
-                v = float(v) if (v is not None and not pd.isna(v)) else np.nan
-                if not pd.isna(v):
-                    ownership_items.append(-v if is_rev else v)
-            ownership = float(np.mean(ownership_items)) if ownership_items else np.nan
-            ownership_n = int(len(ownership_items))
-
-            # Agency/Control: reverse-code Q9 (“moving by itself”)
-            agency_items = []
-            for q, is_rev in [(6, False), (7, False), (8, False), (9, True)]:
-                v = vals.get(q, np.nan)
-                v = float(v) if (v is not None and not pd.isna(v)) else np.nan
-                if not pd.isna(v):
-                    agency_items.append(-v if is_rev else v)
-            agency = float(np.mean(agency_items)) if agency_items else np.nan
-            agency_n = int(len(agency_items))
-
-            # Touch/Referral: Q10-13
-            touch, touch_n = mean_of([10, 11, 12, 13])
-
-            # Avatar Embodiment Questionnaire (Peck & Gonzalez-Franco 2021) revised subscales
-            # Compute on the same underlying raw (-3..3) values
-            R_map, eq_scores = _compute_revised_avatar_eq_from_q(vals)
-
-            return {
-                "Avatar_Embodiment_Mean": overall_mean,
-                "Avatar_Embodiment_N": overall_n,
-                "Avatar_Ownership_Score": ownership,
-                "Avatar_Ownership_N": ownership_n,
-                "Avatar_Agency_Score": agency,
-                "Avatar_Agency_N": agency_n,
-                "Avatar_Touch_Score": touch,
-                "Avatar_Touch_N": touch_n,
-                # expose a few interpretable single-items (safety / control), if present
-                "Avatar_Q1_Ownership": vals.get(1, np.nan),
-                "Avatar_Q6_Control": vals.get(6, np.nan),
-                "Avatar_Q9_SpontaneousMove": vals.get(9, np.nan),
-                "Avatar_Q25_HarmConcern": vals.get(25, np.nan),
-                # Revised (R1..R16) subscales and overall embodiment (1..7)
-                **eq_scores,
-            }
-
-        base_sum = summarize(base_vals)
-        alt_sum = summarize(alt_vals)
-
-        # map to conditions
-        c_metrics, d_metrics = (alt_sum, base_sum) if swapped else (base_sum, alt_sum)
-        avatar_map[(sid, "C")] = c_metrics
-        avatar_map[(sid, "D")] = d_metrics
-
-    return avatar_map
+    return avatar_map_from_responses(df)
 
 def find_bio_file(subject_id, condition):
     # Pattern: {id}{cond}[_]?Entity...
     # Examples: 1A_Entity..., 6CEntity...
-    pattern_str = f"^{subject_id}{condition}[_]?Entity.*\\.csv$"
-    regex = re.compile(pattern_str)
-    
-    for fname in os.listdir(BIO_DIR):
-        if regex.match(fname):
-            return os.path.join(BIO_DIR, fname)
-    return None
+    return get_manifest().first("bio", subject_id, condition)
+
+def find_bio_recordings(subject_id):
+    """
+    Continuous per-subject recordings (one file for the whole session), e.g.
+    4Test_Entity_Recording_2025_12_05_11_53_09(PhysioLAB Pro1(...)).csv
+    Returns [(start Timestamp from the filename, path)] sorted by start time.
+    """
+    return [
+        (pd.to_datetime(rec["timestamp"], format="%Y_%m_%d_%H_%M_%S", errors="coerce"), path)
+        for path, rec in get_manifest().entries("bio_recording", subject_id)
+    ]
+
+def find_bio_recording_for_window(subject_id, window):
+    # Latest recording that started before the round ended
+    candidates = [p for start, p in find_bio_recordings(subject_id) if pd.isna(start) or start <= window[1]]
+    return candidates[-1] if candidates else None
 
 def find_force_file(subject_id, condition):
     # Condition C = No Clothes (没衣服, 无衣服)
     # Condition D = Clothes (有衣服, 穿衣服)
-    
-    keywords = []
-    if condition == 'C':
-        keywords = ["没衣服", "无衣服"]
-    elif condition == 'D':
-        keywords = ["有衣服", "穿衣服"]
-    else:
+    if condition not in ('C', 'D'):
         return None
-        
-    for kw in keywords:
-        pattern = f"{subject_id}_{kw}.csv"
-        path = os.path.join(FORCE_DIR, pattern)
-        if os.path.exists(path):
-            return path
-    return None
+    return get_manifest().first("force", subject_id, condition)
 
+FORCE_TOTAL_CHANNELS = [
+    'Thumb_M1_IPS1610_Fx', 'Thumb_M1_IPS1610_Fy', 'Thumb_M1_IPS1610_Fz',
+    'Index_M1_IPS1610_Fx', 'Index_M1_IPS1610_Fy', 'Index_M1_IPS1610_Fz',
+]
+
+def force_total_magnitude(rec):
+    """
+    Per-sample total force |F_thumb| + |F_index| of a force recording, or None
+    if a channel is missing.
+    """
+    # NOTE: 实际只有一个力传感器，Thumb/Index 是同一传感器的两个通道/位置。
+    # 因此这里按用户要求：将 Thumb 与 Index 的力幅值相加，得到“总力”用于比较（C vs D）。
+    #
+    # 使用 M1 的三轴（IPS1610）作为主通道；若存在缺失/截断行，按 0 处理。
+    for c in FORCE_TOTAL_CHANNELS:
+        if c not in rec:
+            return None
+
+    f = {c: np.nan_to_num(rec[c], nan=0.0) for c in FORCE_TOTAL_CHANNELS}
+
+    thumb_mag = np.sqrt(
+        f['Thumb_M1_IPS1610_Fx']**2 +
+        f['Thumb_M1_IPS1610_Fy']**2 +
+        f['Thumb_M1_IPS1610_Fz']**2
+    )
+    index_mag = np.sqrt(
+        f['Index_M1_IPS1610_Fx']**2 +
+        f['Index_M1_IPS1610_Fy']**2 +
+        f['Index_M1_IPS1610_Fz']**2
+    )
+    return thumb_mag + index_mag
+
+@profiled()
 def process_force_data(file_path):
     try:
-        df = pd.read_csv(file_path)
-        # NOTE: 实际只有一个力传感器，Thumb/Index 是同一传感器的两个通道/位置。
-        # 因此这里按用户要求：将 Thumb 与 Index 的力幅值相加，得到“总力”用于比较（C vs D）。
-        #
-        # 使用 M1 的三轴（IPS1610）作为主通道；若存在缺失/截断行，按 0 处理。
-
-        needed = [
-            'Thumb_M1_IPS1610_Fx', 'Thumb_M1_IPS1610_Fy', 'Thumb_M1_IPS1610_Fz',
-            'Index_M1_IPS1610_Fx', 'Index_M1_IPS1610_Fy', 'Index_M1_IPS1610_Fz',
-        ]
-        for c in needed:
-            if c not in df.columns:
-                return {}
-
-        df_needed = df[needed].apply(pd.to_numeric, errors='coerce').fillna(0.0)
-
-        thumb_mag = np.sqrt(
-            df_needed['Thumb_M1_IPS1610_Fx']**2 +
-            df_needed['Thumb_M1_IPS1610_Fy']**2 +
-            df_needed['Thumb_M1_IPS1610_Fz']**2
-        )
-        index_mag = np.sqrt(
-            df_needed['Index_M1_IPS1610_Fx']**2 +
-            df_needed['Index_M1_IPS1610_Fy']**2 +
-            df_needed['Index_M1_IPS1610_Fz']**2
-        )
-
-        total_mag = thumb_mag + index_mag
+        rec = load_force_sensor(file_path)
+        total_mag = force_total_magnitude(rec)
+        if total_mag is None:
+            return {}
 
         return {
             "Force_Total_Mean": float(total_mag.mean()),
@@ -550,27 +283,72 @@ def process_force_data(file_path):
         }
     except Exception as e:
         print(f"Error reading force file {file_path}: {e}")
+        count_error("process_force_data", e)
         return {}
 
 # --- Signal Processing Helpers ---
-def butter_bandpass(lowcut, highcut, fs, order=3):
+# The Bio_* kernels filter in second-order sections (the (b, a) form is numerically
+# poor at 0.05 Hz / 1 kHz) but at the raw rate, forward-backward with the same edge
+# padding filtfilt used for the (b, a) filter (filtfilt_padlen). On 300 synthetic
+# 60 s rounds at 1 kHz every Bio_* value matches the previous (b, a) filtfilt kernels:
+# HR / RMSSD / LF/HF / SCR / RESP identical, SCL within 1e-10 relative. Decimating
+# first was tried and is not worth it: the raw-rate filter + peak search costs ~2 ms
+# per round, while peaks found at a working rate move single beats / SCRs and RMSSD
+# and LF/HF follow single beats (up to 16% / 190% off on some rounds).
+# Bio_SCR_Freq_Filtered is an additional, differently defined SCR count: phasic peaks
+# searched at EDA_WORK_FS, after the anti-alias filter, so sample noise above
+# 0.01 uS is not counted (~20/min vs ~45/min for Bio_SCR_Freq on synthetic rounds
+# with 3 SCRs/min). The Bio_EDA_* gradient features keep the paper's FFT resample.
+BVP_WORK_FS = 250  # event-related HR (trial_responses.py)
+EDA_WORK_FS = 20
+
+# Bump when process_bio_data / process_force_data output changes, so the
+# feature store (data/.feature_store) recomputes those units.
+FEATURE_CODE_VERSION = {"bio": 4, "force": 1}
+
+def butter_bandpass_sos(lowcut, highcut, fs, order=3):
     nyq = 0.5 * fs
-    low = lowcut / nyq
-    high = highcut / nyq
-    b, a = butter(order, [low, high], btype='band')
-    return b, a
+    return butter(order, [lowcut / nyq, highcut / nyq], btype='band', output='sos')
 
-def butter_lowpass(cutoff, fs, order=3):
+def butter_lowpass_sos(cutoff, fs, order=3):
     nyq = 0.5 * fs
-    normal_cutoff = cutoff / nyq
-    b, a = butter(order, normal_cutoff, btype='low', analog=False)
-    return b, a
+    return butter(order, cutoff / nyq, btype='low', output='sos')
+
+def filtfilt_padlen(sos):
+    # filtfilt's default padding (3 * taps) for the same filter in (b, a) form
+    return 3 * (2 * len(sos) + 1)
 
+@profiled("resample_poly")
+def decimate_signal(signal, fs, target_fs):
+    """
+    Anti-aliased polyphase decimation of `signal` from fs to target_fs.
+    Returns (decimated float64 signal, actual working fs). Signals already at or
+    below target_fs are returned unchanged (as float64).
+    """
+    x = np.asarray(signal, dtype=np.float64)
+    if fs <= target_fs:
+        return x, fs
+    g = gcd(int(round(fs)), int(round(target_fs)))
+    up, down = int(round(target_fs)) // g, int(round(fs)) // g
+    # padtype='line' avoids the zero-padding edge transients of the default
+    return resample_poly(x, up, down, padtype='line'), fs * up / down
+
+def _refine_peaks(x, peaks):
+    # Parabolic interpolation of each peak from its two neighbours (sub-sample position)
+    p = peaks[(peaks > 0) & (peaks < len(x) - 1)]
+    y0, y1, y2 = x[p - 1], x[p], x[p + 1]
+    denom = y0 - 2 * y1 + y2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.where(denom != 0, 0.5 * (y0 - y2) / denom, 0.0)
+    return p + np.clip(delta, -0.5, 0.5)
+
+@profiled()
 def calculate_hr_hrv(bvp_signal, fs=1000):
     try:
         # BVP usually 0.5-4Hz
-        b, a = butter_bandpass(0.5, 4.0, fs, order=2)
-        filtered = filtfilt(b, a, bvp_signal)
+        sos = butter_bandpass_sos(0.5, 4.0, fs, order=2)
+        with span("sosfiltfilt"):
+            filtered = sosfiltfilt(sos, np.asarray(bvp_signal, dtype=np.float64), padlen=filtfilt_padlen(sos))
         
         # Find peaks (systolic)
         distance = int(0.4 * fs)
@@ -625,9 +403,11 @@ def calculate_hr_hrv(bvp_signal, fs=1000):
         lf_hf_ratio = lf_power / hf_power if hf_power > 0 else np.nan
         
         return hr, rmssd, lf_hf_ratio
-    except Exception:
+    except Exception as e:
+        count_error("calculate_hr_hrv", e)
         return np.nan, np.nan, np.nan
 
+@profiled()
 def calculate_gsr_gradient_features(eda_signal, fs=1000):
     """
     Paper Method:
@@ -639,7 +419,8 @@ def calculate_gsr_gradient_features(eda_signal, fs=1000):
         # 1. Downsample to 20Hz
         target_fs = 20
         num_samples = int(len(eda_signal) * target_fs / fs)
-        eda_down = resample(eda_signal, num_samples)
+        with span("resample_fft"):
+            eda_down = resample(eda_signal, num_samples)
         
         # 2. Gradient
         gradient = np.gradient(eda_down)
@@ -647,7 +428,8 @@ def calculate_gsr_gradient_features(eda_signal, fs=1000):
         # 3. FFT
         # Use rfft for real input
         N = len(gradient)
-        yf = fft(gradient)
+        with span("fft"):
+            yf = fft(gradient)
         xf = fftfreq(N, 1 / target_fs)
         
         # Take positive half
@@ -667,77 +449,104 @@ def calculate_gsr_gradient_features(eda_signal, fs=1000):
         idx_005 = (np.abs(freqs - 0.05)).argmin()
         power_005 = power[idx_005]
         
-        return mean_freq, peak_freq, power_005
-    except Exception:
+        return float(mean_freq), float(peak_freq), float(power_005)
+    except Exception as e:
+        count_error("calculate_gsr_gradient_features", e)
         return np.nan, np.nan, np.nan
 
+@profiled()
 def calculate_eda_features(eda_signal, fs=1000):
+    """(SCL mean, SCR / min, SCR / min searched at EDA_WORK_FS) of an EDA signal."""
     try:
+        eda = np.asarray(eda_signal, dtype=np.float64)
+        
         # SCL: Low pass < 0.05 Hz
-        b, a = butter_lowpass(0.05, fs, order=2)
-        scl = filtfilt(b, a, eda_signal)
+        sos = butter_lowpass_sos(0.05, fs, order=2)
+        with span("sosfiltfilt"):
+            scl = sosfiltfilt(sos, eda, padlen=filtfilt_padlen(sos))
         scl_mean = np.mean(scl)
         
         # SCR: High pass > 0.05 Hz (Phasic)
         # Or just subtract SCL
-        phasic = eda_signal - scl
+        phasic = eda - scl
         
         # Find peaks in phasic
         # Threshold: 0.01 uS (common)
         # Distance: 1s
-        peaks, properties = find_peaks(phasic, height=0.01, distance=fs)
+        with span("find_peaks.scr"):
+            peaks, properties = find_peaks(phasic, height=0.01, distance=fs)
         
-        duration_min = len(eda_signal) / fs / 60
+        duration_min = len(eda) / fs / 60
         scr_freq = len(peaks) / duration_min if duration_min > 0 else 0
         
-        return scl_mean, scr_freq
-    except Exception:
-        return np.nan, np.nan
+        # Same search on the anti-aliased EDA_WORK_FS signal (SCRs last seconds)
+        phasic_work, work_fs = decimate_signal(phasic, fs, EDA_WORK_FS)
+        peaks_work, _ = find_peaks(phasic_work, height=0.01, distance=max(1, int(work_fs)))
+        scr_freq_filtered = len(peaks_work) / duration_min if duration_min > 0 else 0
+        
+        return scl_mean, scr_freq, scr_freq_filtered
+    except Exception as e:
+        count_error("calculate_eda_features", e)
+        return np.nan, np.nan, np.nan
 
+@profiled()
 def calculate_resp_rate(resp_signal, fs=1000):
     try:
+        resp = np.asarray(resp_signal, dtype=np.float64)
+        
         # Bandpass 0.1 - 0.5 Hz (6 - 30 breaths/min)
-        b, a = butter_bandpass(0.1, 0.5, fs, order=2)
-        filtered = filtfilt(b, a, resp_signal)
+        sos = butter_bandpass_sos(0.1, 0.5, fs, order=2)
+        with span("sosfiltfilt"):
+            filtered = sosfiltfilt(sos, resp, padlen=filtfilt_padlen(sos))
         
         peaks, _ = find_peaks(filtered, distance=fs*2) # at least 2s per breath
         
-        duration_min = len(resp_signal) / fs / 60
+        duration_min = len(resp) / fs / 60
         rate = len(peaks) / duration_min if duration_min > 0 else 0
         
         return rate
-    except Exception:
+    except Exception as e:
+        count_error("calculate_resp_rate", e)
         return np.nan
 
-def process_bio_data(file_path):
+@profiled()
+def process_bio_data(file_path, window=None):
+    """
+    Bio features of a PhysioLAB recording. With window=(start, end) only that
+    epoch of a continuous recording is used (cut by StorageTime, zero-copy).
+    """
     try:
-        # Skip first row if it's metadata? Header is usually line 1 (0-indexed)
-        # File read showed: 
-        # Line 1: ID,StorageTime,...
-        df = pd.read_csv(file_path)
-        
-        # Columns: ...BVP, ...EDA, ...RESP
-        # Use regex to find columns
-        bvp_col = [c for c in df.columns if "BVP" in c][0]
-        eda_col = [c for c in df.columns if "EDA" in c][0]
-        resp_col = [c for c in df.columns if "RESP" in c][0]
-        
-        # Assume 1000Hz based on file inspection
-        fs = 1000
+        # PhysioLAB export: ID,StorageTime,...|CH1-BVP,...|CH2-EDA,...|CH3-RESP
+        # 只解析 StorageTime 与三个通道（float32，分块读取），避免整表载入内存；
+        # 解析结果缓存在 data/.signal_cache，之后直接 memmap
+        rec = load_physiolab(file_path)
+        fs = rec["fs"]
+        if window is not None:
+            # 只接受完整覆盖该轮的记录（允许差一个时间戳精度）；被截断的 epoch 会打印覆盖比例后跳过
+            coverage = recording_coverage(rec, *window)
+            if coverage < 1.0:
+                print(f"  Bio recording {os.path.basename(file_path)} covers {coverage:.0%} of {window[0]} - {window[1]}, skipped")
+                count_error("process_bio_data.window")
+                return {}
+            epoch = epoch_views(rec, *window)
+            bvp, eda, resp = epoch["BVP"], epoch["EDA"], epoch["RESP"]
+        else:
+            bvp, eda, resp = rec["BVP"], rec["EDA"], rec["RESP"]
         
-        hr, rmssd, lf_hf = calculate_hr_hrv(df[bvp_col].values, fs)
-        scl, scr_freq = calculate_eda_features(df[eda_col].values, fs)
-        eda_mean_f, eda_peak_f, eda_p005 = calculate_gsr_gradient_features(df[eda_col].values, fs)
-        resp_rate = calculate_resp_rate(df[resp_col].values, fs)
+        hr, rmssd, lf_hf = calculate_hr_hrv(bvp, fs)
+        scl, scr_freq, scr_freq_filtered = calculate_eda_features(eda, fs)
+        eda_mean_f, eda_peak_f, eda_p005 = calculate_gsr_gradient_features(eda, fs)
+        resp_rate = calculate_resp_rate(resp, fs)
         
         return {
-            "Bio_BVP_Mean": df[bvp_col].mean(), # Keep original
+            "Bio_BVP_Mean": float(np.nanmean(bvp, dtype=np.float64)), # Keep original
             "Bio_HR_Mean": hr,
             "Bio_HRV_RMSSD": rmssd,
             "Bio_HRV_LFHF": lf_hf,
-            "Bio_EDA_Mean": df[eda_col].mean(), # Keep original
+            "Bio_EDA_Mean": float(np.nanmean(eda, dtype=np.float64)), # Keep original
             "Bio_SCL_Mean": scl,
             "Bio_SCR_Freq": scr_freq,
+            "Bio_SCR_Freq_Filtered": scr_freq_filtered,
             "Bio_EDA_MeanFreq": eda_mean_f,
             "Bio_EDA_PeakFreq": eda_peak_f,
             "Bio_EDA_Power005": eda_p005,
@@ -745,120 +554,197 @@ def process_bio_data(file_path):
         }
     except Exception as e:
         print(f"Error reading bio file {file_path}: {e}")
+        count_error("process_bio_data", e)
         return {}
 
+@profiled()
 def process_nasa_tlx():
+    """
+    NASA-TLX per (SubjectID, Round): raw TLX (mean of the six ratings), Mental,
+    Frustration. Rounds are taken from the workbook's column suffixes. If a
+    NASA-TLX_weights file (pairwise comparisons or tallies) is present, the
+    pairwise-weighted NASA_TLX_Weighted is added as well; an unreadable weights
+    file only drops that column.
+    """
     try:
-        df = pd.read_excel("data/NASA-TLX_6_6.xlsx")
-        # Rename column for easier access
-        df.rename(columns={'志愿者编号 Number ': 'SubjectID'}, inplace=True)
-        
-        # Dimensions
-        dims = ['心理需求 Mental Demand', '身体需求 Physical Demand', '时间压力 Temporal Demand', 
-                '个人表现 Performance', '努力程度 Effort', '挫败感 Frustration Level']
-        
-        nasa_data = {} # (SubjectID, RoundIndex 0-3) -> {metrics}
-        
-        for _, row in df.iterrows():
-            sub_id = row['SubjectID']
-            if pd.isna(sub_id): continue
-            sub_id = int(sub_id)
-            
-            for i in range(4):
-                suffix = "" if i == 0 else f".{i}"
-                
-                # Calculate Mean TLX for this block
-                scores = []
-                for d in dims:
-                    col = f"{d}{suffix}"
-                    if col in df.columns:
-                        scores.append(row[col])
-                
-                if scores:
-                    mean_tlx = np.mean(scores)
-                    nasa_data[(sub_id, i+1)] = { # Round is 1-based
-                        "NASA_TLX_Score": mean_tlx,
-                        "NASA_Mental": row.get(f"心理需求 Mental Demand{suffix}", np.nan),
-                        "NASA_Frustration": row.get(f"挫败感 Frustration Level{suffix}", np.nan)
-                    }
-        return nasa_data
+        manifest = get_manifest()
+        path = manifest.latest("nasa_tlx") or os.path.join(DATA_DIR, "NASA-TLX_6_6.xlsx")
+        weights_path = manifest.latest("nasa_tlx_weights")
+        weights = None
+        if weights_path:
+            try:
+                weights = load_tlx_weights(weights_path)
+            except Exception as e:
+                print(f"Error reading NASA TLX weights, NASA_TLX_Weighted skipped: {e}")
+                count_error("process_nasa_tlx.weights", e)
+        return nasa_map_from_scores(tlx_scores(load_nasa_long(path), weights))
     except Exception as e:
         print(f"Error reading NASA TLX: {e}")
+        count_error("process_nasa_tlx", e)
         return {}
 
-def main():
+class _InlineExecutor:
+    """Executor stand-in for --jobs 1: runs every submitted call immediately, in-process."""
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        try:
+            fut.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def process_unit_signals(sub_id, condition, window=None, store_dir=FEATURE_STORE_DIR):
+    """
+    Bio + force features for one (subject, condition) unit.
+    Independent of every other unit, so --jobs N runs these in worker processes.
+    window: (start, end) of the round from mist_results, used to cut the epoch
+    out of a continuous per-subject recording.
+    Results come from the feature store when the input files, window and
+    FEATURE_CODE_VERSION are unchanged (store_dir=None always recomputes).
+    """
+    stats = {}
+    
+    # 3. Bio Data
+    # Prefer a per-condition file ({id}{cond}_Entity...); otherwise cut this
+    # round out of the subject's continuous recording ({id}Test_Entity_Recording_...)
+    bio_file = find_bio_file(sub_id, condition)
+    bio_window = None
+    if not bio_file and window is not None:
+        bio_file = find_bio_recording_for_window(sub_id, window)
+        bio_window = window
+    if bio_file:
+        # print(f"  Found Bio: {os.path.basename(bio_file)}")
+        stats.update(cached_features(
+            "bio", sub_id, condition, [bio_file], FEATURE_CODE_VERSION["bio"],
+            lambda: process_bio_data(bio_file, window=bio_window),
+            extra=[str(w) for w in bio_window] if bio_window else None,
+            store_dir=store_dir,
+        ))
+    else:
+        print(f"  Missing Bio for Subject {sub_id} Condition {condition}")
+        count_error("missing.bio")
+        
+    # 4. Force Data (Only C and D)
+    if condition in ['C', 'D']:
+        force_file = find_force_file(sub_id, condition)
+        if force_file:
+            # print(f"  Found Force: {os.path.basename(force_file)}")
+            stats.update(cached_features(
+                "force", sub_id, condition, [force_file], FEATURE_CODE_VERSION["force"],
+                lambda: process_force_data(force_file),
+                store_dir=store_dir,
+            ))
+        else:
+            print(f"  Missing Force for Subject {sub_id} Condition {condition}")
+            count_error("missing.force")
+    return stats
+
+def main(jobs=1, rebuild=False, profile=None, profile_memory=False, profile_top=profiling.DEFAULT_TOP_N):
+    """
+    profile: path of a JSON trace of every stage (timings, memory, bytes read,
+    error counts), written at the end together with a hot-stage summary.
+    """
+    if profile:
+        profiling.enable(memory=profile_memory)
+    try:
+        with span("process_data.main", jobs=jobs, rebuild=rebuild):
+            _run(jobs, rebuild)
+    finally:
+        if profile:
+            profiling.write_trace(profile, profile_top)
+            profiling.disable()
+
+def _run(jobs, rebuild):
     final_data = []
+    pending = [] # (row, future of process_unit_signals)
     
-    # Load NASA TLX first
-    nasa_map = process_nasa_tlx()
-    avatar_map = process_avatar_scale()
+    # One scan of data/ (incremental by mtime); forked workers inherit the index
+    with span("manifest.refresh"):
+        get_manifest(refresh=True)
+    # Per-unit feature store: only stale units are recomputed (--rebuild ignores it)
+    store_dir = None if rebuild else FEATURE_STORE_DIR
+    # Workers return their spans with each result (None when not profiling)
+    trace = profiling.settings()
     
-    for sub_id in range(1, 7):
-        print(f"Processing Subject {sub_id}...")
-        
-        # 1. MIST Data
-        mist_file = find_mist_file(sub_id)
-        if not mist_file:
-            print(f"  No MIST file found for Subject {sub_id}")
-            continue
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else _InlineExecutor()
+    with executor:
+        # Questionnaire xlsx parsing overlaps with the signal work when jobs > 1
+        nasa_future = executor.submit(profiling.traced_call, trace, process_nasa_tlx)
+        avatar_future = executor.submit(profiling.traced_call, trace, process_avatar_scale)
+        
+        subject_order = load_subject_order()
+        for sub_id in sorted(subject_order):
+            print(f"Processing Subject {sub_id}...")
             
-        mist_df = pd.read_csv(mist_file)
-        ts = _extract_timestamp_from_filename(mist_file)
-
-        # 1.1 Word recall (saved per round). Build a round->df map for this session.
-        recall_map = load_recall_map_for_session(sub_id, mist_ts=ts) if ts else {}
-        if not recall_map:
-            print(f"  Missing Recall files for Subject {sub_id} (session ts={ts})")
-        
-        # 2. Iterate Rounds
-        order = SUBJECT_ORDER.get(sub_id)
-        
-        for round_num in range(1, 5): # Rounds 1-4
-            condition = order[round_num-1] # index 0-3
-            
-            # Filter MIST
-            round_data = mist_df[mist_df['Round'] == round_num]
-            if round_data.empty:
-                print(f"  No data for Round {round_num} (Condition {condition})")
+            # 1. MIST Data
+            mist_file = find_mist_file(sub_id)
+            if not mist_file:
+                print(f"  No MIST file found for Subject {sub_id}")
+                count_error("missing.mist_results")
                 continue
                 
-            # MIST Stats
-            avg_time = round_data['TimeTaken'].mean()
-            timeouts = round_data['Timeout'].sum()
-            recall_df_round = recall_map.get(round_num)
-            word_correct = compute_recall_correct_targets(recall_df_round, round_num)
+            with span("load.mist_results", **file_attrs(mist_file)):
+                mist_df = pd.read_csv(mist_file)
+
+            # 1.1 Word recall: round->df map for this session (container, or legacy per-round files)
+            recall_map = load_recall_map(sub_id, mist_file)
+            if not recall_map:
+                print(f"  Missing Recall files for Subject {sub_id} (session {mist_file})")
+                count_error("missing.mist_recall")
             
-            row = {
-                "SubjectID": sub_id,
-                "Condition": condition,
-                "Round": round_num,
-                "MIST_ResponseTime": avg_time,
-                "MIST_Timeouts": timeouts,
-                "Word_Recall_Correct": word_correct
-            }
+            # 1.2 Round time windows (question onsets .. last response) for bio epoching
+            windows = round_windows(mist_df)
             
-            # 3. Bio Data
-            bio_file = find_bio_file(sub_id, condition)
-            if bio_file:
-                # print(f"  Found Bio: {os.path.basename(bio_file)}")
-                bio_stats = process_bio_data(bio_file)
-                row.update(bio_stats)
-            else:
-                print(f"  Missing Bio for Subject {sub_id} Condition {condition}")
+            # 2. Iterate Rounds
+            order = subject_order[sub_id]
+            
+            for round_num in range(1, len(order) + 1): # Rounds 1-4
+                condition = order[round_num-1] # index 0-3
+                
+                # Filter MIST
+                round_data = mist_df[mist_df['Round'] == round_num]
+                if round_data.empty:
+                    print(f"  No data for Round {round_num} (Condition {condition})")
+                    continue
+                    
+                # MIST Stats
+                avg_time = round_data['TimeTaken'].mean()
+                timeouts = round_data['Timeout'].sum()
+                recall_df_round = recall_map.get(round_num)
+                word_correct = compute_recall_correct_targets(recall_df_round, round_num)
                 
-            # 4. Force Data (Only C and D)
-            if condition in ['C', 'D']:
-                force_file = find_force_file(sub_id, condition)
-                if force_file:
-                    # print(f"  Found Force: {os.path.basename(force_file)}")
-                    force_stats = process_force_data(force_file)
-                    row.update(force_stats)
-                else:
-                    print(f"  Missing Force for Subject {sub_id} Condition {condition}")
-
-                # 4.1 Avatar Embodiment Questionnaire (only for robot conditions)
-                if (sub_id, condition) in avatar_map:
-                    row.update(avatar_map[(sub_id, condition)])
+                row = {
+                    "SubjectID": sub_id,
+                    "Condition": condition,
+                    "Round": round_num,
+                    "MIST_ResponseTime": avg_time,
+                    "MIST_Timeouts": timeouts,
+                    "Word_Recall_Correct": word_correct
+                }
+                
+                # 3./4. Bio + Force (CPU heavy, one unit per subject x condition)
+                pending.append((row, executor.submit(profiling.traced_call, trace, process_unit_signals,
+                                                     sub_id, condition, windows.get(round_num), store_dir)))
+        
+        with span("wait.questionnaires"):
+            nasa_map = profiling.unwrap(nasa_future.result())
+            avatar_map = profiling.unwrap(avatar_future.result())
+        
+        # Merge in submission order so the output does not depend on completion order
+        for row, fut in pending:
+            sub_id, condition, round_num = row["SubjectID"], row["Condition"], row["Round"]
+            with span("wait.units"):
+                row.update(profiling.unwrap(fut.result()))
+            
+            # 4.1 Avatar Embodiment Questionnaire (only for robot conditions)
+            if condition in ['C', 'D'] and (sub_id, condition) in avatar_map:
+                row.update(avatar_map[(sub_id, condition)])
             
             # 5. NASA TLX
             # Round num is 1-4.
@@ -869,10 +755,23 @@ def main():
             
     # Save
     final_df = pd.DataFrame(final_data)
-    final_df.to_csv("combined_analysis.csv", index=False)
+    with span("write_table", rows=len(final_df)):
+        write_table(final_df, "combined_analysis.csv")
     print("Done. Saved to combined_analysis.csv")
     print(final_df.head())
 
 if __name__ == "__main__":
-    main()
-
+    parser = argparse.ArgumentParser(description="Build combined_analysis.csv from data/")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for per-(subject, condition) signal processing (0 = all cores)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every unit instead of reusing data/.feature_store")
+    parser.add_argument("--profile", nargs="?", const="profile_trace.json", default=None, metavar="PATH",
+                        help="write a JSON trace of every stage (default profile_trace.json) and print the hot stages")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile: also record tracemalloc peaks per stage (slower)")
+    parser.add_argument("--profile-top", type=int, default=profiling.DEFAULT_TOP_N,
+                        help="number of stages in the hot-stage summary")
+    args = parser.parse_args()
+    main(jobs=args.jobs if args.jobs > 0 else (os.cpu_count() or 1), rebuild=args.rebuild,
+         profile=args.profile, profile_memory=args.profile_memory, profile_top=args.profile_top)
@@ -0,0 +1,375 @@
+import os
+import sys
+import json
+import time
+import functools
+import tracemalloc
+from collections import defaultdict
+
+try:
+    import psutil
+except ImportError:  # RSS from getrusage (peak only)
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 流水线的性能埋点（process_data.py --profile）：
+# - span(name, **attrs)：计时区段（wall / CPU，进入和退出时的 RSS，开启
+#   memory=True 时还有 tracemalloc 峰值），可嵌套，attrs 里可放文件字节数等
+# - count_error(stage, exc)：被 except 吞掉的错误按阶段计数。每个异常只计一次：
+#   从 span 里抛出的异常先记在该 span 上，之后被 except 用 count_error 处理时
+#   改记到处理它的阶段
+# 未调用 enable() 时 span 直接返回空 context，几乎没有开销。
+# worker 进程通过 traced_call() 执行任务，把自己的 span 连同结果一起返回，
+# 主进程用 unwrap() 合并，所以 --jobs N 时的 trace 也是完整的。
+# write_trace() 输出 Chrome trace 格式（chrome://tracing / Perfetto 可直接打开）
+# 的 JSON，另附按阶段汇总的统计。主进程等待 worker 的 span（名字以 wait. 开头）
+# 与 worker 的阶段在时间上重叠，不参与最耗时阶段的排名，单独列出。
+DEFAULT_TOP_N = 15
+WAIT_PREFIX = "wait."
+_COUNTED_AS = "_profiling_stage"  # set on an exception once it has been counted
+
+_STATE = None
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Profile:
+    """Collected spans and error counts of one process."""
+
+    def __init__(self, memory=False, t0=None):
+        self.pid = os.getpid()
+        self.memory = memory
+        # workers take the parent's origin: perf_counter is system-wide on Linux/macOS
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.events = []
+        self.errors = defaultdict(int)
+        self.error_samples = {}
+        self.stack = []
+        self.next_id = 0
+        self.worker_maxrss = None
+        self.proc = psutil.Process() if psutil is not None else None
+        self.own_tracemalloc = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.own_tracemalloc = True
+
+    def rss(self):
+        if self.proc is not None:
+            try:
+                return int(self.proc.memory_info().rss)
+            except Exception:
+                return None
+        return None
+
+
+def _maxrss_bytes():
+    if resource is None:
+        return None
+    ru = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return int(ru) if sys.platform == "darwin" else int(ru) * 1024
+
+
+def enable(memory=False, t0=None):
+    """Start collecting in this process (replaces an earlier collection)."""
+    global _STATE
+    disable()
+    _STATE = _Profile(memory=memory, t0=t0)
+    return _STATE
+
+
+def disable():
+    global _STATE
+    if _STATE is not None and _STATE.own_tracemalloc:
+        tracemalloc.stop()
+    _STATE = None
+
+
+def enabled():
+    return _STATE is not None and _STATE.pid == os.getpid()
+
+
+def settings():
+    """enable() arguments for worker processes, or None when not profiling."""
+    return {"memory": _STATE.memory, "t0": _STATE.t0} if enabled() else None
+
+
+class _Span:
+    __slots__ = ("prof", "name", "attrs", "id", "parent", "w0", "c0", "rss0", "mem0", "peak")
+
+    def __init__(self, prof, name, attrs):
+        self.prof = prof
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        prof = self.prof
+        self.id = prof.next_id
+        prof.next_id += 1
+        self.parent = prof.stack[-1] if prof.stack else None
+        if prof.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+            self.mem0, self.peak = current, current
+        prof.stack.append(self)
+        self.rss0 = prof.rss()
+        self.c0 = time.process_time()
+        self.w0 = time.perf_counter()
+        return self
+
+    def set(self, **attrs):
+        """Add attributes known only inside the span (e.g. a cache hit)."""
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        w1 = time.perf_counter()
+        c1 = time.process_time()
+        prof = self.prof
+        prof.stack.pop()
+        event = {
+            "name": self.name,
+            "id": self.id,
+            "parent": self.parent.id if self.parent is not None else None,
+            "pid": prof.pid,
+            "start_s": self.w0 - prof.t0,
+            "wall_s": w1 - self.w0,
+            "cpu_s": c1 - self.c0,
+            "rss_start": self.rss0,
+            "rss_end": prof.rss(),
+        }
+        if prof.memory:
+            peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            event["mem_peak_bytes"] = peak - self.mem0
+            if self.parent is not None:
+                self.parent.peak = max(self.parent.peak, peak)
+            tracemalloc.reset_peak()
+        if exc_type is not None:
+            event["error"] = exc_type.__name__
+            if getattr(exc, _COUNTED_AS, None) is None:  # outer spans it passes through do not count it again
+                count_error(self.name, exc)
+        if self.attrs:
+            event["attrs"] = self.attrs
+        prof.events.append(event)
+        return False
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; a shared no-op when profiling is off."""
+    if not enabled():
+        return _NULL_SPAN
+    return _Span(_STATE, name, attrs)
+
+
+def profiled(name=None):
+    """Decorator: run the function inside span(name or its __name__)."""
+    def wrap(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not enabled():
+                return fn(*args, **kwargs)
+            with _Span(_STATE, stage, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def file_attrs(path):
+    """Span attributes of an input file: base name and size in bytes."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    return {"file": os.path.basename(path), "bytes": size}
+
+
+def count_error(stage, exc=None):
+    """Count an error of `stage` that is handled (and otherwise only printed) by the caller."""
+    if not enabled():
+        return
+    if exc is not None:
+        counted = getattr(exc, _COUNTED_AS, None)
+        if counted is not None:
+            # already counted by a span it escaped from: count it where it is handled instead
+            _STATE.errors[counted] -= 1
+            if _STATE.errors[counted] <= 0:
+                del _STATE.errors[counted]
+                _STATE.error_samples.pop(counted, None)
+        try:
+            setattr(exc, _COUNTED_AS, stage)
+        except AttributeError:
+            pass
+        _STATE.error_samples.setdefault(stage, f"{type(exc).__name__}: {exc}")
+    _STATE.errors[stage] += 1
+
+
+def _drain():
+    payload = {
+        "events": _STATE.events,
+        "errors": dict(_STATE.errors),
+        "error_samples": dict(_STATE.error_samples),
+        "maxrss_bytes": _maxrss_bytes(),
+    }
+    _STATE.events, _STATE.errors, _STATE.error_samples = [], defaultdict(int), {}
+    return payload
+
+
+def traced_call(profile_settings, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs) for an executor: returns (result, trace payload or
+    None). In a worker process with profile_settings set, the call is profiled
+    and its spans are returned; in the profiling process itself they are
+    recorded directly.
+    """
+    if profile_settings is None:
+        return fn(*args, **kwargs), None
+    name = f"task:{getattr(fn, '__name__', 'call')}"
+    if enabled():
+        with _Span(_STATE, name, {}):
+            return fn(*args, **kwargs), None
+    enable(**profile_settings)
+    try:
+        with _Span(_STATE, name, {}):
+            result = fn(*args, **kwargs)
+        return result, _drain()
+    finally:
+        disable()
+
+
+def unwrap(outcome):
+    """Result of a traced_call(), merging the worker's spans into this process's profile."""
+    result, payload = outcome
+    if payload is not None and enabled():
+        # worker ids are per process; offset them so parents stay unambiguous
+        offset = _STATE.next_id
+        for e in payload["events"]:
+            e["id"] += offset
+            if e["parent"] is not None:
+                e["parent"] += offset
+        _STATE.next_id += max((e["id"] for e in payload["events"]), default=offset) - offset + 1
+        _STATE.events.extend(payload["events"])
+        for stage, n in payload["errors"].items():
+            _STATE.errors[stage] += n
+        for stage, msg in payload["error_samples"].items():
+            _STATE.error_samples.setdefault(stage, msg)
+        _STATE.worker_maxrss = max(_STATE.worker_maxrss or 0, payload["maxrss_bytes"] or 0)
+    return result
+
+
+def stage_summary(events, errors=None):
+    """
+    Per stage name: calls, total/self wall seconds, CPU seconds, bytes read and
+    the largest memory peak, sorted by self time (time not spent in child spans).
+    Stages where the parent waits on workers ("wait" True) overlap the workers'
+    stages and are sorted after all others.
+    """
+    child_wall = defaultdict(float)
+    for e in events:
+        if e["parent"] is not None:
+            child_wall[e["parent"]] += e["wall_s"]
+    stages = {}
+    for e in events:
+        s = stages.setdefault(e["name"], {
+            "stage": e["name"], "calls": 0, "wall_s": 0.0, "self_s": 0.0, "cpu_s": 0.0,
+            "bytes": 0, "mem_peak_bytes": None, "errors": 0, "wait": e["name"].startswith(WAIT_PREFIX),
+        })
+        s["calls"] += 1
+        s["wall_s"] += e["wall_s"]
+        s["self_s"] += max(0.0, e["wall_s"] - child_wall.get(e["id"], 0.0))
+        s["cpu_s"] += e["cpu_s"]
+        s["bytes"] += (e.get("attrs") or {}).get("bytes") or 0
+        if "mem_peak_bytes" in e:
+            s["mem_peak_bytes"] = max(s["mem_peak_bytes"] or 0, e["mem_peak_bytes"])
+    for stage, n in (errors or {}).items():
+        stages.setdefault(stage, {
+            "stage": stage, "calls": 0, "wall_s": 0.0, "self_s": 0.0, "cpu_s": 0.0,
+            "bytes": 0, "mem_peak_bytes": None, "errors": 0, "wait": stage.startswith(WAIT_PREFIX),
+        })["errors"] = n
+    return sorted(stages.values(), key=lambda s: (s["wait"], -s["self_s"]))
+
+
+def chrome_trace_events(events):
+    """Spans as Chrome trace 'complete' events (microseconds, one track per process)."""
+    out = []
+    for e in events:
+        args = dict(e.get("attrs") or {})
+        args.update({k: e[k] for k in ("cpu_s", "rss_start", "rss_end", "mem_peak_bytes", "error") if k in e})
+        out.append({
+            "name": e["name"], "ph": "X", "pid": e["pid"], "tid": e["pid"],
+            "ts": round(e["start_s"] * 1e6, 1), "dur": round(e["wall_s"] * 1e6, 1), "args": args,
+        })
+    return out
+
+
+def report(top_n=DEFAULT_TOP_N):
+    """The collected profile as a JSON-able dict."""
+    if not enabled():
+        return None
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "pid": _STATE.pid,
+            "wall_s": time.perf_counter() - _STATE.t0,
+            "memory_tracing": _STATE.memory,
+            "rss_source": "psutil" if psutil is not None else None,
+            "maxrss_bytes": _maxrss_bytes(),
+            "worker_maxrss_bytes": _STATE.worker_maxrss,
+        },
+        "errors": dict(_STATE.errors),
+        "error_samples": dict(_STATE.error_samples),
+        "summary": stage_summary(_STATE.events, _STATE.errors),
+        "top_n": top_n,
+        "spans": _STATE.events,
+        "traceEvents": chrome_trace_events(_STATE.events),
+    }
+
+
+def print_summary(rep, top_n=DEFAULT_TOP_N):
+    print(f"\nHot stages (top {top_n} by self time, wall {rep['meta']['wall_s']:.2f} s):")
+    print(f"{'stage':36s} {'calls':>6s} {'self s':>9s} {'total s':>9s} {'cpu s':>9s} {'MiB read':>9s} "
+          f"{'peak MiB':>9s} {'errors':>6s}")
+    for s in [s for s in rep["summary"] if not s["wait"]][:top_n]:
+        peak = f"{s['mem_peak_bytes'] / 2**20:9.1f}" if s["mem_peak_bytes"] is not None else f"{'-':>9s}"
+        print(f"{s['stage']:36s} {s['calls']:6d} {s['self_s']:9.3f} {s['wall_s']:9.3f} {s['cpu_s']:9.3f} "
+              f"{s['bytes'] / 2**20:9.1f} {peak} {s['errors']:6d}")
+    waits = [s for s in rep["summary"] if s["wait"]]
+    if waits:
+        print("Waiting on workers (overlaps the stages above, not ranked):")
+        for s in waits:
+            print(f"  {s['stage']}: {s['wall_s']:.3f} s over {s['calls']} calls")
+    if rep["errors"]:
+        print("Errors by stage:")
+        for stage, n in sorted(rep["errors"].items()):
+            print(f"  {stage}: {n} (e.g. {rep['error_samples'].get(stage, '?')})")
+
+
+def write_trace(path, top_n=DEFAULT_TOP_N):
+    """Write report() to path and print the hot-stage summary."""
+    rep = report(top_n)
+    if rep is None:
+        return None
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rep, f, indent=1, default=str)
+    print_summary(rep, top_n)
+    print(f"Profile trace saved to {path}")
+    return rep
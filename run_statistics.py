@@ -1,7 +1,31 @@
+import os
+import argparse
 import pandas as pd
 import numpy as np
-from scipy import stats
-import scikit_posthocs as sp
+
+from stats_engine import CONDITIONS, friedman_table, paired_tables
+from bootstrap import bootstrap_tables, ci_column
+from analysis_cube import load_cube
+from table_io import write_table
+
+# Published tables (built outside this repo; they include Bio_RESP_Mean, which no script
+# here computes): never written unless explicitly asked
+PUBLISHED_TABLES_DIR = os.path.join("CHI_result", "tables")
+CHI_TABLES_DIR = "chi_tables"
+
+# Metrics of the CHI tables (friedman_ABCD.csv / paired_*_tests.csv)
+CHI_FRIEDMAN_METRICS = [
+    'MIST_ResponseTime', 'MIST_Timeouts', 'Word_Recall_Correct',
+    'NASA_TLX_Score', 'NASA_Mental', 'NASA_Frustration',
+]
+CHI_PAIRWISE_METRICS = [
+    'Word_Recall_Correct', 'MIST_ResponseTime', 'MIST_Timeouts',
+    'Bio_EDA_Mean', 'Bio_BVP_Mean', 'Bio_RESP_Mean',
+    'NASA_TLX_Score', 'NASA_Mental', 'NASA_Frustration',
+    'Force_Total_Mean', 'Force_Total_Max',
+]
+# In the published tables only; skipped without a warning when the input lacks them
+CHI_OPTIONAL_METRICS = {'Bio_RESP_Mean'}
 
 def interpret_effect_size_kendall(w):
     if w < 0.1: return "Very Weak"
@@ -10,8 +34,40 @@ def interpret_effect_size_kendall(w):
     if w < 0.7: return "Strong"
     return "Very Strong"
 
-def main():
-    df = pd.read_csv("combined_analysis.csv")
+def check_tables_dir(tables_dir, overwrite_published=False):
+    """Refuse to write into the published CHI tables unless explicitly allowed."""
+    if os.path.abspath(tables_dir) == os.path.abspath(PUBLISHED_TABLES_DIR) and not overwrite_published:
+        raise ValueError(f"'{tables_dir}' holds the published CHI tables; "
+                         "pass --overwrite-published to replace them")
+
+def write_chi_tables(cube, tables_dir=CHI_TABLES_DIR, boot=None, overwrite_published=False, **perm):
+    """Friedman + paired t / Wilcoxon tables for the CHI report, from the same engine."""
+    check_tables_dir(tables_dir, overwrite_published)
+    missing = [m for m in dict.fromkeys(CHI_FRIEDMAN_METRICS + CHI_PAIRWISE_METRICS)
+               if m not in cube.metrics and m not in CHI_OPTIONAL_METRICS]
+    if missing:
+        print(f"Warning: CHI table metrics missing from the input, skipped: {', '.join(missing)}")
+    os.makedirs(tables_dir, exist_ok=True)
+    f_df = friedman_table(cube, CHI_FRIEDMAN_METRICS, **perm)
+    t_df, w_df = paired_tables(cube, CHI_PAIRWISE_METRICS, **perm)
+    if boot:
+        # bootstrap CIs of the effect sizes (W, dz, RBC), resampling whole subjects
+        w_ci, _ = bootstrap_tables(cube, CHI_FRIEDMAN_METRICS, **boot)
+        _, pair_ci = bootstrap_tables(cube, CHI_PAIRWISE_METRICS, **boot)
+        f_df = f_df.merge(w_ci, on="metric", how="left")
+        t_df = t_df.merge(pair_ci[["metric", "contrast", ci_column("cohens_dz", "low"), ci_column("cohens_dz", "high")]],
+                          on=["metric", "contrast"], how="left")
+        w_df = w_df.merge(pair_ci[["metric", "contrast", ci_column("rbc", "low"), ci_column("rbc", "high")]],
+                          on=["metric", "contrast"], how="left")
+    write_table(f_df, os.path.join(tables_dir, "friedman_ABCD.csv"))
+    write_table(t_df, os.path.join(tables_dir, "paired_t_tests.csv"))
+    write_table(w_df, os.path.join(tables_dir, "paired_wilcoxon_tests.csv"))
+    print(f"CHI tables saved to '{tables_dir}'")
+
+def main(tables_dir=None, overwrite_published=False, permutation=None, n_resamples=100_000, seed=None, jobs=1,
+         n_boot=0, ci_method="bca"):
+    # one subject x condition x metric cube shared by every test below
+    cube = load_cube("combined_analysis.csv")
     
     # Metrics to analyze
     metrics = [
@@ -31,36 +87,22 @@ def main():
     
     print("=== Statistical Analysis Report ===\n")
     
+    # Friedman / Kendall's W / Nemenyi for all metrics at once
+    # (one subject x condition x metric array, ranked once; complete subjects per metric)
+    # permutation: exact / Monte-Carlo p-values next to the asymptotic ones (n is small)
+    perm = dict(permutation=permutation, n_resamples=n_resamples, seed=seed, jobs=jobs) if permutation else {}
+    fr = friedman_table(cube, metrics, **perm).set_index("metric")
+    boot = dict(n_boot=n_boot, method=ci_method, seed=seed, jobs=jobs) if n_boot else None
+    if boot:
+        w_ci = bootstrap_tables(cube, metrics, **boot)[0].set_index("metric")
+        fr = fr.join(w_ci)
+    
     for metric in metrics:
-        # Pivot data: Rows=Subject, Cols=Condition
-        # We need complete cases for repeated measures
-        pivot = df.pivot(index='SubjectID', columns='Condition', values=metric)
-        
-        # Check for missing values
-        if pivot.isnull().values.any():
-            # print(f"Warning: Missing values for {metric}. Dropping incomplete subjects.")
-            pivot = pivot.dropna()
-            
-        if pivot.shape[0] < 2:
+        if metric not in fr.index:
             print(f"Skipping {metric}: Not enough data points after dropping NaNs.")
             continue
-            
-        # 1. Friedman Test (Non-parametric repeated measures ANOVA)
-        # Conditions: A, B, C, D
-        try:
-            stat, p_val = stats.friedmanchisquare(
-                pivot['A'], pivot['B'], pivot['C'], pivot['D']
-            )
-        except ValueError as e:
-            print(f"Error calculating Friedman for {metric}: {e}")
-            continue
-
-        # 2. Kendall's W (Effect Size for Friedman)
-        # W = Chi2 / (N * (k-1))
-        # N = number of subjects, k = number of conditions (4)
-        N = pivot.shape[0]
-        k = 4
-        kendalls_w = stat / (N * (k - 1))
+        r = fr.loc[metric]
+        N, stat, p_val, kendalls_w = int(r["n_complete_subjects"]), r["chi2"], r["p"], r["kendalls_w"]
         w_interp = interpret_effect_size_kendall(kendalls_w)
         
         row = {
@@ -70,28 +112,32 @@ def main():
             "p_value": p_val,
             "Significance": "**" if p_val < 0.01 else ("*" if p_val < 0.05 else "ns"),
             "Kendalls_W": kendalls_w,
-            "W_Interpretation": w_interp
+            "W_Interpretation": w_interp,
+            "p_FDR": r["p_fdr"]
         }
+        if permutation:
+            row["p_perm"] = r["p_perm"]
+        if boot:
+            row["Kendalls_W_CI_low"] = r[ci_column("kendalls_w", "low")]
+            row["Kendalls_W_CI_high"] = r[ci_column("kendalls_w", "high")]
         results.append(row)
         
         print(f"--- {metric} ---")
         print(f"N={N}, Friedman p={p_val:.4f} ({row['Significance']})")
+        if permutation:
+            print(f"Permutation p={r['p_perm']:.4f} ({permutation})")
         print(f"Kendall's W={kendalls_w:.3f} ({w_interp})")
+        if boot:
+            print(f"  95% {ci_method} CI [{row['Kendalls_W_CI_low']:.3f}, {row['Kendalls_W_CI_high']:.3f}] (B={n_boot})")
         
-        # 3. Post-hoc Analysis (Nemenyi test) if significant
+        # Post-hoc Analysis (Nemenyi test) if significant
         if p_val < 0.05:
             print("  > Post-hoc (Nemenyi):")
-            # Melt for posthoc
-            melted = pivot.reset_index().melt(id_vars='SubjectID', var_name='Condition', value_name='Value')
-            ph = sp.posthoc_nemenyi_friedman(melted, y_col='Value', group_col='Condition', block_col='SubjectID')
-            
-            # Print significant pairs
             found_sig = False
-            conditions = ['A', 'B', 'C', 'D']
-            for i in range(len(conditions)):
-                for j in range(i+1, len(conditions)):
-                    c1, c2 = conditions[i], conditions[j]
-                    pval_ph = ph.loc[c1, c2]
+            for i in range(len(CONDITIONS)):
+                for j in range(i+1, len(CONDITIONS)):
+                    c1, c2 = CONDITIONS[i], CONDITIONS[j]
+                    pval_ph = r[f"nemenyi_{c1}_vs_{c2}"]
                     if pval_ph < 0.05:
                         print(f"    {c1} vs {c2}: p={pval_ph:.4f} *")
                         found_sig = True
@@ -101,8 +147,11 @@ def main():
 
     # Save results table
     res_df = pd.DataFrame(results)
-    res_df.to_csv("statistical_analysis_results.csv", index=False)
+    write_table(res_df, "statistical_analysis_results.csv")
     print("Full statistical table saved to 'statistical_analysis_results.csv'")
+    
+    if tables_dir:
+        write_chi_tables(cube, tables_dir, boot=boot, overwrite_published=overwrite_published, **perm)
 
     # --- Explanation of Metrics ---
     print("\n=== 指标解释 (Metric Explanations) ===")
@@ -134,4 +183,26 @@ def main():
     print("   - 6个维度的平均分(1-21分)。分数越高代表感觉任务越累/越难。")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Repeated-measures statistics on combined_analysis.csv")
+    parser.add_argument("--tables-dir", nargs="?", const=CHI_TABLES_DIR, default=None,
+                        help=f"also write friedman_ABCD / paired_t_tests / paired_wilcoxon_tests "
+                             f"(default dir: {CHI_TABLES_DIR}; off unless given)")
+    parser.add_argument("--overwrite-published", action="store_true",
+                        help=f"allow --tables-dir {PUBLISHED_TABLES_DIR} (replaces the published tables)")
+    parser.add_argument("--permutation", choices=["exact", "mc", "auto"], default=None,
+                        help="add permutation p-values (exact enumeration / Monte-Carlo)")
+    parser.add_argument("--n-resamples", type=int, default=100_000, help="Monte-Carlo relabelings")
+    parser.add_argument("--bootstrap", type=int, default=0, metavar="B",
+                        help="cluster-bootstrap B resamples for CIs of Kendall's W / dz / RBC (0 = off)")
+    parser.add_argument("--ci-method", choices=["bca", "percentile"], default="bca")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for the permutation tests / bootstrap")
+    args = parser.parse_args()
+    if args.tables_dir:
+        try:
+            check_tables_dir(args.tables_dir, args.overwrite_published)
+        except ValueError as e:
+            parser.error(str(e))
+    main(tables_dir=args.tables_dir, overwrite_published=args.overwrite_published, permutation=args.permutation, n_resamples=args.n_resamples,
+         seed=args.seed, jobs=args.jobs, n_boot=args.bootstrap, ci_method=args.ci_method)
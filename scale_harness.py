@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# 规模测试：为每个被试数生成一份合成 data/（synthetic_cohort.py），在其中依次运行
+# process_data.py -> run_statistics.py -> visualize_results.py（子进程，cwd 为该目录），
+# 记录每个阶段的 wall / CPU 时间和峰值 RSS，写入 JSON。
+# CPU 时间包含各阶段的 worker 进程；峰值 RSS 是单个进程（含 worker）的最大值。
+# Linux 上子进程的 ru_maxrss 从 fork 时父进程的峰值开始算（exec 也不清零），所以
+# 本进程不导入 numpy / pandas，合成数据也在子进程里生成：每个阶段继承的只是一个
+# 空解释器的峰值（报告里的 rss_floor_bytes），低于它的峰值分辨不出来。
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [6, 50, 200]
+SCALE_OUTPUT = "scale_report.json"
+ROUND_S = 60.0  # synthetic_cohort.ROUND_S (not imported: keeps this process lean)
+BIO_LAYOUTS = ("per_condition", "continuous", "mixed")  # synthetic_cohort.BIO_LAYOUTS
+
+
+def pipeline_stages(jobs):
+    return [
+        ("process_data", ["process_data.py", "--jobs", str(jobs)]),
+        ("run_statistics", ["run_statistics.py"]),
+        ("visualize_results", ["visualize_results.py", "--jobs", str(jobs)]),
+    ]
+
+
+def _maxrss_bytes(ru):
+    # ru_maxrss is in bytes on macOS, kilobytes on Linux
+    return int(ru.ru_maxrss) if sys.platform == "darwin" else int(ru.ru_maxrss) * 1024
+
+
+def rss_floor_bytes():
+    """This process's own peak RSS: what every stage's ru_maxrss starts from."""
+    return _maxrss_bytes(resource.getrusage(resource.RUSAGE_SELF)) if resource is not None else None
+
+
+def run_stage(args, cwd, log_path):
+    """Run one script of the repo in cwd; wall/CPU seconds and peak RSS from the child's rusage."""
+    with open(log_path, "w", encoding="utf-8") as log:
+        w0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable] + [os.path.join(REPO_DIR, args[0])] + args[1:],
+                                cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _, status, ru = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            cpu_s, rss = ru.ru_utime + ru.ru_stime, _maxrss_bytes(ru)
+        else:  # no per-child rusage (Windows)
+            proc.wait()
+            cpu_s = rss = None
+        wall = time.perf_counter() - w0
+    return {"wall_s": wall, "cpu_s": cpu_s, "peak_rss_bytes": rss, "rss_floor_bytes": rss_floor_bytes(),
+            "returncode": proc.returncode, "log": log_path}
+
+
+def _tree_bytes(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+def run_cohort(n_subjects, workdir, jobs=1, round_s=ROUND_S, bio_fs=1000, seed=0, keep=False, session_dirs=False,
+               bio_layout="mixed"):
+    root = os.path.join(workdir, f"cohort_{n_subjects}")
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(os.path.join(root, "logs"))
+
+    # generated in a child process, so numpy / pandas never inflate this process's peak RSS
+    gen_args = ["synthetic_cohort.py", root, "--subjects", str(n_subjects), "--round-seconds", str(round_s),
+                "--bio-fs", str(bio_fs), "--bio-layout", bio_layout, "--seed", str(seed), "--jobs", str(jobs)]
+    if session_dirs:
+        gen_args.append("--session-dirs")
+    gen = run_stage(gen_args, root, os.path.join(root, "logs", "generate.log"))
+    if gen["returncode"] != 0:
+        raise RuntimeError(f"synthetic cohort generation failed, see {gen['log']}")
+    data_dir = os.path.join(root, "data")
+    result = {
+        "n_subjects": n_subjects,
+        "generate_wall_s": gen["wall_s"],
+        "generate": gen,
+        "data_bytes": _tree_bytes(data_dir),
+        "stages": {},
+    }
+    print(f"[{n_subjects} subjects] data written in {result['generate_wall_s']:.1f} s "
+          f"({result['data_bytes'] / 2**20:.0f} MiB)")
+    for name, args in pipeline_stages(jobs):
+        stats = run_stage(args, root, os.path.join(root, "logs", f"{name}.log"))
+        result["stages"][name] = stats
+        rss = f"{stats['peak_rss_bytes'] / 2**20:8.0f} MiB" if stats["peak_rss_bytes"] is not None else "       -"
+        cpu = f"{stats['cpu_s']:8.1f} s" if stats["cpu_s"] is not None else "       -"
+        print(f"  {name:18s} wall {stats['wall_s']:8.1f} s  cpu {cpu}  rss {rss}"
+              + ("" if stats["returncode"] == 0 else f"  FAILED ({stats['returncode']}), see {stats['log']}"))
+        if stats["returncode"] != 0:
+            break
+    if not keep:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return result
+
+
+def main(sizes=DEFAULT_SIZES, jobs=1, round_s=ROUND_S, bio_fs=1000, seed=0, workdir=None, keep=False,
+         output=SCALE_OUTPUT, session_dirs=False, bio_layout="mixed"):
+    workdir = workdir or tempfile.mkdtemp(prefix="mist_scale_")
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "jobs": jobs,
+            "round_s": round_s,
+            "bio_fs": bio_fs,
+            "seed": seed,
+            "session_dirs": session_dirs,
+            "bio_layout": bio_layout,
+            "workdir": workdir,
+            "rss_floor_bytes": rss_floor_bytes(),
+        },
+        "cohorts": [run_cohort(n, workdir, jobs, round_s, bio_fs, seed, keep, session_dirs, bio_layout) for n in sizes],
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    print(f"Scale report saved to {output} (cohort trees under {workdir})")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline on synthetic cohorts of growing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of subjects")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for data generation and the pipeline stages (0 = all cores)")
+    parser.add_argument("--round-seconds", type=float, default=ROUND_S, help="length of each MIST round")
+    parser.add_argument("--bio-fs", type=int, default=1000, help="PhysioLAB sampling rate of the synthetic recordings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="where cohort trees are written (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the generated data/ trees")
+    parser.add_argument("--session-dirs", action="store_true",
+                        help="write MIST data as session containers instead of the legacy per-round CSVs")
+    parser.add_argument("--bio-layout", choices=BIO_LAYOUTS, default="mixed",
+                        help="PhysioLAB files per condition, one continuous recording per subject (epoched by "
+                             "MIST rounds), or alternating between subjects")
+    parser.add_argument("-o", "--output", default=SCALE_OUTPUT)
+    args = parser.parse_args()
+    main(args.sizes, args.jobs if args.jobs > 0 else (os.cpu_count() or 1), args.round_seconds, args.bio_fs,
+         args.seed, args.workdir, args.keep, args.output, args.session_dirs, args.bio_layout)
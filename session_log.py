@@ -0,0 +1,432 @@
+import os
+import csv
+import sys
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+
+# MIST 实验的 session 容器：每次测试一个目录 results/mist_session_{id}_{ts}/，
+#   events.jsonl   预写日志（write-ahead log）：每个事件（session 开始、轮次开始/结束、
+#                  每道题的结果、每轮的单词回忆）追加一行 JSON
+#   trials.csv     所有题目（列与原 mist_results 相同）
+#   recall.csv     所有轮次的单词回忆（列与原 mist_recall 相同，不再每轮一个文件）
+#   summary.csv    每轮汇总；timing.csv 计时精度记录（测试结束时写）
+#   manifest.json  被试、种子、配置、各轮开始/结束时间、已有的回忆轮次和文件列表，
+#                  最后原子替换写入，分析时直接打开，不用再按时间戳猜哪些文件属于同一次测试
+# - append() 只把记录放进队列，不碰磁盘；后台线程把队列里积攒的记录一次写入，
+#   每批 fsync 一次，所以 Tk 事件循环不会被磁盘阻塞。
+# - submit(fn) 让 CSV / manifest 等文件操作也在写线程里执行（排在之前的记录之后）。
+# - replay() 读回日志（忽略崩溃时写了一半的最后一行），得到已完成的题目、回忆、
+#   轮次时间和自适应难度状态，用来续做（mist_test.py --resume）或重新生成容器
+#  （python session_log.py SESSION）。某一轮重新开始时，该轮之前记录的题目作废。
+# - 续做只从已完成的轮次继续（resume_point）：中断那一轮的题目不算，自适应难度
+#   取最后一个完成轮次结束时保存的状态；每次从题库取题都记一条 draw，续做时题库
+#   按这些记录前进，已经出过的题不会再出。
+# 旧版的单个 .jsonl 日志同样可以 replay / 转成容器；--flat 输出旧版的散装 CSV。
+LOG_DIR = "results"
+LOG_VERSION = 1
+SESSION_VERSION = 1
+SESSION_MANIFEST = "manifest.json"
+SESSION_EVENTS = "events.jsonl"
+SESSION_FILES = {
+    "trials": "trials.csv",
+    "recall": "recall.csv",
+    "summary": "summary.csv",
+    "timing": "timing.csv",
+    "events": SESSION_EVENTS,
+}
+
+RESULT_FIELDS = ["SubjectID", "Round", "QuestionIndex", "Expression", "CorrectAnswer", "UserAnswer", "IsCorrect",
+                 "TimeTaken", "Timeout", "Timestamp"]
+RECALL_FIELDS = ["SubjectID", "Round", "Word", "IsTarget", "Selected", "IsCorrectSelection"]
+SUMMARY_FIELDS = ["Round", "Arithmetic_Correct", "Arithmetic_Total", "Arithmetic_Accuracy", "Avg_Response_Time",
+                  "Word_Correct", "Word_FalseAlarm", "Word_Total_Targets"]
+TIMING_FIELDS = ["SubjectID", "Round", "QuestionIndex", "Kind", "Due_s", "At_s", "Late_ms"]
+
+
+def session_dir_path(subject_id, ts=None, log_dir=LOG_DIR):
+    return os.path.join(log_dir, f"mist_session_{subject_id}_{int(time.time() if ts is None else ts)}")
+
+
+def events_path(path):
+    """The event log of a session container, or path itself for a legacy .jsonl log."""
+    return os.path.join(path, SESSION_EVENTS) if os.path.isdir(path) else path
+
+
+def container_for(path):
+    """Session directory of a container or of its event log (a legacy log.jsonl maps to log/)."""
+    if os.path.isdir(path):
+        return path
+    if os.path.basename(path) == SESSION_EVENTS:
+        return os.path.dirname(path)
+    return os.path.splitext(path)[0]
+
+
+class SessionLog:
+    """Append-only JSONL log written by a background thread."""
+
+    _STOP = object()
+
+    def __init__(self, path, seq=0):
+        self.path = path
+        self.seq = seq
+        self.queue = queue.Queue()
+        self.error = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        drop_torn_tail(path)
+        self.file = open(path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, kind, **payload):
+        """Queue one record; returns immediately."""
+        self.seq += 1
+        self.queue.put({"seq": self.seq, "t": time.time(), "kind": kind, **payload})
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on the writer thread, after every record queued so far is on disk."""
+        self.queue.put((fn, args, kwargs))
+
+    def close(self):
+        """Write out everything queued and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(self._STOP)
+            self.thread.join()
+        if not self.file.closed:
+            self.file.close()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self.queue.get()]
+            while True:  # everything that queued up meanwhile goes into the same batch / fsync
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines, jobs = [], []
+            for item in batch:
+                if item is self._STOP:
+                    stop = True
+                elif isinstance(item, tuple):
+                    jobs.append(item)
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+            try:
+                if lines:
+                    self.file.write("".join(lines))
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+            except OSError as e:
+                self.error = e
+                print(f"Session log write failed ({self.path}): {e}", file=sys.stderr)
+            for fn, args, kwargs in jobs:
+                try:
+                    fn(*args, **kwargs)
+                except Exception as e:
+                    self.error = e
+                    print(f"Session log job {getattr(fn, '__name__', fn)} failed: {e}", file=sys.stderr)
+
+
+def drop_torn_tail(path):
+    """
+    Cut a log back to its last complete line. A crash mid-write leaves a
+    fragment without "\n"; appending to it (on resume) would glue the next
+    record onto it and leave an unreadable line in the middle of the log.
+    """
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        return 0
+    with f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return 0
+        keep = data.rfind(b"\n") + 1
+        f.truncate(keep)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data) - keep
+
+
+def read_records(path):
+    """Records of a log in order; a torn last line (crash mid-write) is skipped."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    for i, line in enumerate(lines):
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if i < len(lines) - 2:
+                raise
+    return records
+
+
+def replay(path):
+    """
+    Session state from a log: subject, seed, config, results, recall rows and
+    stats per round, round start/end times, the last adaptive state, the
+    rounds completed and whether the session finished.
+    """
+    state = {
+        "path": path,
+        "subject_id": None,
+        "seed": None,
+        "config": {},
+        "results": [],
+        "recall": {},        # round -> {"rows": [...], "stats": {...}, "t": time}
+        "round_start_times": {},
+        "round_end_times": {},
+        "adaptive": None,
+        "session_adaptive": None,
+        "adaptive_by_round": {},  # round -> adaptive state logged when it ended
+        "draws": [],              # difficulty level of every question taken from the bank, in order
+        "resumes": 0,
+        "completed_rounds": [],
+        "finished": False,
+        "last_seq": 0,
+        "first_t": None,
+        "last_t": None,
+    }
+    for rec in read_records(events_path(path)):
+        kind = rec.get("kind")
+        state["last_seq"] = max(state["last_seq"], rec.get("seq", 0))
+        state["last_t"] = rec.get("t", state["last_t"])
+        if state["first_t"] is None:
+            state["first_t"] = state["last_t"]
+        if kind == "session_start":
+            state["subject_id"] = rec["subject_id"]
+            state["seed"] = rec.get("seed")
+            state["config"] = rec.get("config", {})
+            state["adaptive"] = rec.get("adaptive", state["adaptive"])
+            state["session_adaptive"] = rec.get("adaptive")
+        elif kind == "round_start":
+            r = rec["round"]
+            # a restarted round replaces what was logged for it before
+            state["results"] = [x for x in state["results"] if x["Round"] != r]
+            state["recall"].pop(r, None)
+            state["round_end_times"].pop(r, None)
+            state["adaptive_by_round"].pop(r, None)
+            state["completed_rounds"] = [x for x in state["completed_rounds"] if x != r]
+            state["round_start_times"][r] = rec["time"]
+        elif kind == "trial":
+            state["results"].append(rec["result"])
+            state["adaptive"] = rec.get("adaptive", state["adaptive"])
+        elif kind == "round_end":
+            state["round_end_times"][rec["round"]] = rec["time"]
+            state["adaptive"] = rec.get("adaptive", state["adaptive"])
+            state["adaptive_by_round"][rec["round"]] = rec.get("adaptive")
+            if rec["round"] == 0:
+                state["completed_rounds"].append(0)
+        elif kind == "recall":
+            state["recall"][rec["round"]] = {"rows": rec["rows"], "stats": rec["stats"], "t": rec["t"]}
+            state["completed_rounds"].append(rec["round"])
+        elif kind == "draw":
+            state["draws"].append(rec["level"])
+        elif kind == "resume":
+            state["resumes"] += 1
+        elif kind == "session_end":
+            state["finished"] = True
+    return state
+
+
+def resume_point(state):
+    """
+    Where a replay()ed session continues: the first round not completed, with
+    only the completed rounds' trials, recall stats and times, and the adaptive
+    state logged when the last completed round ended (a cut-off round's trials
+    no longer count, so they must not set the difficulty either).
+    """
+    done = sorted(set(state["completed_rounds"]))
+    return {
+        "round": done[-1] + 1 if done else 0,
+        "results": [x for x in state["results"] if x["Round"] in done],
+        "recall_stats": [rec["stats"] for r, rec in sorted(state["recall"].items()) if r in done],
+        "round_start_times": {r: t for r, t in state["round_start_times"].items() if r in done},
+        "round_end_times": {r: t for r, t in state["round_end_times"].items() if r in done},
+        "adaptive": state["adaptive_by_round"].get(done[-1]) if done else state["session_adaptive"],
+    }
+
+
+def write_results_csv(path, results):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def write_csv(path, header, rows):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def write_recall_csv(path, rows):
+    write_csv(path, RECALL_FIELDS, rows)
+
+
+def write_summary_csv(path, results, recall_stats, total_rounds):
+    with open(path, mode='w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_FIELDS)
+
+        for r in range(1, total_rounds + 1):
+            # Arithmetic Stats
+            round_res = [x for x in results if x['Round'] == r]
+            r_correct = sum(1 for x in round_res if x['IsCorrect'])
+            r_total = len(round_res)
+            r_acc = (r_correct / r_total * 100) if r_total > 0 else 0
+            avg_time = sum(x['TimeTaken'] for x in round_res) / r_total if r_total > 0 else 0
+
+            # Word Recall Stats
+            recall = next((s for s in recall_stats if s['round'] == r), None)
+            if recall:
+                w_correct = recall['correct_selections']
+                w_false = recall['false_alarms']
+                w_total = recall['total_targets']
+            else:
+                w_correct = 0
+                w_false = 0
+                w_total = 0
+
+            writer.writerow([r, r_correct, r_total, f"{r_acc:.1f}%", f"{avg_time:.3f}", w_correct, w_false, w_total])
+
+
+def _replace_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=1, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def write_session(session_dir, state):
+    """
+    Write trials / recall / summary CSVs of a replay() state into session_dir,
+    then its manifest.json (last, atomically). Returns the manifest.
+    """
+    os.makedirs(session_dir, exist_ok=True)
+    config = state["config"]
+    recall = sorted(state["recall"].items())
+    write_results_csv(os.path.join(session_dir, SESSION_FILES["trials"]), state["results"])
+    write_recall_csv(os.path.join(session_dir, SESSION_FILES["recall"]), [row for _, rec in recall for row in rec["rows"]])
+    write_summary_csv(os.path.join(session_dir, SESSION_FILES["summary"]), state["results"],
+                      [rec["stats"] for _, rec in recall], config.get("TOTAL_ROUNDS", 4))
+    rounds = sorted(set(state["round_start_times"]) | set(state["round_end_times"]))
+    manifest = {
+        "version": SESSION_VERSION,
+        "subject_id": state["subject_id"],
+        "seed": state["seed"],
+        "config": config,
+        "started": state["first_t"],
+        "updated": state["last_t"],
+        "finished": state["finished"],
+        "n_trials": len(state["results"]),
+        "round_times": {str(r): {"start": state["round_start_times"].get(r), "end": state["round_end_times"].get(r)}
+                        for r in rounds},
+        "completed_rounds": sorted(set(state["completed_rounds"])),
+        "recall_rounds": [r for r, _ in recall],
+        "files": {k: name for k, name in SESSION_FILES.items() if os.path.exists(os.path.join(session_dir, name))},
+    }
+    _replace_json(os.path.join(session_dir, SESSION_MANIFEST), manifest)
+    return manifest
+
+
+def snapshot_session(session_dir, log_path=None):
+    """Rebuild a session container from its event log (default: session_dir/events.jsonl)."""
+    state = replay(log_path or os.path.join(session_dir, SESSION_EVENTS))
+    return write_session(session_dir, state)
+
+
+def read_session_manifest(session_dir):
+    """manifest.json of a session container, or None if it has none (yet)."""
+    try:
+        with open(os.path.join(session_dir, SESSION_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_csvs(path, out_dir=LOG_DIR):
+    """
+    Legacy flat mist_results / mist_recall (one per round) / mist_summary CSVs
+    from a log, named with the logged times. Returns the written paths.
+    """
+    state = replay(path)
+    sid = state["subject_id"]
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    ts = 0
+    for r, rec in sorted(state["recall"].items()):
+        # one file per round, named by when it was submitted (never reusing a name)
+        ts = max(int(rec["t"]), ts + 1)
+        out = os.path.join(out_dir, f"mist_recall_{sid}_{ts}.csv")
+        write_recall_csv(out, rec["rows"])
+        written.append(out)
+    ts = max(int(state["last_t"] or time.time()), ts)
+    out = os.path.join(out_dir, f"mist_results_{sid}_{ts}.csv")
+    write_results_csv(out, state["results"])
+    written.append(out)
+    out = os.path.join(out_dir, f"mist_summary_{sid}_{ts}.csv")
+    stats = [rec["stats"] for _, rec in sorted(state["recall"].items())]
+    write_summary_csv(out, state["results"], stats, state["config"].get("TOTAL_ROUNDS", 4))
+    written.append(out)
+    return written
+
+
+def check_torn_resume():
+    """Resuming a log whose last write was torn must leave it replayable (used by --check)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, SESSION_EVENTS)
+        log = SessionLog(path)
+        log.append("session_start", version=LOG_VERSION, subject_id="0", seed=1, config={}, adaptive=None)
+        log.append("round_start", round=0, time=0.0)
+        log.close()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"seq": 3, "kind": "tri')  # crash mid-write
+        st = replay(path)
+        log = SessionLog(path, seq=st["last_seq"])
+        log.append("resume", round=0)
+        log.close()
+        st = replay(path)
+        assert st["last_seq"] == 3 and st["round_start_times"] == {0: 0.0}, st
+        log = SessionLog(path, seq=st["last_seq"])  # and once more, as a second --resume would
+        log.append("resume", round=0)
+        log.close()
+        assert replay(path)["last_seq"] == 4
+    print("torn-write resume check passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild a MIST session container (or the legacy CSVs) from its log")
+    parser.add_argument("session", nargs="?",
+                        help="results/mist_session_{id}_{ts}/ (or a legacy mist_session_*.jsonl log)")
+    parser.add_argument("--flat", action="store_true",
+                        help="write the legacy mist_results / mist_recall / mist_summary CSVs instead")
+    parser.add_argument("-o", "--output-dir", default=LOG_DIR, help="output directory of --flat")
+    parser.add_argument("--check", action="store_true",
+                        help="run the torn-write resume check instead (no session needed)")
+    args = parser.parse_args()
+    if args.check:
+        check_torn_resume()
+        sys.exit()
+    if args.session is None:
+        parser.error("session is required")
+    st = replay(args.session)
+    print(f"Subject {st['subject_id']}: {len(st['results'])} trials, recall rounds {sorted(st['recall'])}, "
+          f"{'finished' if st['finished'] else 'not finished'}")
+    if args.flat:
+        for p in export_csvs(args.session, args.output_dir):
+            print(f"Saved {p}")
+    else:
+        out = container_for(args.session)
+        write_session(out, st)
+        print(f"Saved {out}")
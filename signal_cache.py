@@ -0,0 +1,199 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+from signal_io import read_physiolab, read_force_sensor
+from profiling import span, file_attrs
+
+# 解析后的信号缓存：每个源文件 -> 一个目录（header.json + 每通道一个 .npy）
+# 后续运行用 np.load(mmap_mode='r') 零拷贝映射，源文件 mtime/size 变化时自动失效。
+SIGNAL_CACHE_DIR = os.path.join("data", ".signal_cache")
+SIGNAL_CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_FORMAT_VERSION = 1
+HEADER_NAME = "header.json"
+
+
+def source_fingerprint(file_path):
+    st = os.stat(file_path)
+    key = f"{st.st_size}:{st.st_mtime_ns}"
+    return {
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "source_hash": hashlib.sha1(key.encode("utf-8")).hexdigest(),
+    }
+
+
+def _bundle_dir(file_path, kind, cache_dir):
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{kind}_{key}")
+
+
+def _read_header(bundle):
+    try:
+        with open(os.path.join(bundle, HEADER_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _bundle_bytes(bundle):
+    total = 0
+    for name in os.listdir(bundle):
+        try:
+            total += os.path.getsize(os.path.join(bundle, name))
+        except OSError:
+            pass
+    return total
+
+
+def _touch(bundle):
+    # LRU 以 header.json 的 mtime 作为最近访问时间（不依赖 atime / noatime 挂载）
+    try:
+        os.utime(os.path.join(bundle, HEADER_NAME))
+    except OSError:
+        pass
+
+
+def _write_bundle(bundle, kind, file_path, data, fingerprint):
+    cache_dir = os.path.dirname(bundle)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp_", dir=cache_dir)
+    try:
+        channels = {}
+        meta = {}
+        for name, value in data.items():
+            if isinstance(value, np.ndarray):
+                fname = f"{len(channels):02d}.npy"
+                np.save(os.path.join(tmp, fname), np.ascontiguousarray(value))
+                channels[name] = {"file": fname, "dtype": str(value.dtype), "n": int(value.shape[0])}
+            elif isinstance(value, pd.Timestamp) or value is pd.NaT:
+                meta[name] = None if pd.isna(value) else value.isoformat()
+            else:
+                meta[name] = value
+        header = {
+            "version": CACHE_FORMAT_VERSION,
+            "kind": kind,
+            "source": os.path.abspath(file_path),
+            **fingerprint,
+            "channels": channels,
+            "fs": meta.pop("fs", None),
+            "start_time": meta.pop("start_time", None),
+            "meta": meta,
+        }
+        with open(os.path.join(tmp, HEADER_NAME), "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False, indent=1)
+
+        if os.path.exists(bundle):
+            shutil.rmtree(bundle, ignore_errors=True)
+        try:
+            os.rename(tmp, bundle)
+        except OSError:
+            # 另一个进程已抢先写入同一 bundle，直接用它的
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _map_bundle(bundle, header):
+    out = {}
+    for name, info in header["channels"].items():
+        out[name] = np.load(os.path.join(bundle, info["file"]), mmap_mode="r")
+    out["fs"] = header.get("fs")
+    st = header.get("start_time")
+    out["start_time"] = pd.Timestamp(st) if st else pd.NaT
+    out.update(header.get("meta") or {})
+    return out
+
+
+def evict_signal_cache(cache_dir=SIGNAL_CACHE_DIR, max_bytes=SIGNAL_CACHE_MAX_BYTES, keep=()):
+    """
+    Size-bounded LRU eviction: remove least recently used bundles until the
+    cache directory is at most `max_bytes`. Bundles listed in `keep` are never
+    removed. Returns the number of bundles evicted.
+    """
+    if not os.path.isdir(cache_dir):
+        return 0
+    bundles = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not os.path.isdir(path) or name.startswith(".tmp_"):
+            continue
+        try:
+            last_used = os.path.getmtime(os.path.join(path, HEADER_NAME))
+        except OSError:
+            last_used = 0.0
+        bundles.append((last_used, path, _bundle_bytes(path)))
+
+    total = sum(b[2] for b in bundles)
+    keep = {os.path.abspath(k) for k in keep}
+    evicted = 0
+    for last_used, path, size in sorted(bundles):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) in keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def load_cached_signals(file_path, kind, loader, cache_dir=SIGNAL_CACHE_DIR, max_bytes=SIGNAL_CACHE_MAX_BYTES):
+    """
+    Return loader(file_path), served from the memmap cache when the cached
+    bundle matches the source file's size/mtime. Arrays come back as read-only
+    np.memmap views; scalars (fs, start_time, ...) from the JSON header.
+    With cache_dir=None the loader is called directly.
+    """
+    with span(f"load.{kind}", **file_attrs(file_path)) as sp:
+        if cache_dir is None:
+            sp.set(cache="off")
+            with span(f"parse.{kind}"):
+                return loader(file_path)
+        return _load_cached_signals(file_path, kind, loader, cache_dir, max_bytes, sp)
+
+
+def _load_cached_signals(file_path, kind, loader, cache_dir, max_bytes, sp):
+    fingerprint = source_fingerprint(file_path)
+    bundle = _bundle_dir(file_path, kind, cache_dir)
+    header = _read_header(bundle)
+    if (
+        header is not None
+        and header.get("version") == CACHE_FORMAT_VERSION
+        and header.get("kind") == kind
+        and header.get("source_hash") == fingerprint["source_hash"]
+    ):
+        try:
+            out = _map_bundle(bundle, header)
+            _touch(bundle)
+            sp.set(cache="hit")
+            return out
+        except (OSError, ValueError):
+            pass  # 损坏的 bundle：重新生成
+
+    sp.set(cache="miss")
+    with span(f"parse.{kind}"):
+        data = loader(file_path)
+    try:
+        with span("signal_cache.write"):
+            _write_bundle(bundle, kind, file_path, data, fingerprint)
+            evict_signal_cache(cache_dir, max_bytes, keep=[bundle])
+        header = _read_header(bundle)
+        if header is not None and header.get("source_hash") == fingerprint["source_hash"]:
+            return _map_bundle(bundle, header)
+    except OSError as e:
+        print(f"Signal cache unavailable for {file_path}: {e}")
+    return data
+
+
+def load_physiolab(file_path, cache_dir=SIGNAL_CACHE_DIR):
+    return load_cached_signals(file_path, "physiolab", read_physiolab, cache_dir=cache_dir)
+
+
+def load_force_sensor(file_path, cache_dir=SIGNAL_CACHE_DIR):
+    return load_cached_signals(file_path, "force", read_force_sensor, cache_dir=cache_dir)
@@ -0,0 +1,227 @@
+import re
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pandas C parser only
+    pa = None
+
+# PhysioLAB Pro exports (data/bio_data/*.csv):
+# ID,StorageTime,PhysioLAB Pro1(00:07:80:8C:AE:23)|CH1-BVP,...|CH2-EDA,...|CH3-RESP
+# 2025/12/05 11:53:09.993 形式的时间戳，采样率 1000Hz
+PHYSIOLAB_FS = 1000
+PHYSIOLAB_TIME_COL = "StorageTime"
+PHYSIOLAB_TIME_FORMAT = "%Y/%m/%d %H:%M:%S.%f"
+PHYSIOLAB_CHANNELS = ("BVP", "EDA", "RESP")
+PHYSIOLAB_CHUNK_ROWS = 100_000
+# pyarrow's streaming CSV reader parses about twice as fast as pandas' C parser;
+# block size in bytes (~ 60 bytes per row)
+PHYSIOLAB_BLOCK_BYTES = 60 * PHYSIOLAB_CHUNK_ROWS
+
+_CHANNEL_RE = re.compile(r"\|CH\d+-(BVP|EDA|RESP)$")
+
+
+def read_physiolab_header(file_path):
+    """
+    Return (columns, channels) where channels maps 'BVP'/'EDA'/'RESP' to the
+    full column name in the export. Only the header line is read.
+    """
+    with open(file_path, encoding="utf-8-sig") as f:
+        columns = f.readline().rstrip("\r\n").split(",")
+    channels = {}
+    for col in columns:
+        m = _CHANNEL_RE.search(col)
+        if m and m.group(1) not in channels:
+            channels[m.group(1)] = col
+    return columns, channels
+
+
+def _count_data_rows(file_path, block_size=1 << 20):
+    # Count newlines in binary blocks so the output arrays can be allocated once.
+    n_lines = 0
+    last = b"\n"
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            n_lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        n_lines += 1
+    return max(n_lines - 1, 0)  # minus header
+
+
+def _chunk_dict(times, columns):
+    t = pd.to_datetime(times, format=PHYSIOLAB_TIME_FORMAT, errors="coerce")
+    out = {"time_ns": np.asarray(t.to_numpy(dtype="datetime64[ns]")).view(np.int64)}
+    for ch, values in columns.items():
+        out[ch] = np.ascontiguousarray(values, dtype=np.float32)
+    return out
+
+
+def _iter_chunks_arrow(file_path, channels, block_bytes=PHYSIOLAB_BLOCK_BYTES):
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(block_size=block_bytes),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=[PHYSIOLAB_TIME_COL] + [channels[ch] for ch in PHYSIOLAB_CHANNELS],
+            column_types={PHYSIOLAB_TIME_COL: pa.string(), **{channels[ch]: pa.float32() for ch in PHYSIOLAB_CHANNELS}},
+        ),
+    )
+    for batch in reader:
+        if batch.num_rows:
+            yield _chunk_dict(
+                batch.column(PHYSIOLAB_TIME_COL).to_numpy(zero_copy_only=False),
+                {ch: batch.column(channels[ch]).to_numpy(zero_copy_only=False) for ch in PHYSIOLAB_CHANNELS},
+            )
+
+
+def iter_physiolab_chunks(file_path, chunk_rows=PHYSIOLAB_CHUNK_ROWS, engine=None):
+    """
+    Yield the recording in chunks of roughly `chunk_rows` samples.
+
+    Only StorageTime and the |CH*-BVP/EDA/RESP columns are parsed (the ID column
+    is never materialised). Each chunk is a dict:
+    - 'time_ns': int64 epoch nanoseconds (NaT -> np.iinfo(int64).min)
+    - 'BVP'/'EDA'/'RESP': contiguous float32 arrays (missing cells -> NaN)
+    engine: 'pyarrow' (default when installed; raises pyarrow.ArrowInvalid on
+    a row with the wrong number of fields or a non-numeric cell) or 'c' (pandas).
+    """
+    _, channels = read_physiolab_header(file_path)
+    missing = [ch for ch in PHYSIOLAB_CHANNELS if ch not in channels]
+    if missing:
+        raise KeyError(f"PhysioLAB channels not found: {missing}")
+
+    if (engine or ("pyarrow" if pa is not None else "c")) == "pyarrow":
+        yield from _iter_chunks_arrow(file_path, channels, block_bytes=60 * chunk_rows)
+        return
+
+    usecols = [PHYSIOLAB_TIME_COL] + [channels[ch] for ch in PHYSIOLAB_CHANNELS]
+    dtype = {channels[ch]: np.float32 for ch in PHYSIOLAB_CHANNELS}
+    dtype[PHYSIOLAB_TIME_COL] = str
+
+    reader = pd.read_csv(
+        file_path,
+        usecols=usecols,
+        dtype=dtype,
+        chunksize=chunk_rows,
+        encoding="utf-8-sig",
+    )
+    for chunk in reader:
+        yield _chunk_dict(chunk[PHYSIOLAB_TIME_COL],
+                          {ch: chunk[channels[ch]].to_numpy(dtype=np.float32) for ch in PHYSIOLAB_CHANNELS})
+
+
+def _estimate_fs(t, default=PHYSIOLAB_FS):
+    dt = np.diff(t[np.isfinite(t)])
+    dt = dt[dt > 0]
+    if dt.size == 0:
+        return default
+    return int(round(1.0 / np.median(dt)))
+
+
+def read_physiolab(file_path, chunk_rows=PHYSIOLAB_CHUNK_ROWS):
+    """
+    Load a PhysioLAB recording into preallocated arrays, chunk by chunk, so the
+    parse overhead (strings, pandas blocks) is bounded by `chunk_rows` and the
+    only file-sized allocations are the float32 channel arrays themselves.
+
+    Returns a dict:
+    - 'fs': sampling rate estimated from StorageTime (fallback PHYSIOLAB_FS)
+    - 'start_time': pd.Timestamp of the first valid sample (NaT if none)
+    - 't': float64 seconds relative to start_time (NaN where StorageTime is unparsable)
+    - 'BVP'/'EDA'/'RESP': contiguous float32 arrays
+    """
+    n_alloc = _count_data_rows(file_path)
+    time_ns = np.empty(n_alloc, dtype=np.int64)
+    signals = {ch: np.empty(n_alloc, dtype=np.float32) for ch in PHYSIOLAB_CHANNELS}
+
+    def fill(engine):
+        nonlocal n_alloc, time_ns, signals
+        n = 0
+        for chunk in iter_physiolab_chunks(file_path, chunk_rows=chunk_rows, engine=engine):
+            m = len(chunk["time_ns"])
+            if n + m > n_alloc:
+                # Should not happen (rows <= newlines), but never write out of bounds.
+                n_alloc = n + m
+                time_ns = np.resize(time_ns, n_alloc)
+                signals = {ch: np.resize(a, n_alloc) for ch, a in signals.items()}
+            time_ns[n:n + m] = chunk["time_ns"]
+            for ch in PHYSIOLAB_CHANNELS:
+                signals[ch][n:n + m] = chunk[ch]
+            n += m
+        return n
+
+    if pa is None:
+        n = fill("c")
+    else:
+        try:
+            n = fill("pyarrow")
+        except pa.ArrowInvalid:
+            n = fill("c")  # e.g. truncated rows: start over with the reader that pads them with NaN
+
+    # Blank lines are skipped by the parser, so trim to what was actually read.
+    time_ns = time_ns[:n]
+    signals = {ch: a[:n] for ch, a in signals.items()}
+
+    valid = time_ns != np.iinfo(np.int64).min
+    if valid.any():
+        start_ns = int(time_ns[valid][0])
+        t = np.where(valid, (time_ns - start_ns) / 1e9, np.nan)
+        start_time = pd.Timestamp(start_ns)
+    else:
+        t = np.full(n, np.nan)
+        start_time = pd.NaT
+
+    return {
+        "fs": _estimate_fs(t),
+        "start_time": start_time,
+        "t": t,
+        **signals,
+    }
+
+
+# Force sensor exports (data/force_sensor/*.csv):
+# timestamp,Thumb_M1_IPS1610_Fx,...,Index_M2_DPS1813_Fz
+# 采样间隔不固定（约 10-20ms），部分行被截断（缺列）
+FORCE_TIME_COL = "timestamp"
+
+
+def read_force_sensor(file_path, columns=None):
+    """
+    Load a force sensor export into float64 arrays keyed by column name.
+
+    Non-numeric / missing cells become NaN (truncated rows are common); callers
+    decide how to fill them. Also returns 'fs' (estimated), 'start_time' and 't'
+    (float64 seconds relative to start_time), like read_physiolab().
+    """
+    header = pd.read_csv(file_path, nrows=0, encoding="utf-8-sig").columns.tolist()
+    if columns is None:
+        columns = [c for c in header if c != FORCE_TIME_COL]
+    usecols = ([FORCE_TIME_COL] if FORCE_TIME_COL in header else []) + [c for c in columns if c in header]
+    df = pd.read_csv(file_path, usecols=usecols, encoding="utf-8-sig")
+
+    out = {}
+    if FORCE_TIME_COL in df.columns:
+        ts = pd.to_datetime(df[FORCE_TIME_COL], errors="coerce", format="ISO8601")
+        time_ns = ts.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        valid = time_ns != np.iinfo(np.int64).min
+    else:
+        valid = np.zeros(len(df), dtype=bool)
+    if valid.any():
+        start_ns = int(time_ns[valid][0])
+        out["start_time"] = pd.Timestamp(start_ns)
+        out["t"] = np.where(valid, (time_ns - start_ns) / 1e9, np.nan)
+    else:
+        out["start_time"] = pd.NaT
+        out["t"] = np.full(len(df), np.nan)
+    out["fs"] = _estimate_fs(out["t"], default=0)
+
+    for c in usecols:
+        if c == FORCE_TIME_COL:
+            continue
+        out[c] = np.ascontiguousarray(pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=np.float64))
+    return out
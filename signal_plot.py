@@ -0,0 +1,257 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from process_data import (
+    load_subject_order, find_mist_file, find_bio_file, find_bio_recordings, find_bio_recording_for_window,
+    find_force_file, force_total_magnitude,
+)
+from signal_cache import load_physiolab, load_force_sensor
+from epochs import question_onsets, round_windows, recording_time_base
+
+# 原始信号（1 kHz BVP/EDA/RESP、力传感器）的降采样绘图。
+# 每条记录建一个 min/max 金字塔：第 1 层每 PYRAMID_BASE 个采样取一对 (min, max)，
+# 之后每层再合并 PYRAMID_FACTOR 块。画某个时间范围时选最粗但仍有
+# >= 屏幕像素数个块的那一层，再把该范围内的块就地合并到不超过像素数，所以每次
+# 最多画 2 x 像素数个点，峰值不会丢失（和逐像素 min/max 一样）。图上标出 MIST 轮次范围（条件）和每题出现时刻。
+PYRAMID_BASE = 16
+PYRAMID_FACTOR = 4
+DEFAULT_WIDTH_PX = 1600
+SIGNAL_PLOT_DIR = os.path.join("plots", "signals")
+
+BIO_CHANNELS = ("BVP", "EDA", "RESP")
+CHANNEL_LABELS = {
+    "BVP": "BVP",
+    "EDA": "EDA [uS]",
+    "RESP": "RESP",
+    "Force": "Total force [N]",
+}
+
+
+def _block_reduce(lo, hi, size):
+    """Per-block (min, max) of consecutive `size`-sample blocks; the tail block is NaN-padded."""
+    n_blocks = -(-len(lo) // size)
+    pad = n_blocks * size - len(lo)
+    if pad:
+        lo = np.concatenate([lo, np.full(pad, np.nan, dtype=lo.dtype)])
+        hi = np.concatenate([hi, np.full(pad, np.nan, dtype=hi.dtype)])
+    # fmin/fmax skip NaNs; an all-NaN block stays NaN
+    return (np.fmin.reduce(lo.reshape(n_blocks, size), axis=1),
+            np.fmax.reduce(hi.reshape(n_blocks, size), axis=1))
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max envelope of one signal on time base t (seconds).
+    levels[j] = (block size in samples, mins, maxs); level 0 is the raw signal.
+    """
+
+    def __init__(self, x, t, base=PYRAMID_BASE, factor=PYRAMID_FACTOR):
+        self.x = np.asarray(x)
+        self.t = np.asarray(t, dtype=np.float64)
+        self.levels = [(1, self.x, self.x)]
+        size, step, lo, hi = 1, base, self.x, self.x
+        while len(lo) >= 2 * step:
+            lo, hi = _block_reduce(lo, hi, step)
+            size *= step
+            self.levels.append((size, lo, hi))
+            step = factor
+
+    @property
+    def nbytes(self):
+        return sum(lo.nbytes + hi.nbytes for size, lo, hi in self.levels[1:])
+
+    def envelope(self, t0=None, t1=None, width_px=DEFAULT_WIDTH_PX):
+        """
+        (t, y) polyline of the samples in [t0, t1) with at most 2 * width_px
+        points: raw samples when they fit, otherwise at most width_px min/max
+        pairs (blocks of the chosen level, merged further when there are more).
+        """
+        n = len(self.x)
+        i0 = 0 if t0 is None else int(np.searchsorted(self.t, t0, side="left"))
+        i1 = n if t1 is None else int(np.searchsorted(self.t, t1, side="left"))
+        if i1 <= i0:
+            return np.empty(0), np.empty(0)
+        span = i1 - i0
+        if span <= 2 * width_px:
+            return self.t[i0:i1], np.asarray(self.x[i0:i1], dtype=np.float64)
+        size, lo, hi = self.levels[0]
+        for level in self.levels[1:]:
+            if span // level[0] < width_px:
+                break
+            size, lo, hi = level
+
+        b0, b1 = i0 // size, -(-i1 // size)
+        lo, hi = lo[b0:b1], hi[b0:b1]
+        merge = -(-(b1 - b0) // width_px)
+        if merge > 1:
+            lo, hi = _block_reduce(lo, hi, merge)
+        size *= merge
+        centre = np.minimum(b0 * (size // merge) + np.arange(len(lo)) * size + size // 2, n - 1)
+        t = np.repeat(self.t[centre], 2)
+        y = np.empty(2 * len(lo))
+        y[0::2] = lo
+        y[1::2] = hi
+        return t, y
+
+
+def _plot_time_base(rec):
+    """Monotonic seconds since rec['start_time'] (force exports have no fixed rate and some bad rows)."""
+    if rec.get("fs"):
+        return recording_time_base(rec)
+    t = np.asarray(rec["t"], dtype=np.float64)
+    return np.fmax.accumulate(np.where(np.isfinite(t), t, -np.inf))
+
+
+class SignalTrace:
+    """One channel of a recording with its pyramid, placed on absolute time via start_time."""
+
+    def __init__(self, name, x, t, start_time, source=None):
+        self.name = name
+        self.start_time = pd.Timestamp(start_time)
+        self.source = source
+        self.pyramid = MinMaxPyramid(x, t)
+
+    def envelope(self, ref_time, t0=None, t1=None, width_px=DEFAULT_WIDTH_PX):
+        """Envelope with times (and the t0/t1 range) in seconds relative to ref_time."""
+        offset = (self.start_time - pd.Timestamp(ref_time)).total_seconds()
+        t, y = self.pyramid.envelope(None if t0 is None else t0 - offset,
+                                     None if t1 is None else t1 - offset, width_px)
+        return t + offset, y
+
+
+def bio_traces(path, channels=BIO_CHANNELS):
+    rec = load_physiolab(path)
+    t = recording_time_base(rec)
+    return [SignalTrace(ch, rec[ch], t, rec["start_time"], source=path) for ch in channels]
+
+
+def force_trace(path):
+    rec = load_force_sensor(path)
+    total = force_total_magnitude(rec)
+    if total is None or pd.isna(rec["start_time"]):
+        return None
+    return SignalTrace("Force", total, _plot_time_base(rec), rec["start_time"], source=path)
+
+
+def session_events(subject_id):
+    """
+    MIST annotations of a subject: ([(round, condition, start, end)], question
+    onset Timestamps), or ([], empty) without a mist_results file.
+    """
+    mist_file = find_mist_file(subject_id)
+    if not mist_file:
+        return [], pd.Series(dtype="datetime64[ns]")
+    mist_df = pd.read_csv(mist_file)
+    order = load_subject_order().get(subject_id)
+    rounds = [
+        (r, order[r - 1] if order and 1 <= r <= len(order) else None, start, end)
+        for r, (start, end) in round_windows(mist_df).items()
+    ]
+    onsets, _ = question_onsets(mist_df)
+    return rounds, onsets.dropna()
+
+
+def plot_traces(traces, ref_time, t0=None, t1=None, rounds=(), onsets=(), width_px=DEFAULT_WIDTH_PX,
+                title=None):
+    """
+    Stacked panels, one per trace, over [t0, t1) seconds from ref_time, with
+    round spans (shaded, labelled with the condition) and question onsets.
+    """
+    fig, axes = plt.subplots(len(traces), 1, figsize=(width_px / 100, 2.2 * len(traces) + 0.8),
+                             sharex=True, squeeze=False)
+    axes = axes[:, 0]
+    ref_time = pd.Timestamp(ref_time)
+    onset_s = np.array([(pd.Timestamp(o) - ref_time).total_seconds() for o in onsets])
+    if t0 is not None and t1 is not None and onset_s.size:
+        onset_s = onset_s[(onset_s >= t0) & (onset_s < t1)]
+
+    for ax, trace in zip(axes, traces):
+        t, y = trace.envelope(ref_time, t0, t1, width_px)
+        ax.plot(t, y, linewidth=0.6, color="tab:blue")
+        ax.set_ylabel(CHANNEL_LABELS.get(trace.name, trace.name))
+        for i, (r, cond, start, end) in enumerate(rounds):
+            s0 = (start - ref_time).total_seconds()
+            s1 = (end - ref_time).total_seconds()
+            ax.axvspan(s0, s1, color=f"C{i % 10}", alpha=0.08, linewidth=0)
+            if ax is axes[0]:
+                ax.text(s0, 1.01, f"R{r} ({cond})" if cond else f"R{r}", transform=ax.get_xaxis_transform(),
+                        fontsize=8, va="bottom")
+        if onset_s.size:
+            ax.vlines(onset_s, 0, 1, transform=ax.get_xaxis_transform(), colors="0.4", linewidth=0.4, alpha=0.6)
+    if t0 is not None and t1 is not None:
+        axes[-1].set_xlim(t0, t1)
+    axes[-1].set_xlabel(f"Time [s] from {ref_time:%Y-%m-%d %H:%M:%S}")
+    if title:
+        fig.suptitle(title)
+    fig.tight_layout()
+    return fig
+
+
+def plot_subject(subject_id, round_num=None, channels=BIO_CHANNELS, width_px=DEFAULT_WIDTH_PX,
+                 output=None, dpi=100):
+    """
+    Raw traces of one subject: the whole continuous recording, or one round
+    (with its per-condition bio file and, for C/D, the force trace).
+    Returns the saved path, or None if there is nothing to plot.
+    """
+    rounds, onsets = session_events(subject_id)
+    window = None
+    if round_num is not None:
+        match = [(r, cond, start, end) for r, cond, start, end in rounds if r == round_num]
+        if not match:
+            print(f"No MIST round {round_num} for subject {subject_id}")
+            return None
+        _, cond, start, end = match[0]
+        window = (start, end)
+        bio_path = (find_bio_file(subject_id, cond) if cond else None) or find_bio_recording_for_window(subject_id, window)
+        force_path = find_force_file(subject_id, cond) if cond else None
+    else:
+        recordings = find_bio_recordings(subject_id)
+        bio_path = recordings[-1][1] if recordings else None
+        force_path = None
+
+    traces = bio_traces(bio_path, channels) if bio_path else []
+    if force_path:
+        trace = force_trace(force_path)
+        if trace is not None:
+            traces.append(trace)
+    if not traces:
+        print(f"No recordings for subject {subject_id}" + (f" round {round_num}" if round_num else ""))
+        return None
+
+    if window is not None:
+        ref_time = window[0]
+        t0, t1 = 0.0, (window[1] - window[0]).total_seconds()
+    else:
+        ref_time = traces[0].start_time
+        t0 = t1 = None
+
+    suffix = f"_R{round_num}" if round_num is not None else ""
+    sources = dict.fromkeys(os.path.basename(tr.source) for tr in traces)
+    title = f"Subject {subject_id}" + (f" round {round_num}" if round_num is not None else "")
+    fig = plot_traces(traces, ref_time, t0, t1, rounds=rounds, onsets=onsets, width_px=width_px,
+                      title=f"{title}: {', '.join(sources)}")
+    if output is None:
+        os.makedirs(SIGNAL_PLOT_DIR, exist_ok=True)
+        output = os.path.join(SIGNAL_PLOT_DIR, f"signals_S{subject_id}{suffix}.png")
+    fig.savefig(output, dpi=dpi)
+    plt.close(fig)
+    print(f"Saved {output}")
+    return output
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot raw BVP/EDA/RESP (and force) traces with MIST rounds and onsets")
+    parser.add_argument("subject", type=int)
+    parser.add_argument("--round", type=int, default=None, dest="round_num",
+                        help="only this MIST round (adds the force trace for C/D)")
+    parser.add_argument("--channels", nargs="+", default=list(BIO_CHANNELS), choices=BIO_CHANNELS)
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH_PX, help="plot width in pixels")
+    parser.add_argument("-o", "--output", default=None)
+    args = parser.parse_args()
+    plot_subject(args.subject, args.round_num, args.channels, args.width, args.output)
@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+from itertools import combinations
+from scipy import stats
+
+from analysis_cube import AnalysisCube
+from permutation_tests import friedman_permutation, paired_t_permutation
+
+# 批量重复测量检验：把 combined_analysis 整理成一个 subject × condition × metric 的
+# 数组（缺失为 NaN），沿 condition 轴只排一次秩，Friedman / Kendall's W / Nemenyi
+# 全部由这一份秩计算；配对 t 与 Wilcoxon 对所有 metric × contrast 一次性向量化计算，
+# 最后在每个检验族内做 Benjamini-Hochberg FDR 校正。
+CONDITIONS = ("A", "B", "C", "D")
+
+# (name, x conditions, y conditions): x/y 为多个条件时取被试内均值
+CONTRASTS = [
+    ("A_vs_B", ("A",), ("B",)),
+    ("D_vs_C", ("D",), ("C",)),
+    ("HasArm_vs_NoArm", ("C", "D"), ("A", "B")),
+]
+
+METRIC_LABELS = {
+    "Word_Recall_Correct": "单词记忆记对数量",
+    "MIST_ResponseTime": "算术反应时(s)",
+    "MIST_Timeouts": "算术超时数",
+    "Bio_EDA_Mean": "EDA均值",
+    "Bio_BVP_Mean": "BVP均值",
+    "Bio_RESP_Mean": "RESP均值",
+    "NASA_TLX_Score": "NASA-TLX总分(均值)",
+    "NASA_Mental": "NASA心理需求",
+    "NASA_Frustration": "NASA挫败感",
+    "Force_Total_Mean": "总力(均值, Thumb+Index)",
+    "Force_Total_Max": "总力(最大, Thumb+Index)",
+}
+
+
+def build_cube(df, metrics, conditions=CONDITIONS, subject_col="SubjectID", condition_col="Condition"):
+    """
+    (cube, subjects): cube[s, k, m] = value of metrics[m] for subjects[s] under
+    conditions[k], NaN where missing. df is the long combined table or an
+    already loaded AnalysisCube.
+    """
+    if not isinstance(df, AnalysisCube):
+        df = AnalysisCube.from_frame(df, metrics, conditions, subject_col, condition_col)
+    cube = df.sel(metrics, conditions)
+    return cube.values, cube.subjects
+
+
+def tie_sum(ranks, axis):
+    """
+    Sum of (t^3 - t) over tie groups, from average ranks: ties shrink the sum of
+    squared ranks by exactly (t^3 - t) / 12 per group, so no sort is needed.
+    """
+    n = np.sum(~np.isnan(ranks), axis=axis)
+    untied = n * (n + 1) * (2 * n + 1) / 6.0
+    return np.round(12.0 * (untied - np.nansum(ranks ** 2, axis=axis)))
+
+
+def rank_conditions(cube):
+    """Within-subject average ranks along the condition axis; incomplete rows become NaN."""
+    ranks = stats.rankdata(cube, axis=1)
+    ranks[np.isnan(cube).any(axis=1, keepdims=True).repeat(cube.shape[1], axis=1)] = np.nan
+    return ranks
+
+
+def friedman(ranks):
+    """
+    Friedman test per metric from condition ranks (S, K, M), complete subjects only.
+    Returns dict of (M,) arrays: n, chi2, p, kendalls_w, plus mean_ranks (K, M).
+    """
+    k = ranks.shape[1]
+    complete = ~np.isnan(ranks[:, 0, :])
+    n = complete.sum(axis=0)
+    R = np.nansum(ranks, axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        chi2 = 12.0 / (n * k * (k + 1)) * np.sum(R ** 2, axis=0) - 3.0 * n * (k + 1)
+        ties = np.nansum(np.where(complete, tie_sum(ranks, axis=1), 0.0), axis=0)
+        chi2 = chi2 / (1.0 - ties / (n * k * (k * k - 1.0)))
+        p = stats.chi2.sf(chi2, k - 1)
+        w = chi2 / (n * (k - 1))
+        mean_ranks = R / n
+    bad = n < 2
+    for a in (chi2, p, w):
+        a[bad] = np.nan
+    return {"n": n, "chi2": chi2, "p": p, "kendalls_w": w, "mean_ranks": mean_ranks}
+
+
+def nemenyi(mean_ranks, n):
+    """
+    Nemenyi post-hoc p-values for every condition pair (same formula as
+    scikit_posthocs.posthoc_nemenyi_friedman). Returns (pairs, (P, M) array).
+    """
+    k = mean_ranks.shape[0]
+    pairs = list(combinations(range(k), 2))
+    i, j = np.array(pairs).T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        q = np.abs(mean_ranks[i] - mean_ranks[j]) / np.sqrt(k * (k + 1.0) / (6.0 * n))
+    p = np.full(q.shape, np.nan)
+    ok = np.isfinite(q)
+    p[ok] = stats.studentized_range.sf(q[ok] * np.sqrt(2.0), k, np.inf)
+    return pairs, p
+
+
+def contrast_pairs(cube, contrasts=CONTRASTS, conditions=CONDITIONS):
+    """
+    (x, y), each (S, P, M): per-subject contrast sides, the mean over the side's
+    conditions that are present (NaN only if all of them are missing).
+    """
+    idx = {c: i for i, c in enumerate(conditions)}
+
+    def side(conds):
+        block = cube[:, [idx[c] for c in conds], :]
+        n = (~np.isnan(block)).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.nansum(block, axis=1) / np.where(n > 0, n, np.nan)
+
+    x = np.stack([side(xs) for _, xs, _ in contrasts], axis=1)
+    y = np.stack([side(ys) for _, _, ys in contrasts], axis=1)
+    return x, y
+
+
+def paired_t(x, y, confidence=0.95):
+    """Paired t over axis 0 for every (contrast, metric) cell, pairs with a NaN dropped."""
+    valid = ~(np.isnan(x) | np.isnan(y))
+    n = valid.sum(axis=0)
+    d = np.where(valid, x - y, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_diff = d.sum(axis=0) / n
+        resid = np.where(valid, (x - y) - mean_diff, 0.0)
+        sd = np.sqrt((resid ** 2).sum(axis=0) / (n - 1))
+        se = sd / np.sqrt(n)
+        dof = n - 1
+        t = mean_diff / se
+        p = 2.0 * stats.t.sf(np.abs(t), dof)
+        half = stats.t.ppf(0.5 + confidence / 2.0, dof) * se
+        x_mean = np.where(valid, x, 0.0).sum(axis=0) / n
+        y_mean = np.where(valid, y, 0.0).sum(axis=0) / n
+        dz = mean_diff / sd
+    return {"n": n, "df": dof, "t": t, "p": p, "mean_diff": mean_diff,
+            "ci_low": mean_diff - half, "ci_high": mean_diff + half, "cohens_dz": dz,
+            "x_mean": x_mean, "y_mean": y_mean, "sd_diff": sd}
+
+
+def _signed_rank_null(doubled_ranks):
+    """
+    Exact sign-flip null of R+ given the observed ranks (ties and all), as a pmf
+    over 2*R+ built by subset-sum DP. Ranks are passed doubled so that average
+    ranks (multiples of 0.5) become integers.
+    """
+    pmf = np.zeros(int(sum(doubled_ranks)) + 1)
+    pmf[0] = 1.0
+    for r in doubled_ranks:
+        r = int(r)
+        pmf[r:] = pmf[r:] + pmf[:-r].copy() if r else 2 * pmf
+    return pmf / 2.0 ** len(doubled_ranks)
+
+
+def wilcoxon_signed_rank(x, y, exact_max_n=50):
+    """
+    Wilcoxon signed-rank (zero differences dropped) over axis 0 for every
+    (contrast, metric) cell, with rank-biserial correlation
+    rbc = (R+ - R-) / (R+ + R-). p is the exact two-sided sign-flip p-value
+    conditional on the observed ranks for n <= exact_max_n (identical to the
+    classic exact test when there are no ties), otherwise the tie- and
+    continuity-corrected normal approximation.
+    """
+    d = x - y
+    valid = ~np.isnan(d)
+    nz = valid & (d != 0)
+    count = nz.sum(axis=0)
+
+    # invalid cells rank behind every valid one, so valid ranks are unaffected
+    r = stats.rankdata(np.where(nz, np.abs(d), np.inf), axis=0)
+    r = np.where(nz, r, np.nan)
+    r_plus = np.nansum(np.where(d > 0, r, 0.0), axis=0)
+    r_minus = np.nansum(np.where(d < 0, r, 0.0), axis=0)
+
+    p = np.full(count.shape, np.nan)
+    exact = (count > 0) & (count <= exact_max_n)
+    nulls = {}  # cells with the same rank multiset (e.g. all untied cells of one n) share a null
+    for cell in zip(*np.nonzero(exact)):
+        ranks = r[(slice(None),) + cell]
+        key = tuple(np.sort(np.rint(2 * ranks[~np.isnan(ranks)]).astype(int)))
+        if key not in nulls:
+            nulls[key] = np.cumsum(_signed_rank_null(key))
+        cdf = nulls[key]
+        k = int(np.rint(2 * r_plus[cell]))
+        lower = cdf[k]
+        upper = 1.0 - (cdf[k - 1] if k > 0 else 0.0)
+        p[cell] = min(1.0, 2.0 * min(lower, upper))
+
+    approx = (count > exact_max_n)
+    if approx.any():
+        mn = count * (count + 1.0) * 0.25
+        se = count * (count + 1.0) * (2.0 * count + 1.0) - tie_sum(r, axis=0) / 2.0
+        se = np.sqrt(se / 24.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = (r_plus - mn) / se
+            z = z - np.sign(z) * 0.5 / se
+        p[approx] = (2.0 * stats.norm.sf(np.abs(z)))[approx]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rbc = (r_plus - r_minus) / (r_plus + r_minus)
+    W = np.where(count > 0, np.minimum(r_plus, r_minus), np.nan)
+    return {"n": valid.sum(axis=0), "W": W, "p": p, "rbc": rbc, "r_plus": r_plus, "r_minus": r_minus}
+
+
+def fdr_bh(p):
+    """Benjamini-Hochberg adjusted p-values over all finite entries of p (any shape)."""
+    p = np.asarray(p, dtype=float)
+    q = np.full(p.shape, np.nan)
+    ok = np.isfinite(p)
+    vals = p[ok]
+    m = vals.size
+    if m == 0:
+        return q
+    order = np.argsort(vals)
+    adj = vals[order] * m / np.arange(1, m + 1)
+    adj = np.minimum.accumulate(adj[::-1])[::-1]
+    out = np.empty(m)
+    out[order] = np.minimum(adj, 1.0)
+    q[ok] = out
+    return q
+
+
+def _label(metric, labels):
+    return labels.get(metric, metric)
+
+
+def friedman_table(df, metrics, conditions=CONDITIONS, min_n=2, permutation=None, n_resamples=100_000,
+                   seed=None, jobs=1):
+    """
+    One row per metric: Friedman chi2/p, Kendall's W, FDR-adjusted p across the
+    metrics tested, and Nemenyi p for every condition pair ('nemenyi_A_vs_B', ...).
+    permutation='exact' | 'mc' | 'auto' adds the permutation p-value p_perm
+    (see permutation_tests).
+    """
+    cube, _ = build_cube(df, metrics, conditions)
+    ranks = rank_conditions(cube)
+    fr = friedman(ranks)
+    pairs, nem = nemenyi(fr["mean_ranks"], fr["n"])
+    keep = fr["n"] >= min_n
+    out = pd.DataFrame({
+        "metric": list(metrics),
+        "n_complete_subjects": fr["n"],
+        "chi2": fr["chi2"],
+        "p": fr["p"],
+        "kendalls_w": fr["kendalls_w"],
+        "conditions": ",".join(conditions),
+    })
+    out["p_fdr"] = np.nan
+    out.loc[keep, "p_fdr"] = fdr_bh(fr["p"][keep])
+    if permutation:
+        out["p_perm"] = friedman_permutation(ranks, permutation, n_resamples, seed, jobs)
+    for (i, j), row in zip(pairs, nem):
+        out[f"nemenyi_{conditions[i]}_vs_{conditions[j]}"] = row
+    return out[keep].reset_index(drop=True)
+
+
+def paired_tables(df, metrics, contrasts=CONTRASTS, conditions=CONDITIONS, labels=METRIC_LABELS, min_n=2,
+                  permutation=None, n_resamples=100_000, seed=None, jobs=1):
+    """
+    (paired_t_df, wilcoxon_df) in the CHI_result/tables layout, one row per
+    (metric, contrast) with at least min_n complete pairs, metric-major order.
+    p_fdr is BH-adjusted across all rows of each table. permutation='exact' |
+    'mc' | 'auto' adds the sign-flip p_perm of the paired t (the Wilcoxon p is
+    already the exact sign-flip p for n <= 50).
+    """
+    cube, _ = build_cube(df, metrics, conditions)
+    x, y = contrast_pairs(cube, contrasts, conditions)
+    tt = paired_t(x, y)
+    wx = wilcoxon_signed_rank(x, y)
+
+    # (P, M) -> metric-major rows
+    m_idx, c_idx = np.meshgrid(np.arange(len(metrics)), np.arange(len(contrasts)), indexing="ij")
+    m_idx, c_idx = m_idx.ravel(), c_idx.ravel()
+    keep = tt["n"][c_idx, m_idx] >= min_n
+    m_idx, c_idx = m_idx[keep], c_idx[keep]
+
+    def side(conds):
+        return conds[0] if len(conds) == 1 else f"mean({','.join(conds)})"
+
+    base = pd.DataFrame({
+        "metric": [metrics[m] for m in m_idx],
+        "label": [_label(metrics[m], labels) for m in m_idx],
+        "contrast": [contrasts[c][0] for c in c_idx],
+        "x_condition": [side(contrasts[c][1]) for c in c_idx],
+        "y_condition": [side(contrasts[c][2]) for c in c_idx],
+    })
+    at = lambda a: a[c_idx, m_idx]
+
+    t_df = base.assign(
+        n=at(tt["n"]), df=at(tt["df"]), t=at(tt["t"]), p=at(tt["p"]),
+        mean_diff=at(tt["mean_diff"]), ci95_low=at(tt["ci_low"]), ci95_high=at(tt["ci_high"]),
+        cohens_dz=at(tt["cohens_dz"]), x_mean=at(tt["x_mean"]), y_mean=at(tt["y_mean"]),
+        sd_diff=at(tt["sd_diff"]),
+    )
+    t_df["p_fdr"] = fdr_bh(t_df["p"].to_numpy())
+    if permutation:
+        t_df["p_perm"] = at(paired_t_permutation(x, y, permutation, n_resamples, seed, jobs))
+
+    w_df = base.assign(
+        n=at(wx["n"]), W=at(wx["W"]), p=at(wx["p"]), rbc=at(wx["rbc"]),
+        diff_mean=at(tt["mean_diff"]), x_mean=at(tt["x_mean"]), y_mean=at(tt["y_mean"]),
+    )
+    w_df["p_fdr"] = fdr_bh(w_df["p"].to_numpy())
+    return t_df, w_df
@@ -1,11 +1,14 @@
 import pandas as pd
 import numpy as np
 
+from analysis_cube import load_cube
+from table_io import write_table
+
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1000)
 
 def main():
-    df = pd.read_csv("combined_analysis.csv")
+    cube = load_cube("combined_analysis.csv")
     
     # Define metric groups
     # 不再统计“计算准确率”，改为统计“单词记忆记对数量”
@@ -17,25 +20,29 @@ def main():
     
     # 1. Group by Condition (A, B, C, D)
     print("=== Mean Values by Condition ===")
-    grouped = df.groupby('Condition')[mist_metrics + bio_metrics + nasa_metrics + avatar_metrics].mean(numeric_only=True)
+    grouped = cube.condition_means(mist_metrics + bio_metrics + nasa_metrics + avatar_metrics)
     print(grouped)
     print("\n")
     
     # 2. Specific Comparisons
     print("=== Comparison: Robotic Arm (C+D) vs No Arm (A+B) ===")
-    df['HasArm'] = df['Condition'].isin(['C', 'D'])
-    arm_comp = df.groupby('HasArm')[mist_metrics + bio_metrics + nasa_metrics + avatar_metrics].mean(numeric_only=True)
+    has_arm = {False: [c for c in cube.conditions if c not in ('C', 'D')],
+               True: [c for c in cube.conditions if c in ('C', 'D')]}
+    arm_comp = cube.group_means({k: v for k, v in has_arm.items() if v},
+                                mist_metrics + bio_metrics + nasa_metrics + avatar_metrics, name='HasArm')
     print(arm_comp)
     print("\n")
     
     print("=== Comparison: Clothed (D) vs Naked Robot (C) ===")
-    robot_df = df[df['Condition'].isin(['C', 'D'])]
-    robot_comp = robot_df.groupby('Condition')[mist_metrics + bio_metrics + nasa_metrics + force_metrics + avatar_metrics].mean(numeric_only=True)
+    robot = cube.sel(conditions=has_arm[True])
+    robot_comp = robot.condition_means(mist_metrics + bio_metrics + nasa_metrics + force_metrics + avatar_metrics)
     print(robot_comp)
     print("\n")
     
     # 3. Save Summary
-    grouped.to_csv("summary_by_condition.csv")
+    # condition means: counts such as MIST_Timeouts are no longer whole numbers
+    write_table(grouped, "summary_by_condition.csv", index=True,
+                column_types={c: "float64" for c in grouped.columns})
     print("Summary saved to summary_by_condition.csv")
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from synthetic_physio import (
+    SYNTH_START, synth_bvp, synth_eda, synth_resp, synth_force_frame, write_physiolab_csv, write_force_csv,
+)
+from nasa_tlx import SUBJECT_COL, TLX_DIMENSIONS
+from avatar_scoring import N_ITEMS
+from session_log import RECALL_FIELDS, session_dir_path, write_session
+
+# 合成完整的 data/ 目录（任意被试数），文件名和列格式与真实数据一致，
+# 供规模测试（scale_harness.py）跑完整流水线：
+#   实验顺序.txt                      平衡拉丁方的条件顺序
+#   results/mist_results_{id}_{ts}.csv, mist_recall_{id}_{ts}.csv（每轮一个），
+#   或 session_dirs=True 时 mist_test.py 现在的 session 容器 results/mist_session_{id}_{ts}/
+#   bio_data/{id}{cond}_Entity_synthetic.csv（每轮一条 PhysioLAB 记录），或者
+#   bio_data/{id}Test_Entity_Recording_{开始时间}(...).csv（整个 session 一条连续记录，
+#   process_data.py 按 MIST 轮次切 epoch）；bio_layout="mixed" 时奇数被试按轮次、偶数被试连续
+#   force_sensor/{id}_没衣服.csv (C), {id}_有衣服.csv (D)
+#   NASA-TLX_synthetic.xlsx, avatar_scale/synthetic_Avatar Embodiment Questionnaire.xlsx
+# 各条件之间加了小的效应（心率、SCR、回忆、TLX），统计结果不全是噪声。
+# Williams design for 4 conditions: every condition in every position and
+# every condition directly after every other once
+BALANCED_ORDERS = ["ABDC", "BCAD", "CDBA", "DACB"]
+CONDITION_LEGEND = [
+    "A:自己右手做思考姿势",
+    "B：强制不做思考姿势",
+    "C：控制机械臂做思考姿势",
+    "D: 控制穿衣服机械臂做思考姿势",
+]
+CONDITION_EFFECTS = {
+    "A": {"hr": 0.0, "scr_per_min": 3.0, "recall": 0.60, "tlx": 0.0},
+    "B": {"hr": 2.0, "scr_per_min": 3.5, "recall": 0.50, "tlx": 1.5},
+    "C": {"hr": 1.0, "scr_per_min": 3.2, "recall": 0.55, "tlx": 0.5},
+    "D": {"hr": 0.5, "scr_per_min": 3.0, "recall": 0.58, "tlx": 0.0},
+}
+FORCE_FILE_KEYWORD = {"C": "没衣服", "D": "有衣服"}
+PRACTICE_EFFECT = CONDITION_EFFECTS["A"]  # physiology during the practice round of a continuous recording
+BIO_LAYOUTS = ("per_condition", "continuous", "mixed")
+RECORDING_LEAD_S = 2.0  # recordings start 2 s before the first round they cover and end 2 s after the last
+
+PRACTICE_S = 30.0
+ROUND_S = 60.0
+GAP_S = 30.0
+TIME_LIMIT_S = 8.0
+N_TARGET_WORDS = 10
+N_DISTRACTOR_WORDS = 10
+
+
+def subject_orders(n_subjects):
+    """SubjectID -> condition order, cycling through the balanced orders."""
+    return {s: list(BALANCED_ORDERS[(s - 1) % len(BALANCED_ORDERS)]) for s in range(1, n_subjects + 1)}
+
+
+def write_order_table(path, orders):
+    lines = CONDITION_LEGEND + [""] + [f"{s}.{''.join(o)}" for s, o in sorted(orders.items())]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def session_plan(subject_id, order, round_s=ROUND_S, gap_s=GAP_S):
+    """[(round, condition or None for practice, start, end)] of one subject's session."""
+    t = SYNTH_START + pd.Timedelta(hours=2 * (subject_id - 1))
+    plan = [(0, None, t, t + pd.Timedelta(seconds=PRACTICE_S))]
+    t += pd.Timedelta(seconds=PRACTICE_S + gap_s)
+    for r, cond in enumerate(order, start=1):
+        plan.append((r, cond, t, t + pd.Timedelta(seconds=round_s)))
+        t += pd.Timedelta(seconds=round_s + gap_s)
+    return plan
+
+
+def mist_rows(subject_id, rnd, start, end, rng):
+    """MIST questions of one round, answered back to back until the round ends."""
+    rows, t, q = [], start, 1
+    while True:
+        a, b, c = rng.integers(1, 10, 3)
+        taken = float(np.round(rng.gamma(4.0, 1.0), 3))
+        timeout = taken >= TIME_LIMIT_S
+        taken = TIME_LIMIT_S if timeout else taken
+        answered = t + pd.Timedelta(seconds=taken)
+        if answered > end:
+            break
+        correct = int(a + b - c)
+        ok = not timeout and rng.random() < 0.7
+        rows.append({
+            "SubjectID": subject_id, "Round": rnd, "QuestionIndex": q,
+            "Expression": f"{a} + {b} - {c}", "CorrectAnswer": correct,
+            "UserAnswer": "" if timeout else (correct if ok else correct + int(rng.integers(1, 4))),
+            "IsCorrect": ok, "TimeTaken": taken, "Timeout": timeout,
+            "Timestamp": answered.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        t, q = answered + pd.Timedelta(seconds=0.5), q + 1
+    return rows
+
+
+def recall_rows(subject_id, rnd, cond, rng):
+    p_hit = CONDITION_EFFECTS[cond]["recall"]
+    rows = []
+    for i in range(N_TARGET_WORDS + N_DISTRACTOR_WORDS):
+        target = i < N_TARGET_WORDS
+        selected = bool(rng.random() < (p_hit if target else 0.15))
+        rows.append({"SubjectID": subject_id, "Round": rnd, "Word": f"w{i}", "IsTarget": target,
+                     "Selected": selected, "IsCorrectSelection": selected == target})
+    return rows
+
+
+def bio_signals(effect, n, bio_fs, rng):
+    return {
+        "BVP": synth_bvp(n, bio_fs, hr_bpm=rng.uniform(65, 85) + effect["hr"], rng=rng),
+        "EDA": synth_eda(n, bio_fs, scl=rng.uniform(2, 8), scr_per_min=effect["scr_per_min"], rng=rng),
+        "RESP": synth_resp(n, bio_fs, rate_bpm=rng.uniform(12, 18), rng=rng),
+    }
+
+
+def continuous_recording_name(subject_id, start):
+    return f"{subject_id}Test_Entity_Recording_{start.strftime('%Y_%m_%d_%H_%M_%S')}(PhysioLAB Pro1(00-07-80-8C-AE-23)).csv"
+
+
+def write_continuous_recording(data_dir, subject_id, plan, bio_fs, rng):
+    """One PhysioLAB recording of the whole session (practice included), like the real Test_Entity_Recording files."""
+    start = plan[0][2] - pd.Timedelta(seconds=RECORDING_LEAD_S)
+    stop = plan[-1][3] + pd.Timedelta(seconds=RECORDING_LEAD_S)
+    # each round's physiology runs from half way through the gap before it to half way through the gap after it
+    cuts = [start] + [a[3] + (b[2] - a[3]) / 2 for a, b in zip(plan, plan[1:])] + [stop]
+    parts = []
+    for (_, cond, _, _), c0, c1 in zip(plan, cuts, cuts[1:]):
+        n = int(round((c1 - c0).total_seconds() * bio_fs))
+        parts.append(bio_signals(CONDITION_EFFECTS[cond] if cond else PRACTICE_EFFECT, n, bio_fs, rng))
+    rec = {ch: np.concatenate([p[ch] for p in parts]) for ch in ("BVP", "EDA", "RESP")}
+    rec["start_time"] = start
+    rec["t"] = np.arange(len(rec["BVP"])) / bio_fs
+    write_physiolab_csv(os.path.join(data_dir, "bio_data", continuous_recording_name(subject_id, start)), rec)
+
+
+def recall_stats(rnd, rows):
+    targets = sum(1 for x in rows if x["IsTarget"])
+    hits = sum(1 for x in rows if x["IsTarget"] and x["Selected"])
+    false_alarms = sum(1 for x in rows if x["Selected"] and not x["IsTarget"])
+    return {"round": rnd, "total_targets": targets, "correct_selections": hits, "false_alarms": false_alarms,
+            "misses": targets - hits, "accuracy": hits / targets * 100 if targets else 0}
+
+
+def write_session_dir(data_dir, subject_id, plan, mist, recall):
+    """The subject's MIST session as a session container (recall: round -> (rows, saved time))."""
+    state = {
+        "subject_id": subject_id, "seed": None, "config": {"TOTAL_ROUNDS": len(plan) - 1},
+        "results": mist,
+        "recall": {r: {"rows": [[x[f] for f in RECALL_FIELDS] for x in rows], "stats": recall_stats(r, rows), "t": t}
+                   for r, (rows, t) in recall.items()},
+        "round_start_times": {r: start.timestamp() for r, _, start, _ in plan},
+        "round_end_times": {r: end.timestamp() for r, _, _, end in plan},
+        "completed_rounds": [r for r, *_ in plan],
+        "finished": True,
+        "first_t": plan[0][2].timestamp(),
+        "last_t": max(t for _, t in recall.values()) if recall else plan[-1][3].timestamp(),
+    }
+    write_session(session_dir_path(subject_id, plan[0][2].timestamp(), os.path.join(data_dir, "results")), state)
+
+
+def write_subject(data_dir, subject_id, order, round_s=ROUND_S, gap_s=GAP_S, bio_fs=1000, seed=0, session_dirs=False,
+                  bio_layout="per_condition"):
+    """
+    Every per-subject file of one synthetic subject; returns the subject's
+    questionnaire rows (nasa, avatar) for the cohort-level workbooks.
+    """
+    if bio_layout not in BIO_LAYOUTS:
+        raise ValueError(f"bio_layout must be one of {BIO_LAYOUTS}")
+    continuous = bio_layout == "continuous" or (bio_layout == "mixed" and subject_id % 2 == 0)
+    rng = np.random.default_rng([seed, subject_id])
+    plan = session_plan(subject_id, order, round_s, gap_s)
+    session_end = plan[-1][3]
+    mist_ts = int(session_end.timestamp()) + 60
+
+    mist, recall = [], {}
+    for rnd, cond, start, end in plan:
+        mist.extend(mist_rows(subject_id, rnd, start, end, rng))
+        if cond is None:
+            continue
+        # recall is saved right after each round, before the final mist_results file
+        recall_ts = int(end.timestamp()) + 20
+        recall[rnd] = (recall_rows(subject_id, rnd, cond, rng), recall_ts)
+        if not session_dirs:
+            pd.DataFrame(recall[rnd][0]).to_csv(
+                os.path.join(data_dir, "results", f"mist_recall_{subject_id}_{recall_ts}.csv"), index=False)
+
+        if not continuous:
+            n = int((round_s + 2 * RECORDING_LEAD_S) * bio_fs)
+            rec = {
+                "start_time": start - pd.Timedelta(seconds=RECORDING_LEAD_S),
+                "t": np.arange(n) / bio_fs,
+                **bio_signals(CONDITION_EFFECTS[cond], n, bio_fs, rng),
+            }
+            write_physiolab_csv(os.path.join(data_dir, "bio_data", f"{subject_id}{cond}_Entity_synthetic.csv"), rec)
+        if cond in FORCE_FILE_KEYWORD:
+            force = synth_force_frame(round_s, start_time=start, seed=rng.integers(2**32),
+                                      press_per_min=8.0 if cond == "D" else 6.0)
+            write_force_csv(os.path.join(data_dir, "force_sensor",
+                                         f"{subject_id}_{FORCE_FILE_KEYWORD[cond]}.csv"), force)
+    if continuous:
+        # own generator, so the other files of the subject are the same in every layout
+        write_continuous_recording(data_dir, subject_id, plan, bio_fs, np.random.default_rng([seed, subject_id, 1]))
+    if session_dirs:
+        write_session_dir(data_dir, subject_id, plan, mist, recall)
+    else:
+        pd.DataFrame(mist).to_csv(os.path.join(data_dir, "results", f"mist_results_{subject_id}_{mist_ts}.csv"),
+                                  index=False)
+
+    submitted = (session_end + pd.Timedelta(minutes=10)).strftime("%Y/%m/%d %H:%M:%S")
+    nasa = {"提交答卷时间": submitted, SUBJECT_COL: subject_id}
+    for k, cond in enumerate(order):
+        suffix = "" if k == 0 else f".{k}"
+        level = rng.uniform(6, 14) + CONDITION_EFFECTS[cond]["tlx"]
+        for dim in TLX_DIMENSIONS:
+            nasa[dim + suffix] = float(np.round(np.clip(level + rng.normal(0, 3), 0, 21), 1))
+
+    avatar = {"提交答卷时间": submitted, "Name": f"S{subject_id}", "Serial Number": str(subject_id)}
+    base = rng.integers(-2, 3, N_ITEMS)
+    for suffix, shift in (("", 0), (".1", 1)):  # first robot block = C, second (.1) = D
+        items = np.clip(base + shift + rng.integers(-1, 2, N_ITEMS), -3, 3)
+        for q, v in enumerate(items, start=1):
+            # a few answers exported as option letters (A..G), like the questionnaire site does
+            avatar[f"Q{q}. Synthetic item {q}.{suffix}"] = "ABCDEFG"[v + 3] if rng.random() < 0.03 else int(v)
+    return nasa, avatar
+
+
+def _write_subject_job(args):
+    return write_subject(*args)
+
+
+def write_cohort(root, n_subjects, round_s=ROUND_S, gap_s=GAP_S, bio_fs=1000, seed=0, jobs=1, session_dirs=False,
+                 bio_layout="per_condition"):
+    """Write a synthetic data/ tree for n_subjects under root; returns the data directory."""
+    data_dir = os.path.join(root, "data")
+    for sub in ("results", "bio_data", "force_sensor", "avatar_scale"):
+        os.makedirs(os.path.join(data_dir, sub), exist_ok=True)
+    orders = subject_orders(n_subjects)
+    write_order_table(os.path.join(data_dir, "实验顺序.txt"), orders)
+
+    work = [(data_dir, s, o, round_s, gap_s, bio_fs, seed, session_dirs, bio_layout) for s, o in sorted(orders.items())]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            rows = list(pool.map(_write_subject_job, work))
+    else:
+        rows = [_write_subject_job(w) for w in work]
+
+    nasa = pd.DataFrame([r[0] for r in rows])
+    nasa.insert(0, "序号", np.arange(1, len(nasa) + 1))
+    nasa.to_excel(os.path.join(data_dir, "NASA-TLX_synthetic.xlsx"), index=False, engine="openpyxl")
+    avatar = pd.DataFrame([r[1] for r in rows])
+    avatar.insert(0, "序号", np.arange(1, len(avatar) + 1))
+    avatar.to_excel(os.path.join(data_dir, "avatar_scale", "synthetic_Avatar Embodiment Questionnaire.xlsx"),
+                    index=False, engine="openpyxl")
+    return data_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic data/ tree for the analysis pipeline")
+    parser.add_argument("root", help="directory that gets the data/ tree")
+    parser.add_argument("--subjects", "-n", type=int, default=6)
+    parser.add_argument("--round-seconds", type=float, default=ROUND_S)
+    parser.add_argument("--bio-fs", type=int, default=1000)
+    parser.add_argument("--bio-layout", choices=BIO_LAYOUTS, default="per_condition",
+                        help="PhysioLAB files per condition, one continuous recording per subject, or both (alternating)")
+    parser.add_argument("--session-dirs", action="store_true", help="MIST data as session containers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", "-j", type=int, default=1)
+    args = parser.parse_args()
+    print(write_cohort(args.root, args.subjects, round_s=args.round_seconds, bio_fs=args.bio_fs, seed=args.seed,
+                       jobs=args.jobs, session_dirs=args.session_dirs, bio_layout=args.bio_layout))
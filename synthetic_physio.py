@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+from signal_io import PHYSIOLAB_FS, PHYSIOLAB_TIME_FORMAT, FORCE_TIME_COL
+
+# 合成生理信号，用于基准测试和规模测试（不是生理模型，只求形态和统计量接近
+# data/bio_data 里的真实记录）：
+# - BVP：逐拍脉搏波（收缩峰 + 重搏波），心率带呼吸性窦性心律不齐和随机 HRV
+# - EDA：缓慢漂移的 tonic 水平 + 泊松出现的 SCR（双指数波形）
+# - RESP：频率缓慢变化的呼吸波
+# - 力传感器：不等间隔（10-20 ms）的 12 通道导出，含按压事件和被截断的行
+# 数值范围与 PhysioLAB 导出一致（BVP ~100-160，EDA 几 uS，RESP ~±1）。
+SYNTH_START = pd.Timestamp("2025-12-05 11:00:00")
+FORCE_CHANNELS = [
+    f"{finger}_{module}_F{axis}"
+    for finger, modules in (("Thumb", ("M1_IPS1610", "M2_DPS2015")), ("Index", ("M1_IPS1610", "M2_DPS1813")))
+    for module in modules
+    for axis in "xyz"
+]
+
+_SLOW_FS = 20  # rate at which slow components (HR, tonic EDA, SCRs, breathing rate) are generated
+_CHUNK = 1 << 20  # full-rate samples are produced chunk by chunk into float32 (8 h at 1 kHz ~ 115 MB/channel)
+
+
+def _slow_noise(rng, n_slow, scale, smooth_s, fs=_SLOW_FS):
+    """Smoothed random walk-ish noise with about `scale` amplitude and `smooth_s` correlation time."""
+    w = max(1, int(smooth_s * fs))
+    x = np.cumsum(rng.standard_normal(n_slow + w))
+    x = (x[w:] - x[:-w]) / np.sqrt(w)
+    return scale * x[:n_slow]
+
+
+def _to_rate(slow, i0, i1, fs):
+    """Linear interpolation of a _SLOW_FS series onto samples [i0, i1) at fs."""
+    return np.interp(np.arange(i0, i1) / fs, np.arange(len(slow)) / _SLOW_FS, slow)
+
+
+def synth_bvp(n, fs=PHYSIOLAB_FS, hr_bpm=72.0, rng=None):
+    """BVP pulse train: one systolic + dicrotic wave per beat, HR modulated by breathing and slow drift."""
+    rng = np.random.default_rng(rng)
+    duration = n / fs
+    n_slow = int(duration * _SLOW_FS) + 2
+    t_slow = np.arange(n_slow) / _SLOW_FS
+    hr = hr_bpm + 3.0 * np.sin(2 * np.pi * 0.25 * t_slow) + _slow_noise(rng, n_slow, 2.0, 30.0)
+    # beat times: integrate the instantaneous rate, one beat per unit phase
+    phase = np.cumsum(np.clip(hr, 40, 180) / 60.0) / _SLOW_FS
+    beats = np.interp(np.arange(1, int(phase[-1]) + 1), phase, t_slow)
+    beats = beats + rng.normal(0.0, 0.01, len(beats))  # beat-to-beat jitter (HRV)
+
+    baseline = _slow_noise(rng, n_slow, 3.0, 20.0)
+
+    bvp = np.empty(n, dtype=np.float32)
+    for i0 in range(0, n, _CHUNK):
+        i1 = min(n, i0 + _CHUNK)
+        t = np.arange(i0, i1) / fs
+        idx = np.searchsorted(beats, t, side="right") - 1
+        since = t - np.where(idx >= 0, beats[np.maximum(idx, 0)], -1.0)  # time since the last beat
+        pulse = np.exp(-0.5 * ((since - 0.12) / 0.045) ** 2) + 0.35 * np.exp(-0.5 * ((since - 0.36) / 0.07) ** 2)
+        pulse[idx < 0] = 0.0
+        bvp[i0:i1] = 100.0 + 55.0 * pulse + _to_rate(baseline, i0, i1, fs) + rng.normal(0.0, 0.3, i1 - i0)
+    return bvp
+
+
+def synth_eda(n, fs=PHYSIOLAB_FS, scl=4.5, scr_per_min=3.0, rng=None):
+    """Skin conductance (uS): drifting tonic level plus Poisson SCRs with a rise ~1 s, decay ~4 s."""
+    rng = np.random.default_rng(rng)
+    duration = n / fs
+    n_slow = int(duration * _SLOW_FS) + 2
+    tonic = scl + _slow_noise(rng, n_slow, 0.15, 120.0)
+    impulses = np.zeros(n_slow)
+    n_scr = rng.poisson(scr_per_min * duration / 60.0)
+    at = rng.integers(0, n_slow, n_scr)
+    np.add.at(impulses, at, rng.gamma(2.0, 0.1, n_scr))
+    k = np.arange(int(20 * _SLOW_FS)) / _SLOW_FS
+    kernel = np.exp(-k / 4.0) - np.exp(-k / 0.75)
+    level = tonic + np.convolve(impulses, kernel / kernel.max())[:n_slow]
+
+    eda = np.empty(n, dtype=np.float32)
+    for i0 in range(0, n, _CHUNK):
+        i1 = min(n, i0 + _CHUNK)
+        eda[i0:i1] = np.maximum(_to_rate(level, i0, i1, fs) + rng.normal(0.0, 0.02, i1 - i0), 0.0)
+    return eda
+
+
+def synth_resp(n, fs=PHYSIOLAB_FS, rate_bpm=15.0, rng=None):
+    """Respiration belt signal with slowly varying rate and depth."""
+    rng = np.random.default_rng(rng)
+    n_slow = int(n / fs * _SLOW_FS) + 2
+    rate = np.clip(rate_bpm + _slow_noise(rng, n_slow, 1.5, 60.0), 6, 30) / 60.0
+    depth = 0.6 + np.abs(_slow_noise(rng, n_slow, 0.1, 30.0))
+
+    resp = np.empty(n, dtype=np.float32)
+    carry = 0.0
+    for i0 in range(0, n, _CHUNK):
+        i1 = min(n, i0 + _CHUNK)
+        cycles = carry + np.cumsum(_to_rate(rate, i0, i1, fs)) / fs
+        carry = cycles[-1]
+        phase = 2 * np.pi * cycles
+        resp[i0:i1] = (_to_rate(depth, i0, i1, fs) * (np.sin(phase) + 0.2 * np.sin(2 * phase + 0.5))
+                       + rng.normal(0.0, 0.05, i1 - i0))
+    return resp
+
+
+def synth_recording(duration_s, fs=PHYSIOLAB_FS, start_time=SYNTH_START, seed=None):
+    """A read_physiolab()-style dict (fs, start_time, t, BVP, EDA, RESP) of synthetic signals."""
+    rng = np.random.default_rng(seed)
+    n = int(round(duration_s * fs))
+    return {
+        "fs": fs,
+        "start_time": pd.Timestamp(start_time),
+        "t": np.arange(n, dtype=np.float64) / fs,
+        "BVP": synth_bvp(n, fs, hr_bpm=rng.uniform(65, 90), rng=rng),
+        "EDA": synth_eda(n, fs, scl=rng.uniform(2.0, 8.0), rng=rng),
+        "RESP": synth_resp(n, fs, rate_bpm=rng.uniform(12, 18), rng=rng),
+    }
+
+
+def synth_force_frame(duration_s, start_time=SYNTH_START, press_per_min=6.0, truncated_frac=0.002, seed=None):
+    """
+    Force sensor export as a DataFrame (timestamp + FORCE_CHANNELS), sampled
+    every 10-20 ms. Presses are smooth force bumps on the M1 channels; a few
+    rows are truncated (trailing cells NaN) like the real exports.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(1, int(duration_s / 0.015))
+    t = np.cumsum(rng.uniform(0.010, 0.020, n)) - 0.015
+    f = np.zeros(n)
+    for at in rng.uniform(0, duration_s, rng.poisson(press_per_min * duration_s / 60.0)):
+        f += rng.uniform(0.5, 4.0) * np.exp(-0.5 * ((t - at) / rng.uniform(0.3, 1.5)) ** 2)
+    out = {FORCE_TIME_COL: (pd.Timestamp(start_time) + pd.to_timedelta(t, unit="s")).strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3]}
+    for ch in FORCE_CHANNELS:
+        share = {"z": 0.9, "x": 0.3, "y": 0.3}[ch[-1]] if "_M1_" in ch else 0.05
+        out[ch] = np.round(share * f + rng.normal(0.0, 0.01, n), 4)
+    df = pd.DataFrame(out)
+    cut = rng.random(n) < truncated_frac
+    df.loc[cut, FORCE_CHANNELS[6:]] = np.nan
+    return df
+
+
+def write_physiolab_csv(path, rec, device="PhysioLAB Pro1(00:07:80:8C:AE:23)"):
+    """Write a recording dict in the PhysioLAB export layout read by signal_io.read_physiolab."""
+    stamps = (rec["start_time"] + pd.to_timedelta(rec["t"], unit="s")).strftime(PHYSIOLAB_TIME_FORMAT).str[:-3]
+    df = pd.DataFrame({
+        "ID": np.arange(1, len(rec["t"]) + 1),
+        "StorageTime": stamps,
+        f"{device}|CH1-BVP": rec["BVP"],
+        f"{device}|CH2-EDA": rec["EDA"],
+        f"{device}|CH3-RESP": rec["RESP"],
+    })
+    df.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def write_force_csv(path, df):
+    """Write a synth_force_frame(); truncated rows lose their trailing cells, as in the real exports."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(",".join(df.columns) + "\n")
+        for line in df.to_csv(index=False, header=False, float_format="%.4f").splitlines():
+            f.write(line.rstrip(",") + "\n")
@@ -0,0 +1,151 @@
+import os
+import re
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # CSV-only pipeline
+    pa = None
+
+# 所有结果表除 CSV 外再写一份 Parquet 和 Arrow IPC（同名 .parquet / .arrow），
+# 使用显式 schema：条件等标签列为 dictionary（读回即 category），计数为整数
+# （可空），布尔列保持 bool，其余数值为 float64。CSV 只作为导出格式保留，
+# 下游用 read_table() 优先读列式文件，并且可以只读需要的列。
+COLUMNAR_FORMATS = ("parquet", "arrow")
+
+_LABEL = pa.dictionary(pa.int32(), pa.string()) if pa else None
+
+# exact column names -> type
+COLUMN_TYPES = {
+    "SubjectID": "int32",
+    "Round": "int8",
+    "QuestionIndex": "int32",
+    "MIST_Timeouts": "int32",
+    "Word_Recall_Correct": "int32",
+    "n": "int32",
+    "N": "int32",
+    "df": "int32",
+    "n_complete_subjects": "int32",
+    "Condition": "label",
+    "condition": "label",
+    "contrast": "label",
+    "x_condition": "label",
+    "y_condition": "label",
+    "conditions": "label",
+    "Significance": "label",
+    "W_Interpretation": "label",
+    "Metric": "label",
+    "metric": "label",
+    "label": "label",
+    "SwappedCD": "bool",
+}
+
+# column-name patterns -> type, first match wins
+COLUMN_PATTERNS = [
+    (re.compile(r"_N$"), "int32"),                       # item counts behind a subscale score
+    (re.compile(r"^AvatarEQ_Agency_Sum$"), "int32"),
+    # questionnaire items: Likert points, but duplicated items (Q22/Q23 in the xlsx) are averaged into halves
+    (re.compile(r"^(Q\d+(_Likert)?|R\d+)$"), "float64"),
+]
+
+_ARROW_TYPES = {
+    "int8": "int8", "int32": "int32", "bool": "bool_", "float64": "float64", "string": "string",
+}
+_PANDAS_INT = {"int8": "Int8", "int32": "Int32"}
+
+
+def column_type(name, series, overrides=None):
+    """Declared type name of a column: overrides, COLUMN_TYPES, COLUMN_PATTERNS, then by dtype."""
+    if overrides and name in overrides:
+        return overrides[name]
+    if name in COLUMN_TYPES:
+        return COLUMN_TYPES[name]
+    for pattern, kind in COLUMN_PATTERNS:
+        if pattern.search(name):
+            return kind
+    if pd.api.types.is_bool_dtype(series):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(series):
+        return "float64"
+    return "string"
+
+
+def table_schema(df, table_name=None, column_types=None):
+    """Explicit Arrow schema for df (see column_type); table_name goes into the metadata."""
+    fields = []
+    for name in df.columns:
+        kind = column_type(name, df[name], column_types)
+        typ = _LABEL if kind == "label" else getattr(pa, _ARROW_TYPES[kind])()
+        fields.append(pa.field(str(name), typ, nullable=True))
+    meta = {"table": table_name} if table_name else None
+    return pa.schema(fields, metadata=meta)
+
+
+def to_arrow(df, table_name=None, column_types=None):
+    """pa.Table of df under table_schema(); integer columns must hold whole numbers."""
+    schema = table_schema(df, table_name, column_types)
+    cols = {}
+    for field in schema:
+        s = df[field.name]
+        kind = column_type(field.name, s, column_types)
+        if kind in _PANDAS_INT:
+            s = pd.to_numeric(s, errors="raise").astype(_PANDAS_INT[kind])  # raises on fractional values
+        elif kind == "label" or kind == "string":
+            s = s.astype("string")
+        elif kind == "bool":
+            s = s.astype("boolean")
+        elif kind == "float64":
+            s = pd.to_numeric(s, errors="coerce").astype(float)
+        cols[field.name] = pa.array(s, from_pandas=True).cast(field.type)
+    return pa.Table.from_arrays(list(cols.values()), schema=schema)
+
+
+def _sibling(csv_path, fmt):
+    return os.path.splitext(csv_path)[0] + "." + fmt
+
+
+def write_table(df, csv_path, index=False, table_name=None, column_types=None, formats=COLUMNAR_FORMATS):
+    """
+    df.to_csv(csv_path, index=index) plus columnar copies next to it;
+    column_types ({column: type name}) overrides the default rules. A failing
+    columnar write (no pyarrow, data not matching the schema) only warns: the
+    CSV is always written.
+    """
+    df.to_csv(csv_path, index=index)
+    if not formats:
+        return
+    if pa is None:
+        print(f"pyarrow not available: only {csv_path} written")
+        return
+    name = table_name or os.path.splitext(os.path.basename(csv_path))[0]
+    try:
+        table = to_arrow(df.reset_index() if index else df, name, column_types)
+        if "parquet" in formats:
+            pq.write_table(table, _sibling(csv_path, "parquet"))
+        if "arrow" in formats:
+            with pa.OSFile(_sibling(csv_path, "arrow"), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+    except (pa.ArrowException, ValueError, TypeError, OSError) as e:
+        print(f"Columnar export of {csv_path} skipped: {e}")
+
+
+def table_source(csv_path):
+    """The file read_table(csv_path) loads: the Parquet copy when it is at least as new as the CSV."""
+    pq_path = _sibling(csv_path, "parquet")
+    if pa is not None and os.path.exists(pq_path) and (
+            not os.path.exists(csv_path) or os.path.getmtime(pq_path) >= os.path.getmtime(csv_path)):
+        return pq_path
+    return csv_path
+
+
+def read_table(csv_path, columns=None):
+    """
+    Load a table written by write_table: the Parquet copy (only `columns`) when
+    it is at least as new as the CSV, the CSV otherwise.
+    """
+    source = table_source(csv_path)
+    if source != csv_path:
+        return pq.read_table(source, columns=columns).to_pandas()
+    return pd.read_csv(csv_path, usecols=columns)
@@ -0,0 +1,200 @@
+import warnings
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import find_peaks, sosfiltfilt
+
+from process_data import (
+    load_subject_order, find_mist_file, find_bio_file, find_bio_recording_for_window,
+    decimate_signal, butter_bandpass_sos, _refine_peaks, BVP_WORK_FS,
+)
+from signal_cache import load_physiolab
+from table_io import write_table
+from epochs import question_onsets, round_windows, recording_time_base
+
+# Event-related (per-question) physiology around each MIST question onset.
+# Onset = Timestamp - TimeTaken; Timestamp is logged with 1 s resolution, so
+# latencies are only meaningful to about a second.
+ER_PRE_S = 2.0            # baseline window [-2 s, 0)
+ER_POST_S = 8.0           # response window [0, +8 s)
+ER_EDA_FS = 20            # working rates of the epoch matrices
+ER_HR_FS = 10
+ER_SCR_MIN_LATENCY_S = 1.0
+ER_SCR_MIN_AMPLITUDE = 0.01  # uS, same threshold as calculate_eda_features
+
+OUTPUT_PATH = "trial_analysis.csv"
+
+
+def trial_epoch_matrix(x, fs, onset_s, pre_s=ER_PRE_S, post_s=ER_POST_S):
+    """
+    Stack fixed-length windows [onset - pre_s, onset + post_s) of `x` for every
+    onset (seconds on x's sample clock) into an (n_trials, L) matrix.
+
+    Rows are gathered from a sliding_window_view of x (no per-trial loop);
+    trials whose window falls outside the recording are NaN and valid=False.
+    Returns (epochs, valid, lags) with lags in seconds relative to onset.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    onset_s = np.asarray(onset_s, dtype=np.float64)
+    pre = int(round(pre_s * fs))
+    L = pre + int(round(post_s * fs))
+    lags = (np.arange(L) - pre) / fs
+
+    finite = np.isfinite(onset_s)
+    start = np.zeros(len(onset_s), dtype=np.int64)
+    start[finite] = np.round(onset_s[finite] * fs).astype(np.int64) - pre
+
+    out = np.full((len(onset_s), L), np.nan)
+    if len(x) < L:
+        return out, np.zeros(len(onset_s), dtype=bool), lags
+    valid = finite & (start >= 0) & (start <= len(x) - L)
+    windows = sliding_window_view(x, L)
+    out[valid] = windows[start[valid]]
+    return out, valid, lags
+
+
+def instantaneous_hr(bvp, fs, out_fs=ER_HR_FS):
+    """Beat-to-beat HR (BPM) from BVP, linearly interpolated onto a uniform out_fs grid."""
+    x, work_fs = decimate_signal(bvp, fs, BVP_WORK_FS)
+    n_out = int(len(x) / work_fs * out_fs)
+    if len(x) < 3 * work_fs:
+        return np.full(n_out, np.nan)
+    filtered = sosfiltfilt(butter_bandpass_sos(0.5, 4.0, work_fs, order=2), x)
+    peaks, _ = find_peaks(filtered, distance=int(0.4 * work_fs))
+    beat_t = _refine_peaks(filtered, peaks) / work_fs
+    if len(beat_t) < 3:
+        return np.full(n_out, np.nan)
+    ibi = np.diff(beat_t)
+    hr = 60.0 / ibi
+    # same outlier rule as calculate_hr_hrv (3 SD on IBIs)
+    ok = np.abs(ibi - ibi.mean()) < 3 * ibi.std() if ibi.std() > 0 else np.ones(len(ibi), dtype=bool)
+    t_mid = 0.5 * (beat_t[1:] + beat_t[:-1])
+    grid = np.arange(n_out) / out_fs
+    return np.interp(grid, t_mid[ok], hr[ok], left=np.nan, right=np.nan)
+
+
+def event_related_features(eda_ep, eda_lags, hr_ep, hr_lags):
+    """
+    Batched per-trial features from baseline-corrected epoch matrices:
+    - ER_SCR_Amplitude: max EDA rise over baseline in [1 s, post) (0 if < threshold)
+    - ER_SCR_Latency: time of that maximum (NaN without a response)
+    - ER_HR_Baseline / ER_HR_Change: pre-onset HR and mean post-onset change (BPM)
+    - ER_HR_PeakChange / ER_HR_Latency: largest |HR change| after onset and its time
+    """
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN rows
+        eda_base = np.nanmean(eda_ep[:, eda_lags < 0], axis=1)
+        resp_mask = eda_lags >= ER_SCR_MIN_LATENCY_S
+        rise = eda_ep[:, resp_mask] - eda_base[:, None]
+        rise_filled = np.where(np.isnan(rise), -np.inf, rise)
+        idx = np.argmax(rise_filled, axis=1)
+        amp = rise_filled[np.arange(len(idx)), idx]
+        has_scr = amp >= ER_SCR_MIN_AMPLITUDE
+        scr_amp = np.where(np.isfinite(amp), np.where(has_scr, amp, 0.0), np.nan)
+        scr_lat = np.where(has_scr, eda_lags[resp_mask][idx], np.nan)
+
+        hr_base = np.nanmean(hr_ep[:, hr_lags < 0], axis=1)
+        post_mask = hr_lags >= 0
+        dev = hr_ep[:, post_mask] - hr_base[:, None]
+        hr_change = np.nanmean(dev, axis=1)
+        abs_dev = np.where(np.isnan(dev), -np.inf, np.abs(dev))
+        hidx = np.argmax(abs_dev, axis=1)
+        peak = dev[np.arange(len(hidx)), hidx]
+        hr_lat = np.where(np.isfinite(peak), hr_lags[post_mask][hidx], np.nan)
+
+    return {
+        "ER_SCR_Amplitude": scr_amp,
+        "ER_SCR_Latency": scr_lat,
+        "ER_HR_Baseline": hr_base,
+        "ER_HR_Change": hr_change,
+        "ER_HR_PeakChange": peak,
+        "ER_HR_Latency": hr_lat,
+    }
+
+
+def extract_trial_responses(rec, onsets):
+    """
+    Event-related features for every onset (pd.Timestamp Series) in one recording,
+    computed in a single batched pass. Returns a DataFrame aligned with `onsets`.
+    """
+    fs = rec["fs"]
+    t = recording_time_base(rec)
+    onset_rel = (pd.to_datetime(onsets) - rec["start_time"]).dt.total_seconds().to_numpy()
+    # Map wall-clock onsets onto the sample clock (robust to StorageTime gaps)
+    idx = np.searchsorted(t, np.nan_to_num(onset_rel, nan=-np.inf))
+    in_range = np.isfinite(onset_rel) & (idx > 0) & (idx < len(t))
+    onset_s = np.where(in_range, idx / fs, np.nan)
+
+    eda, eda_fs = decimate_signal(rec["EDA"], fs, ER_EDA_FS)
+    hr = instantaneous_hr(rec["BVP"], fs)
+
+    eda_ep, eda_valid, eda_lags = trial_epoch_matrix(eda, eda_fs, onset_s)
+    hr_ep, hr_valid, hr_lags = trial_epoch_matrix(hr, ER_HR_FS, onset_s)
+
+    feats = event_related_features(eda_ep, eda_lags, hr_ep, hr_lags)
+    out = pd.DataFrame(feats, index=onsets.index)
+    out.insert(0, "Trial_Valid", eda_valid & hr_valid)
+    return out
+
+
+def build_trial_table(subject_ids=None):
+    """
+    Trial-level table (one row per mist_results question), joinable to
+    mist_results on SubjectID/Round/QuestionIndex. subject_ids defaults to
+    every subject of the order table.
+    """
+    subject_order = load_subject_order()
+    tables = []
+    for sub_id in (sorted(subject_order) if subject_ids is None else subject_ids):
+        mist_file = find_mist_file(sub_id)
+        if not mist_file:
+            continue
+        mist_df = pd.read_csv(mist_file)
+        onsets, _ = question_onsets(mist_df)
+        windows = round_windows(mist_df)
+        order = subject_order.get(sub_id)
+
+        trials = mist_df[["SubjectID", "Round", "QuestionIndex"]].copy()
+        trials["SubjectID"] = sub_id
+        trials["Condition"] = trials["Round"].map(
+            lambda r: order[int(r) - 1] if order and 1 <= int(r) <= len(order) else None
+        )
+        trials["Onset"] = onsets
+
+        # Group rounds by the recording that holds them, then one batched pass per recording
+        by_file = {}
+        for r, window in windows.items():
+            cond = order[r - 1] if order and 1 <= r <= len(order) else None
+            path = find_bio_file(sub_id, cond) if cond else None
+            path = path or find_bio_recording_for_window(sub_id, window)
+            if path:
+                by_file.setdefault(path, []).append(r)
+
+        feats = []
+        for path, rounds in by_file.items():
+            sel = trials["Round"].isin(rounds)
+            try:
+                rec = load_physiolab(path)
+                feats.append(extract_trial_responses(rec, trials.loc[sel, "Onset"]))
+            except Exception as e:
+                print(f"Error extracting trial responses from {path}: {e}")
+        if feats:
+            trials = trials.join(pd.concat(feats))
+        tables.append(trials)
+
+    if not tables:
+        return pd.DataFrame()
+    table = pd.concat(tables, ignore_index=True)
+    # Trials without a recording are invalid, not missing: keep the column boolean
+    table["Trial_Valid"] = table["Trial_Valid"].eq(True) if "Trial_Valid" in table else False
+    return table
+
+
+def main():
+    df = build_trial_table()
+    write_table(df, OUTPUT_PATH)
+    print(f"Saved {len(df)} trials to {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import math
+import time
+
+# MIST 每题倒计时（mist_test.py 使用）。
+# - 截止时间是 time.perf_counter() 上的绝对时刻：tick 回调晚到只会让进度条
+#   晚一点更新，不会把时间限制拉长；每次 tick 都对齐到 onset + k * interval
+#   重新排程（不累积误差），最后一次 tick 正好排在截止时刻。
+# - 进度条颜色只在跨过阈值（60% / 30%）时才重新 configure。
+# - 每个 tick 记录实际执行时刻相对计划时刻的延迟（jitter），超时也记录
+#   相对截止时刻的延迟，用来核对时间限制的精度。
+# - 反应时用 Tk 事件自带的时间戳（毫秒，按键 / 鼠标按下的时刻），而不是回调
+#   被执行的时刻。EventClock 把事件时间换算到 perf_counter：每个事件都满足
+#   perf_counter() - event.time >= 两个时钟的真实偏移，取观察到的最小值作为偏移。
+TICK_INTERVAL_S = 0.05
+COLOUR_THRESHOLDS = [(60.0, "#4caf50"), (30.0, "#f39c12"), (0.0, "#e74c3c")]  # remaining % >= threshold -> colour
+_WRAP_MS = 2 ** 32  # Tk event.time is an unsigned 32-bit millisecond counter
+
+
+def colour_for(percentage, thresholds=COLOUR_THRESHOLDS):
+    for threshold, colour in thresholds:
+        if percentage >= threshold:
+            return colour
+    return thresholds[-1][1]
+
+
+class EventClock:
+    """Maps Tk event timestamps (ms) onto time.perf_counter() seconds."""
+
+    def __init__(self):
+        self.offset_ms = None  # perf_counter ms - event ms, smallest seen
+        self.last_event_ms = None
+        self.wraps = 0
+
+    def observe(self, event):
+        """Refine the offset from an event handled now; returns its time on the perf_counter clock."""
+        now_ms = time.perf_counter() * 1000.0
+        event_ms = getattr(event, "time", None)
+        if not isinstance(event_ms, int) or event_ms <= 0:
+            return now_ms / 1000.0  # synthetic event without a timestamp
+        if self.last_event_ms is not None and event_ms < self.last_event_ms - _WRAP_MS // 2:
+            self.wraps += 1
+        self.last_event_ms = event_ms
+        event_ms += self.wraps * _WRAP_MS
+        offset = now_ms - event_ms
+        if self.offset_ms is None or offset < self.offset_ms:
+            self.offset_ms = offset
+        return (event_ms + self.offset_ms) / 1000.0
+
+
+class TrialTimer:
+    """
+    Countdown of one trial on a perf_counter deadline, driven by root.after.
+    on_tick(percentage remaining) every interval, on_colour(colour) when a
+    threshold is crossed, on_timeout() once at the deadline.
+    """
+
+    def __init__(self, root, interval_s=TICK_INTERVAL_S, thresholds=COLOUR_THRESHOLDS,
+                 on_tick=None, on_colour=None, on_timeout=None):
+        self.root = root
+        self.interval_s = interval_s
+        self.thresholds = thresholds
+        self.on_tick = on_tick
+        self.on_colour = on_colour
+        self.on_timeout = on_timeout
+        self.running = False
+        self.onset = None
+        self.deadline = None
+        self.limit_s = None
+        self.colour = None
+        self.trial = None
+        self.ticks = []  # {"trial", "due", "at", "late_ms", "timeout"}, times relative to onset
+        self._next_due = None
+        self._after_id = None
+
+    def start(self, limit_s, trial=None, onset=None):
+        """Start counting down limit_s from onset (default: now); returns the onset time."""
+        self.stop()
+        self.onset = time.perf_counter() if onset is None else onset
+        self.limit_s = limit_s
+        self.deadline = self.onset + limit_s
+        self.trial = trial
+        self.running = True
+        self._next_due = self.onset
+        self.colour = None
+        self._tick()
+        return self.onset
+
+    def stop(self):
+        """Stop without firing on_timeout; returns the elapsed seconds since onset."""
+        self.running = False
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        return None if self.onset is None else time.perf_counter() - self.onset
+
+    def remaining(self, now=None):
+        return max(0.0, self.deadline - (time.perf_counter() if now is None else now))
+
+    def _tick(self):
+        self._after_id = None
+        if not self.running:
+            return
+        now = time.perf_counter()
+        timeout = now >= self.deadline
+        due = self.deadline if timeout else self._next_due
+        self.ticks.append({
+            "trial": self.trial,
+            "due": due - self.onset,
+            "at": now - self.onset,
+            "late_ms": (now - due) * 1000.0,
+            "timeout": timeout,
+        })
+
+        percentage = self.remaining(now) / self.limit_s * 100.0 if self.limit_s else 0.0
+        if self.on_tick is not None:
+            self.on_tick(percentage)
+        colour = colour_for(percentage, self.thresholds)
+        if colour != self.colour:
+            self.colour = colour
+            if self.on_colour is not None:
+                self.on_colour(colour)
+
+        if timeout:
+            self.running = False
+            if self.on_timeout is not None:
+                self.on_timeout()
+            return
+        # next grid point after now (late ticks are skipped, not queued); the last one is the deadline
+        while self._next_due <= now:
+            self._next_due += self.interval_s
+        target = min(self._next_due, self.deadline)
+        # ceil: Tk never fires early, so the tick lands on or just after target
+        self._after_id = self.root.after(max(0, math.ceil((target - now) * 1000.0)), self._tick)
+
+    def jitter_summary(self):
+        """Tick lateness statistics (ms) over every recorded tick, and over the timeouts."""
+        def stats(values):
+            if not values:
+                return {"n": 0}
+            values = sorted(values)
+            return {
+                "n": len(values),
+                "mean_ms": sum(values) / len(values),
+                "p95_ms": values[min(len(values) - 1, int(0.95 * len(values)))],
+                "max_ms": values[-1],
+            }
+        return {
+            "ticks": stats([t["late_ms"] for t in self.ticks]),
+            "timeouts": stats([t["late_ms"] for t in self.ticks if t["timeout"]]),
+        }
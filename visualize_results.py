@@ -1,134 +1,254 @@
+import os
+import json
+import hashlib
+import inspect
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # workers render off-screen
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
-import os
 import numpy as np
 
+from analysis_cube import load_cube
+
+# 每张图是一个独立任务（输出文件名 + 绘图函数 + 只含所需列的数据 + 参数），
+# 可以分给多个进程并行绘制。key = 数据哈希 + 参数 + 绘图函数源码 + DPI +
+# 模块级样式（ORDER、seaborn 主题和 rcParams），记录在输出目录的
+# .render_manifest.json 里；key 不变且图片还在就跳过，所以只改了一个指标时
+# 只会重画这个指标的图。某张图画失败时，其余已画好的图仍写入 manifest 再报错。--preview 用低 DPI 输出到
+# plots/preview，方便快速调图。
+
 # Set style
 sns.set_theme(style="whitegrid")
 plt.rcParams['font.sans-serif'] = ['Arial Unicode MS'] # For Chinese characters support on MacOS if needed, or just generic sans-serif
 plt.rcParams['axes.unicode_minus'] = False
 
 OUTPUT_DIR = "plots"
+RENDER_PROFILES = {
+    "final": {"dpi": 300, "output_dir": OUTPUT_DIR},
+    "preview": {"dpi": 72, "output_dir": os.path.join(OUTPUT_DIR, "preview")},
+}
+RENDER_MANIFEST = ".render_manifest.json"
 
-def save_plot(filename):
-    path = os.path.join(OUTPUT_DIR, filename)
-    plt.tight_layout()
-    plt.savefig(path, dpi=300)
-    plt.close()
-    print(f"Saved {path}")
-
-def main():
-    df = pd.read_csv("combined_analysis.csv")
-    
-    # Map Condition codes to descriptive names for better legends
-    condition_map = {
-        'A': 'A: Self Gesture',
-        'B': 'B: No Gesture',
-        'C': 'C: Naked Robot',
-        'D': 'D: Clothed Robot'
-    }
-    df['Condition_Name'] = df['Condition'].map(condition_map)
-    
-    # Sort order
-    order = ['A', 'B', 'C', 'D']
-    order_names = [condition_map[x] for x in order]
-
-    # --- 1. Box Plots for Main Metrics (Condition Comparison) ---
-    metrics = [
-        ('Word_Recall_Correct', 'Word Recall Correct (#)', (0, 10)),
-        ('MIST_ResponseTime', 'Response Time (s)', None),
-        ('Bio_HR_Mean', 'Heart Rate (BPM)', None),
-        ('Bio_HRV_RMSSD', 'HRV (RMSSD) (ms)', None),
-        ('Bio_HRV_LFHF', 'HRV LF/HF Ratio', None),
-        ('Bio_SCL_Mean', 'Skin Conductance Level (uS)', None),
-        ('Bio_SCR_Freq', 'SCR Frequency (peaks/min)', None),
-        ('Bio_EDA_MeanFreq', 'EDA Gradient Mean Freq (Hz)', None),
-        ('Bio_EDA_Power005', 'EDA Gradient Power @ 0.05Hz', None),
-        ('Bio_RESP_Rate', 'Respiration Rate (breaths/min)', None),
-        ('NASA_TLX_Score', 'NASA TLX Workload', (0, 20)), # Assuming raw scale, adjust if needed
-        ('NASA_Frustration', 'Frustration Level', None)
-    ]
-
-    for col, title, ylim in metrics:
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(x='Condition', y=col, hue='Condition', data=df, order=order, palette="Set2", legend=False)
-        sns.swarmplot(x='Condition', y=col, data=df, order=order, color=".25", size=6) # Add individual points
-        plt.title(f"{title} by Condition", fontsize=16)
-        plt.xlabel("Condition")
-        plt.ylabel(title)
-        if ylim:
-            plt.ylim(ylim)
-        save_plot(f"boxplot_{col}.png")
-
-    # --- 2. Line Plots (Subject Trends) ---
-    # Show how each subject changed across conditions. 
+ORDER = ['A', 'B', 'C', 'D']
+
+# --- 1. Box Plots / 2. Line Plots for Main Metrics (Condition Comparison) ---
+METRICS = [
+    ('Word_Recall_Correct', 'Word Recall Correct (#)', (0, 10)),
+    ('MIST_ResponseTime', 'Response Time (s)', None),
+    ('Bio_HR_Mean', 'Heart Rate (BPM)', None),
+    ('Bio_HRV_RMSSD', 'HRV (RMSSD) (ms)', None),
+    ('Bio_HRV_LFHF', 'HRV LF/HF Ratio', None),
+    ('Bio_SCL_Mean', 'Skin Conductance Level (uS)', None),
+    ('Bio_SCR_Freq', 'SCR Frequency (peaks/min)', None),
+    ('Bio_EDA_MeanFreq', 'EDA Gradient Mean Freq (Hz)', None),
+    ('Bio_EDA_Power005', 'EDA Gradient Power @ 0.05Hz', None),
+    ('Bio_RESP_Rate', 'Respiration Rate (breaths/min)', None),
+    ('NASA_TLX_Score', 'NASA TLX Workload', (0, 20)), # Assuming raw scale, adjust if needed
+    ('NASA_Frustration', 'Frustration Level', None)
+]
+
+# --- 4. Bio-Psych Correlation Matrix ---
+CORR_COLS = [
+    'Word_Recall_Correct', 'MIST_ResponseTime',
+    'Bio_HR_Mean', 'Bio_HRV_RMSSD', 'Bio_HRV_LFHF',
+    'Bio_SCL_Mean', 'Bio_SCR_Freq', 'Bio_EDA_MeanFreq', 'Bio_EDA_Power005',
+    'NASA_TLX_Score', 'NASA_Mental', 'NASA_Frustration'
+]
+
+
+def plot_box(df, col, title, ylim):
+    plt.figure(figsize=(10, 6))
+    sns.boxplot(x='Condition', y=col, hue='Condition', data=df, order=ORDER, palette="Set2", legend=False)
+    sns.swarmplot(x='Condition', y=col, data=df, order=ORDER, color=".25", size=6) # Add individual points
+    plt.title(f"{title} by Condition", fontsize=16)
+    plt.xlabel("Condition")
+    plt.ylabel(title)
+    if ylim:
+        plt.ylim(ylim)
+
+
+def plot_subject_lines(df, col, title):
+    # Show how each subject changed across conditions.
     # Since conditions are categorical, this is a parallel coordinate-like plot.
-    
-    # Pivot for parallel coordinates is tricky if order varies, 
-    # so we just plot lines grouping by SubjectID
-    
-    for col, title, _ in metrics:
-        plt.figure(figsize=(10, 6))
-        sns.pointplot(x='Condition', y=col, hue='SubjectID', data=df, order=order, palette="tab10", markers='o')
-        plt.title(f"Individual Subject Trends: {title}", fontsize=16)
-        plt.legend(title='Subject ID', bbox_to_anchor=(1.05, 1), loc='upper left')
-        plt.ylabel(title)
-        save_plot(f"lineplot_subject_{col}.png")
+    plt.figure(figsize=(10, 6))
+    sns.pointplot(x='Condition', y=col, hue='SubjectID', data=df, order=ORDER, palette="tab10", markers='o')
+    plt.title(f"Individual Subject Trends: {title}", fontsize=16)
+    plt.legend(title='Subject ID', bbox_to_anchor=(1.05, 1), loc='upper left')
+    plt.ylabel(title)
 
-    # --- 3. Force Comparison (C vs D) ---
-    force_df = df[df['Condition'].isin(['C', 'D'])]
-    if not force_df.empty:
-        # 仅一个力传感器：将 Thumb/Index 合并为总力（在 process_data.py 中已生成 Force_Total_*）
-        if 'Force_Total_Mean' in force_df.columns:
-            plt.figure(figsize=(7, 6))
-            sns.barplot(
-                x='Condition',
-                y='Force_Total_Mean',
-                data=force_df,
-                order=['C', 'D'],
-                palette="viridis",
-                errorbar='sd'
-            )
-            plt.title("Interaction Force (Total): Naked (C) vs Clothed (D)", fontsize=16)
-            plt.xlabel("Condition")
-            plt.ylabel("Mean Total Force Magnitude (Thumb + Index)")
-            save_plot("barplot_force_comparison.png")
-
-    # --- 4. Bio-Psych Correlation Matrix ---
-    # Select relevant columns
-    corr_cols = [
-        'Word_Recall_Correct', 'MIST_ResponseTime', 
-        'Bio_HR_Mean', 'Bio_HRV_RMSSD', 'Bio_HRV_LFHF',
-        'Bio_SCL_Mean', 'Bio_SCR_Freq', 'Bio_EDA_MeanFreq', 'Bio_EDA_Power005',
-        'NASA_TLX_Score', 'NASA_Mental', 'NASA_Frustration'
-    ]
-    corr_matrix = df[corr_cols].corr()
-    
+
+def plot_force(df):
+    # 仅一个力传感器：将 Thumb/Index 合并为总力（在 process_data.py 中已生成 Force_Total_*）
+    plt.figure(figsize=(7, 6))
+    sns.barplot(
+        x='Condition',
+        y='Force_Total_Mean',
+        data=df,
+        order=['C', 'D'],
+        palette="viridis",
+        errorbar='sd'
+    )
+    plt.title("Interaction Force (Total): Naked (C) vs Clothed (D)", fontsize=16)
+    plt.xlabel("Condition")
+    plt.ylabel("Mean Total Force Magnitude (Thumb + Index)")
+
+
+def plot_corr(corr_matrix):
     plt.figure(figsize=(10, 8))
     sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', vmin=-1, vmax=1, center=0, fmt=".2f")
     plt.title("Correlation Matrix of Metrics", fontsize=16)
-    save_plot("heatmap_correlation.png")
 
-    # --- 5. Grouped Bar Plot: Word Recall & NASA TLX ---
+
+def plot_perf_workload(df):
     # To compare performance vs perceived workload side by side
-    # Normalize or just plot on dual axis? Dual axis is messy. 
-    # Let's just do two subplots.
-    
     fig, axes = plt.subplots(1, 2, figsize=(14, 6))
-    
-    sns.barplot(x='Condition', y='Word_Recall_Correct', data=df, order=order, ax=axes[0], palette="Blues_d", errorbar='se')
+
+    sns.barplot(x='Condition', y='Word_Recall_Correct', data=df, order=ORDER, ax=axes[0], palette="Blues_d", errorbar='se')
     axes[0].set_title("Word Recall Correct (Higher is Better)")
     axes[0].set_ylim(0, 10)
-    
-    sns.barplot(x='Condition', y='NASA_TLX_Score', data=df, order=order, ax=axes[1], palette="Reds_d", errorbar='se')
+
+    sns.barplot(x='Condition', y='NASA_TLX_Score', data=df, order=ORDER, ax=axes[1], palette="Reds_d", errorbar='se')
     axes[1].set_title("NASA TLX Workload (Lower is Better)")
-    
+
     plt.suptitle("Performance vs Workload Comparison", fontsize=16)
-    save_plot("comparison_perf_workload.png")
 
-    print("All plots generated in 'plots' directory.")
 
-if __name__ == "__main__":
-    main()
+def figure_jobs(cube):
+    """
+    (filename, plot function, data, params) for every figure. data holds only
+    the columns the figure reads, so its hash changes only with them.
+    """
+    df = cube.frame
+    jobs = []
+    for col, title, ylim in METRICS:
+        if col not in df.columns:
+            print(f"Metric {col} not found, skipping its plots")
+            continue
+        jobs.append((f"boxplot_{col}.png", plot_box, df[['Condition', col]],
+                     {"col": col, "title": title, "ylim": ylim}))
+    for col, title, _ in METRICS:
+        if col in df.columns:
+            jobs.append((f"lineplot_subject_{col}.png", plot_subject_lines, df[['SubjectID', 'Condition', col]],
+                         {"col": col, "title": title}))
 
+    # --- 3. Force Comparison (C vs D) ---
+    force_df = df[df['Condition'].isin(['C', 'D'])]
+    if not force_df.empty and 'Force_Total_Mean' in force_df.columns:
+        jobs.append(("barplot_force_comparison.png", plot_force, force_df[['Condition', 'Force_Total_Mean']], {}))
+
+    jobs.append(("heatmap_correlation.png", plot_corr, cube.corr(CORR_COLS), {}))
+
+    # --- 5. Grouped Bar Plot: Word Recall & NASA TLX ---
+    jobs.append(("comparison_perf_workload.png", plot_perf_workload,
+                 df[['Condition', 'Word_Recall_Correct', 'NASA_TLX_Score']], {}))
+    return jobs
+
+
+def style_fingerprint():
+    """The module-level style every figure shares: ORDER and the rcParams (seaborn theme included)."""
+    rc = sorted((k, str(v)) for k, v in plt.rcParams.items())
+    return json.dumps([ORDER, rc])
+
+
+def render_key(fn, data, params, dpi, style=None):
+    """Hash of everything a figure depends on: data, parameters, plotting code, DPI and style."""
+    # values only: the same table read from CSV or Parquet (int64 vs Int32, object vs category) hashes alike
+    values = data.apply(lambda s: s.astype(float) if pd.api.types.is_numeric_dtype(s) else s.astype(str))
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(values, index=True).to_numpy().tobytes())
+    h.update(json.dumps([list(map(str, data.columns)), params, dpi], default=str).encode("utf-8"))
+    h.update(inspect.getsource(fn).encode("utf-8"))
+    h.update((style if style is not None else style_fingerprint()).encode("utf-8"))
+    return h.hexdigest()
+
+
+def render_figure(filename, fn, data, params, output_dir, dpi):
+    """Draw one figure and save it; runs in a worker process."""
+    fn(data, **params)
+    path = os.path.join(output_dir, filename)
+    plt.tight_layout()
+    plt.savefig(path, dpi=dpi)
+    plt.close('all')
+    return path
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, RENDER_MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, manifest):
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=output_dir)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(output_dir, RENDER_MANIFEST))
+
+
+def main(jobs=1, profile="final", force=False):
+    settings = RENDER_PROFILES[profile]
+    output_dir, dpi = settings["output_dir"], settings["dpi"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    cube = load_cube("combined_analysis.csv")
+    manifest = _load_manifest(output_dir)
+
+    figures = figure_jobs(cube)
+    style = style_fingerprint()
+    todo = []
+    for filename, fn, data, params in figures:
+        key = render_key(fn, data, params, dpi, style)
+        if not force and manifest.get(filename) == key and os.path.exists(os.path.join(output_dir, filename)):
+            continue
+        todo.append((key, (filename, fn, data, params, output_dir, dpi)))
+
+    results, failures = [], []
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as pool:
+            futures = [(key, args[0], pool.submit(render_figure, *args)) for key, args in todo]
+            for key, filename, fut in futures:
+                try:
+                    results.append((key, filename, fut.result()))
+                except Exception as e:
+                    failures.append((filename, e))
+    else:
+        for key, args in todo:
+            try:
+                results.append((key, args[0], render_figure(*args)))
+            except Exception as e:
+                failures.append((args[0], e))
+
+    for key, filename, path in results:
+        manifest[filename] = key
+        print(f"Saved {path}")
+    if results:
+        _save_manifest(output_dir, manifest)  # keep what was drawn even if another figure failed
+    for filename, e in failures:
+        print(f"Failed to render {filename}: {e!r}")
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(todo)} figures failed to render: "
+                           f"{', '.join(f for f, _ in failures)}") from failures[0][1]
+
+    print(f"All plots generated in '{output_dir}' directory "
+          f"({len(results)} rendered, {len(figures) - len(results)} unchanged).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the figures in plots/ from combined_analysis.csv")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="worker processes for rendering (0 = all cores)")
+    parser.add_argument("--preview", action="store_true",
+                        help=f"low-DPI profile ({RENDER_PROFILES['preview']['dpi']} dpi) written to "
+                             f"{RENDER_PROFILES['preview']['output_dir']}")
+    parser.add_argument("--force", action="store_true",
+                        help="redraw every figure even if its inputs are unchanged")
+    args = parser.parse_args()
+    main(jobs=args.jobs if args.jobs > 0 else (os.cpu_count() or 1),
+         profile="preview" if args.preview else "final", force=args.force)
@@ -0,0 +1,55 @@
+import os
+import hashlib
+import pandas as pd
+
+from signal_cache import source_fingerprint
+from profiling import span, file_attrs
+
+# 问卷 xlsx 解析很慢（openpyxl）。解析一次后以 pandas pickle（按列存储的 block）
+# 缓存到 data/.cache/xlsx，源文件 size/mtime 变化时自动重新解析。
+XLSX_CACHE_DIR = os.path.join("data", ".cache", "xlsx")
+
+
+def _cache_path(file_path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{key}.pkl")
+
+
+def read_excel_cached(file_path, cache_dir=XLSX_CACHE_DIR, **kwargs):
+    """
+    pd.read_excel(file_path, **kwargs), served from the cache when the source is
+    unchanged. cache_dir=None always parses the workbook.
+    """
+    with span("load.xlsx", **file_attrs(file_path)) as sp:
+        if cache_dir is None:
+            sp.set(cache="off")
+            with span("parse.xlsx"):
+                return pd.read_excel(file_path, **kwargs)
+        return _read_excel_cached(file_path, cache_dir, kwargs, sp)
+
+
+def _read_excel_cached(file_path, cache_dir, kwargs, sp):
+    fingerprint = source_fingerprint(file_path)["source_hash"]
+    kwargs_key = repr(sorted(kwargs.items()))
+    path = _cache_path(file_path, cache_dir)
+    try:
+        cached = pd.read_pickle(path)
+        if cached.attrs.get("source_hash") == fingerprint and cached.attrs.get("read_kwargs") == kwargs_key:
+            sp.set(cache="hit")
+            return cached
+    except Exception:
+        pass  # missing / stale / unreadable cache entry -> parse again
+
+    sp.set(cache="miss")
+    with span("parse.xlsx"):
+        df = pd.read_excel(file_path, **kwargs)
+    df.attrs["source_hash"] = fingerprint
+    df.attrs["read_kwargs"] = kwargs_key
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"xlsx cache unavailable for {file_path}: {e}")
+    return df